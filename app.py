@@ -2,27 +2,44 @@
 
 import streamlit as st
 from streamlit_ace import st_ace
-import httpx
-from openai import OpenAI
 import os
-import tempfile
-import tempfile
-import os
-from src.pdf_utilities import (
-    extract_full_text,
-    extract_title_and_abstract,
-    extract_and_merge_images,
-    summarize_text_hierarchical,
-)
-from src.rag_pipeline_run import run_pipeline
+from src.image_payload import DEFAULT_IMAGE_OPTIONS
+from src.jobs import ACTIVE, JobQueue, QueueFull, run_review_job, submit_review
+from src.llm_client import make_client
+from src.lazy_imports import preload
+from src.tracing import start_metrics_server
+from src.rag_retrieve import warm_engine
+from src.rag_router import describe_route
 from datetime import datetime
 import json
+import time
+
+# page images sent to the model: 2 pages per JPEG part, sized to the model's input resolution
+IMAGE_OPTIONS = DEFAULT_IMAGE_OPTIONS
+# reviews run as background jobs; the page polls their progress / partial output
+JOB_POLL_S = 1.0
+MAX_CONCURRENT_JOBS = int(os.environ.get("REVIEW_MAX_JOBS", "2"))
+MAX_QUEUED_JOBS = int(os.environ.get("REVIEW_MAX_QUEUE", "8"))
+# reference summary input when REFERENCE_MODE is "llm": "reviews" (two most similar papers' reviews) or
+# "passages" (budgeted review passages). Passages need a passage index built with python -m src.rag_passages
+# and registered for the shard; without one every run searches again and falls back to whole reviews.
+RETRIEVAL_MODE = os.environ.get("REVIEW_RETRIEVAL_MODE", "reviews")
+# "precomputed": merge the offline reference guidance of the retrieved papers locally (one LLM
+# round-trip less; falls back to "llm" for papers without guidance). Only worth it once the
+# guidance file has been built (python -m src.reference_guidance) and registered for the shard,
+# so the shipped default stays "llm".
+REFERENCE_MODE = os.environ.get("REVIEW_REFERENCE_MODE", "llm")
+# "separate" streams the review, then the to-do list (both calls send the page images); "text_todo" sends
+# the to-do call without images; "combined" asks for both in one JSON call (no partial output while it runs)
+GENERATION_MODE = os.environ.get("REVIEW_GENERATION_MODE", "separate")
+# per-run metadata (ref / rev / todo + trace) is written here
+LOG_DIR = os.environ.get("REVIEW_LOG_DIR", "logs")
 
 
 # --------------------------------------------------------------
 # Session state
 # --------------------------------------------------------------
-for k in ("api_key", "client", "api_ok", "paper_title", "review", "todo_items"):
+for k in ("api_key", "client", "api_ok", "paper_title", "review", "todo_items", "review_metrics", "job_id"):
     if k not in st.session_state:
         st.session_state[k] = None
 
@@ -34,7 +51,83 @@ st.session_state.paper_title = st.session_state.paper_title or "Untitled Manuscr
 # --------------------------------------------------------------
 @st.cache_resource(show_spinner=False)
 def get_client(key, url=""): 
-    return OpenAI(base_url=url, api_key=key, http_client=httpx.Client(follow_redirects=True))
+    return make_client(key, url)
+
+@st.cache_resource(show_spinner=False)
+def metrics_server():
+    # Prometheus scrape endpoint, opt-in via REVIEW_METRICS_PORT
+    port = os.environ.get("REVIEW_METRICS_PORT")
+    return start_metrics_server(int(port)) if port else None
+
+@st.cache_resource(show_spinner=False)
+def job_queue():
+    # one worker pool per server process, shared by all sessions
+    return JobQueue(run_review_job, max_concurrent=MAX_CONCURRENT_JOBS, max_queue=MAX_QUEUED_JOBS)
+
+@st.cache_resource(show_spinner=False)
+def warm_retrieval():
+    # load encoder / FAISS index / meta and the PDF libraries once per process, off the
+    # script thread; src.* imports them lazily so the first render does not wait for them
+    preload("fitz", "PIL.Image", background=True)
+    return warm_engine(background=True)
+
+# --------------------------------------------------------------
+# Rendering helpers (used while streaming and for the final result)
+# --------------------------------------------------------------
+def render_review(box, review):
+    if not review:
+        box.info("Upload PDF and proceed.")
+        return
+    box.markdown(
+        f"""
+        <div style="
+            height:400px; 
+            overflow-y:auto; 
+            border:1px solid #CCC; 
+            padding:15px; 
+            border-radius:8px; 
+            font-size:18px;
+            line-height:1.6;
+        ">
+            {review}
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+def render_todo(box, todo_items):
+    if not todo_items:
+        box.info("Upload PDF and proceed.")
+        return
+    todo_html = "".join(
+        f"""
+        <label style="
+            display:block; 
+            margin-bottom:8px; 
+            font-size:18px; 
+            cursor:pointer;
+        ">
+            <input type="checkbox" style="margin-right:6px;">
+            {item.strip()}
+        </label>
+        """
+        for item in todo_items
+    )
+    box.markdown(
+        f"""
+        <div style="
+            height:400px; 
+            overflow-y:auto; 
+            border:1px solid #CCC; 
+            padding:15px; 
+            border-radius:8px; 
+            font-size:14px;
+        ">
+            {todo_html}
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
 
 # --------------------------------------------------------------
 # UI – Instant load, clear flow
@@ -67,8 +160,23 @@ st.markdown(
 st.title("Pre-submission Peer Review Simulation")
 st.caption("Multimodal Peer Review Simulation with Actionable To-Do Suggestions for Community-Aware Pre-Submission Revisions")
 
+metrics_server()
+
 left_col, right_col = st.columns(2)
 
+# Review + To‑Do layout (created here so results can stream into it)
+col1, col2 = st.columns([4, 2])
+
+with col1:
+    st.subheader("📄 Review")
+    review_box = st.empty()
+
+with col2:
+    st.subheader("✅ To‑Do List")
+    todo_box = st.empty()
+
+status_box = st.empty()
+
 with left_col:
     default_latex = r"""\documentclass{article}
 \usepackage{amsmath}
@@ -154,11 +262,8 @@ with right_col:
         uploaded = st.file_uploader("**Upload your PDF manuscript**", type="pdf")
 
         if uploaded:
-            temp_fd, temp_pdf_path = tempfile.mkstemp(suffix=".pdf")
-            os.write(temp_fd, uploaded.read())
-            os.close(temp_fd)
-
-            st.session_state.uploaded_pdf_path = temp_pdf_path
+            # the upload stays in memory: the job renders / extracts straight from the bytes
+            pdf_bytes = uploaded.getvalue()
             st.session_state.paper_title = os.path.splitext(uploaded.name)[0]
 
             st.markdown("<div style='height: 4px'></div>", unsafe_allow_html=True)
@@ -167,90 +272,69 @@ with right_col:
                 ["International World Wide Web Conference (WWW)", "Annual Conference on Neural Information Processing Systems (NeurIPS)", "International Conference on Learning Representations (ICLR)", "Annual Meeting of the Association for Computational Linguistics (ACL)"],
                 key="venue_choice",
             )
+            # venues without their own index shard fall back to the default (ICLR 2020) corpus
+            st.caption(f"Reference reviews from: {describe_route(venue)}")
             
             review_clicked = st.button("🌐 Review Manuscript", use_container_width=True)
                 
 
             if review_clicked:
-
-                with st.spinner("Reviewing..."):
-                    full_text = extract_full_text(temp_pdf_path)
-                    title, abstract = extract_title_and_abstract(full_text)
-                    merged_image_path = extract_and_merge_images(temp_pdf_path)
-
-                    summary = summarize_text_hierarchical(
-                        long_text=full_text,
-                        client=st.session_state.client,
+                # runs in the background job queue: survives reruns / refreshes, identical
+                # submissions (same PDF + venue) share one job
+                try:
+                    job_id, coalesced = submit_review(
+                        job_queue(),
+                        st.session_state.client,
+                        pdf_bytes,
+                        uploaded.name,
+                        venue,
+                        log_dir=LOG_DIR,
+                        k=2,
                         model="gpt-4o",
+                        image_options=IMAGE_OPTIONS,
+                        retrieval_mode=RETRIEVAL_MODE,
+                        reference_mode=REFERENCE_MODE,
+                        generation_mode=GENERATION_MODE,
                     )
-
-                    ref, rev, todo = run_pipeline(st.session_state.client, title, abstract, summary, merged_image_path, 2)
-
-                    st.session_state.review = rev
-                    st.session_state.todo_items = todo
-
-                    st.success("✅ Manuscript reviewed successfully!")
+                    st.session_state.job_id = job_id
+                    st.query_params["job"] = job_id
+                    st.session_state.review, st.session_state.todo_items = None, []
+                    st.session_state.review_metrics = None
+                    if coalesced:
+                        st.info("This manuscript is already being reviewed; following that review.")
+                except QueueFull as e:
+                    st.error(f"⚠️ The server is busy: {e}")
         else:
             st.info("Please upload a PDF file to enable the summary button.")
 
 
-# Review + To‑Do layout
-col1, col2 = st.columns([4, 2])
-
-with col1:
-    st.subheader("📄 Review")
-    if st.session_state.review:
-        st.markdown(
-            f"""
-            <div style="
-                height:400px; 
-                overflow-y:auto; 
-                border:1px solid #CCC; 
-                padding:15px; 
-                border-radius:8px; 
-                font-size:18px;
-                line-height:1.6;
-            ">
-                {st.session_state.review}
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-    else:
-        st.info("Upload PDF and proceed.")
-
-with col2:
-    st.subheader("✅ To‑Do List")
-    if st.session_state.todo_items:
-        todo_html = "".join(
-            f"""
-            <label style="
-                display:block; 
-                margin-bottom:8px; 
-                font-size:18px; 
-                cursor:pointer;
-            ">
-                <input type="checkbox" style="margin-right:6px;">
-                {item.strip()}
-            </label>
-            """
-            for item in st.session_state.todo_items
-        )
-        st.markdown(
-            f"""
-            <div style="
-                height:400px; 
-                overflow-y:auto; 
-                border:1px solid #CCC; 
-                padding:15px; 
-                border-radius:8px; 
-                font-size:14px;
-            ">
-                {todo_html}
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-    else:
-        st.info("Upload PDF and proceed.")
-
+# Background job: pick up progress / partial output (also after a browser refresh via ?job=)
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+job = job_queue().get(job_id) if job_id else None
+if job:
+    st.session_state.job_id = job_id
+    st.session_state.review = job["review"] or st.session_state.review
+    st.session_state.todo_items = job["todo"] or st.session_state.todo_items
+    if job["status"] == "queued":
+        status_box.info(f"⏳ Waiting for a free reviewer slot (position {job.get('position', 1)} in the queue)...")
+    elif job["status"] == "running":
+        status_box.info(f"🔄 {job['progress'] or 'Reviewing...'}")
+    elif job["status"] == "done":
+        st.session_state.review_metrics = job["result"]["review_metrics"]
+        status_box.success("✅ Manuscript reviewed successfully!")
+    elif job["status"] == "failed":
+        status_box.error(f"Review failed: {job['error']}")
+
+# Final render (also restores results on reruns)
+render_review(review_box, st.session_state.review)
+render_todo(todo_box, st.session_state.todo_items)
+
+if st.session_state.review_metrics and "time_to_first_output_s" in st.session_state.review_metrics:
+    col1.caption(f"First review tokens after {st.session_state.review_metrics['time_to_first_output_s']:.1f}s")
+
+# the page is up: start loading the heavy models (no-op after the first run)
+warm_retrieval()
+
+if job and job["status"] in ACTIVE:
+    time.sleep(JOB_POLL_S)
+    st.rerun()
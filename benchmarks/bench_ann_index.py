@@ -0,0 +1,72 @@
+# bench_ann_index.py
+# python benchmarks/bench_ann_index.py --sizes 10000 100000 300000 --types flat hnsw ivf_flat ivf_pq ivf_sq8
+"""recall@k against the flat index, per-query latency, build time and index memory per ANN type (synthetic embeddings)."""
+import os, sys, time, argparse, statistics
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ann_index import INDEX_DEFAULTS, build_index, index_bytes
+
+
+def _vectors(n, dim, rng, centers):
+    # clustered like real topic embeddings, so IVF / PQ behave realistically
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+
+def _search(index, queries, k):
+    lat, hits = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        lat.append(time.perf_counter() - t0)
+        hits.append(I[0])
+    return np.array(hits), lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--types", nargs="+", default=list(INDEX_DEFAULTS), choices=list(INDEX_DEFAULTS))
+    ap.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 embedding size")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, default=None, help="override the IVF default")
+    ap.add_argument("--ef-search", type=int, default=None, help="override the HNSW default")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((256, args.dim)).astype("float32")
+    queries = _vectors(args.queries, args.dim, rng, centers)
+
+    print(f"dim={args.dim}  k={args.k}  queries={args.queries}  threads={faiss.omp_get_max_threads()}")
+    print(f"{'n':>9} {'type':>9} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8} {'MiB':>8}")
+    for n in args.sizes:
+        corpus = _vectors(n, args.dim, rng, centers)
+        truth = None
+        for kind in ["flat"] + [t for t in args.types if t != "flat"]:
+            config = {"type": kind}
+            if kind.startswith("ivf") and args.nprobe:
+                config["nprobe"] = args.nprobe
+            if kind == "hnsw" and args.ef_search:
+                config["efSearch"] = args.ef_search
+            t0 = time.perf_counter()
+            index, _ = build_index(corpus, config=config)
+            build_s = time.perf_counter() - t0
+            I, lat = _search(index, queries, args.k)
+            if truth is None:
+                truth = I
+            if kind not in args.types:
+                continue
+            recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(I, truth)])
+            lat = sorted(lat)
+            p95 = lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+            print(f"{n:>9} {kind:>9} {recall:>9.3f} {statistics.median(lat)*1000:>8.2f} {p95*1000:>8.2f} "
+                  f"{build_s:>8.1f} {index_bytes(index) / 2**20:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
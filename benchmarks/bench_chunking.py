@@ -0,0 +1,42 @@
+# bench_chunking.py
+# python benchmarks/bench_chunking.py --pdf-dir eval/pdfs --chunk-tokens 3000
+"""LLM calls and map-phase input tokens: 8000-char slicing vs. section-aware token chunking."""
+import os, sys, glob, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunking import DEFAULT_CHUNK_TOKENS, char_chunks, chunk_text, count_tokens
+from src.pdf_utilities import CHUNK_SYSTEM_PROMPT, extract_full_text
+
+# per-call prompt overhead around each chunk (system prompt + user template)
+USER_TEMPLATE = "Summarize this passage:\n\n\n\nFocus on key details, simplify language but keep all results and comparisons."
+
+
+def _cost(chunks, overhead):
+    # map calls + one merge call
+    return len(chunks) + 1, sum(count_tokens(c) + overhead for c in chunks)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf-dir", default="eval/pdfs")
+    ap.add_argument("--chunk-size", type=int, default=8000, help="characters, old slicing")
+    ap.add_argument("--chunk-tokens", type=int, default=DEFAULT_CHUNK_TOKENS)
+    ap.add_argument("--drop", nargs="*", default=["references"], help="section kinds to skip")
+    args = ap.parse_args()
+
+    overhead = count_tokens(CHUNK_SYSTEM_PROMPT) + count_tokens(USER_TEMPLATE)
+    old_calls = old_tokens = new_calls = new_tokens = 0
+    print(f"{'paper':<32} {'old calls':>9} {'old tok':>8} {'new calls':>9} {'new tok':>8}")
+    for pdf in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        text = extract_full_text(pdf)
+        oc, ot = _cost(char_chunks(text, args.chunk_size), overhead)
+        nc, nt = _cost(chunk_text(text, max_tokens=args.chunk_tokens, drop=tuple(args.drop)), overhead)
+        old_calls += oc; old_tokens += ot; new_calls += nc; new_tokens += nt
+        print(f"{os.path.basename(pdf)[:32]:<32} {oc:>9} {ot:>8} {nc:>9} {nt:>8}")
+
+    print(f"\ncalls:  {old_calls} -> {new_calls}  (saved {old_calls - new_calls}, {1 - new_calls / old_calls:.0%})")
+    print(f"tokens: {old_tokens} -> {new_tokens}  (saved {old_tokens - new_tokens}, {1 - new_tokens / old_tokens:.0%})")
+
+
+if __name__ == "__main__":
+    main()
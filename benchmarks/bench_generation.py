@@ -0,0 +1,130 @@
+# bench_generation.py
+# python benchmarks/bench_generation.py --pdf-dir eval/pdfs --limit 5
+"""
+Review + to-do generation: the two-call flow vs. one combined JSON call vs. a text-only to-do call.
+
+Each paper is prepared once (text, summary, reference, image payload through the
+review DAG with generate=False), then every --modes entry generates the review and
+to-do list from the same inputs. Reported per mode: API calls, image payloads sent,
+prompt / completion tokens (from the API usage), estimated vision tokens, request
+bytes (stub only) and latency. Runs against the local stub server unless --base-url is given.
+"""
+import os, sys, json, glob, time, tempfile, argparse, statistics, urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["REVIEW_LLM_CACHE"] = "0"  # measure real calls, not cache hits
+
+from stub_server import start_stub_server
+from src.doc_store import DocumentStore
+from src.image_payload import DEFAULT_IMAGE_OPTIONS
+from src.llm_client import make_client
+from src.rag_pipeline_run import GENERATION_MODES, generate_review, generate_review_and_todo, generate_todo
+from src.review_dag import run_review_dag
+from src.tracing import Trace
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _stub_stats(base_url, reset=False):
+    root = base_url.rsplit("/v1", 1)[0]
+    req = urllib.request.Request(root + ("/stats/reset" if reset else "/stats"), data=b"" if reset else None)
+    with urllib.request.urlopen(req) as r:
+        return json.loads(r.read())
+
+
+def generate(client, mode, summary, reference, images):
+    if mode == "combined":
+        return generate_review_and_todo(client, summary, reference, images)
+    review = generate_review(client, summary, reference, images)
+    return review, generate_todo(client, summary, review, None if mode == "text_todo" else images)
+
+
+def run_mode(client, mode, doc, base_url=None):
+    if base_url:
+        _stub_stats(base_url, reset=True)
+    with Trace("generation", mode=mode) as trace:
+        t0 = time.perf_counter()
+        review, todo = generate(client, mode, doc["summary"], doc["ref"], doc["image_payload"])
+        latency = time.perf_counter() - t0
+    llm_spans = [s for s in trace.to_dict()["spans"] if s["name"] == "llm"]
+    image_sends = sum(1 for s in llm_spans if s["attrs"].get("image_bytes"))
+    totals = trace.totals()
+    result = {
+        "latency_s": latency,
+        "calls": len(llm_spans),
+        "image_sends": image_sends,
+        "prompt_tokens": totals["prompt_tokens"],
+        "completion_tokens": totals["completion_tokens"],
+        "image_tokens_est": image_sends * (doc["image_payload"].get("tokens") or 0),
+        "review_chars": len(review),
+        "todo_items": len(todo),
+    }
+    if base_url:
+        result["request_bytes"] = _stub_stats(base_url)["request_bytes"]
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf-dir", default="eval/pdfs")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--modes", nargs="+", choices=GENERATION_MODES, default=list(GENERATION_MODES))
+    ap.add_argument("--base-url", default=None, help="use an external endpoint instead of the in-process stub")
+    ap.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", "stub-key"))
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--token-latency", type=float, default=0.005)
+    ap.add_argument("--out", default=None, help=f"default: {RESULTS_DIR}/generation-<timestamp>.json")
+    args = ap.parse_args()
+
+    stub = args.base_url is None
+    base_url = args.base_url
+    if stub:
+        _, _, base_url = start_stub_server(first_token_latency=args.first_token_latency,
+                                           token_latency=args.token_latency)
+    client = make_client(args.api_key, base_url)
+
+    pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))[: args.limit]
+    papers = []
+    with tempfile.TemporaryDirectory(prefix="bench_store_") as store_dir:
+        store = DocumentStore(store_dir)
+        for pdf in pdfs:
+            doc = run_review_dag(client, pdf, store=store, image_options=DEFAULT_IMAGE_OPTIONS, generate=False)
+            paper = {"pdf": os.path.basename(pdf), "modes": {}}
+            for mode in args.modes:
+                paper["modes"][mode] = r = run_mode(client, mode, doc, base_url if stub else None)
+                print(f"{paper['pdf'][:32]:<32} {mode:<10} {r['latency_s']:6.2f}s  calls {r['calls']}  "
+                      f"images {r['image_sends']}  prompt {r['prompt_tokens']:>7}  completion {r['completion_tokens']:>6}")
+            papers.append(paper)
+    if not papers:
+        ap.error(f"no PDFs found in {args.pdf_dir}")
+
+    keys = ("latency_s", "calls", "image_sends", "prompt_tokens", "completion_tokens", "image_tokens_est") + \
+           (("request_bytes",) if stub else ())
+    summary = {mode: {k: statistics.mean(p["modes"][mode][k] for p in papers) for k in keys} for mode in args.modes}
+    print(f"\n{'mode':<10} {'latency':>8} {'calls':>6} {'images':>7} {'prompt tok':>11} {'compl tok':>10} "
+          f"{'img tok est':>12}" + (f" {'sent KB':>9}" if stub else ""))
+    for mode, s in summary.items():
+        print(f"{mode:<10} {s['latency_s']:>7.2f}s {s['calls']:>6.1f} {s['image_sends']:>7.1f} {s['prompt_tokens']:>11.0f} "
+              f"{s['completion_tokens']:>10.0f} {s['image_tokens_est']:>12.0f}"
+              + (f" {s['request_bytes'] / 1024:>9.0f}" if stub else ""))
+    base = summary.get("separate")
+    if base:
+        print("\nvs. separate (two calls with images):")
+        for mode, s in summary.items():
+            if mode == "separate":
+                continue
+            change = {k: s[k] / base[k] - 1 for k in ("latency_s", "prompt_tokens", "image_tokens_est") if base[k]}
+            print(f"  {mode:<10} " + ", ".join(f"{k} {v:+.0%}" for k, v in change.items()))
+
+    report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "config": {k: v for k, v in vars(args).items() if k != "api_key"},
+              "summary": summary, "papers": papers}
+    out = args.out or os.path.join(RESULTS_DIR, f"generation-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
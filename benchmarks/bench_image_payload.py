@@ -0,0 +1,46 @@
+# bench_image_payload.py
+# python benchmarks/bench_image_payload.py --pdf-dir eval/pdfs
+"""Image payload per request: legacy 150-dpi PNG grid vs. budgeted parts (bytes, estimated vision tokens, time)."""
+import io, os, sys, glob, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.pdf_utilities import render_grid_png
+from src.image_payload import estimate_image_tokens, payload_from_png, prepare_image_payload
+from PIL import Image
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf-dir", default="eval/pdfs")
+    ap.add_argument("--pages-per-image", type=int, default=2)
+    ap.add_argument("--fmt", default="JPEG", choices=["PNG", "JPEG", "WEBP"])
+    ap.add_argument("--quality", type=int, default=80)
+    ap.add_argument("--max-image-tokens", type=int, default=None)
+    args = ap.parse_args()
+
+    totals = {"legacy_bytes": 0, "legacy_tokens": 0, "new_bytes": 0, "new_tokens": 0, "legacy_s": 0.0, "new_s": 0.0}
+    print(f"{'paper':<32} {'legacy KB':>10} {'legacy tok':>10} {'new KB':>8} {'parts':>5} {'new tok':>8}")
+    for pdf in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        t0 = time.perf_counter()
+        png = render_grid_png(pdf)
+        legacy = payload_from_png(png)
+        with Image.open(io.BytesIO(png)) as im:
+            legacy_tokens = estimate_image_tokens(*im.size)
+        t1 = time.perf_counter()
+        new = prepare_image_payload(pdf, pages_per_image=args.pages_per_image, fmt=args.fmt,
+                                    quality=args.quality, max_image_tokens=args.max_image_tokens)
+        t2 = time.perf_counter()
+
+        totals["legacy_bytes"] += legacy["bytes"]; totals["legacy_tokens"] += legacy_tokens
+        totals["new_bytes"] += new["bytes"]; totals["new_tokens"] += new["tokens"]
+        totals["legacy_s"] += t1 - t0; totals["new_s"] += t2 - t1
+        print(f"{os.path.basename(pdf)[:32]:<32} {legacy['bytes']/1024:>10.0f} {legacy_tokens:>10} "
+              f"{new['bytes']/1024:>8.0f} {len(new['parts']):>5} {new['tokens']:>8}")
+
+    print(f"\nlegacy: {totals['legacy_bytes']/2**20:.1f} MB, ~{totals['legacy_tokens']} image tokens, {totals['legacy_s']:.1f}s to prepare")
+    print(f"new:    {totals['new_bytes']/2**20:.1f} MB, ~{totals['new_tokens']} image tokens, {totals['new_s']:.1f}s to prepare")
+    print("(per paper each payload is sent twice: review + to-do)")
+
+
+if __name__ == "__main__":
+    main()
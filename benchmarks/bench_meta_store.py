@@ -0,0 +1,72 @@
+# bench_meta_store.py
+# python benchmarks/bench_meta_store.py --sizes 1000 100000 1000000
+"""Meta lookup: parse all of meta.jsonl (load_meta) vs. offset-indexed MetaStore — open time, top-k lookup latency, RSS."""
+import os, sys, json, time, random, argparse, statistics, subprocess, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _write_corpus(path, n, abstract_chars, review_chars):
+    rng = random.Random(0)
+    words = "model training graph neural network attention loss dataset baseline results ablation".split()
+    def text(chars):
+        return " ".join(rng.choice(words) for _ in range(chars // 7))[:chars]
+    abstract, review = text(abstract_chars), text(review_chars)  # sizes matter, not content
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"paper_{i}", "title": f"Paper {i} {rng.choice(words)}",
+                                "abstract": "Abstract:###" + abstract, "review": "Review:###" + review}) + "\n")
+
+
+def _worker(mode, index_dir, n, lookups, k):
+    """Runs in a fresh process so RSS reflects only this approach."""
+    from src.rag_retrieve import load_meta
+    from src.meta_store import open_meta
+
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    metas = load_meta(index_dir) if mode == "load_meta" else open_meta(index_dir)
+    open_s = time.perf_counter() - t0
+    rng = random.Random(1)
+    lat = []
+    for _ in range(lookups):
+        rows = [rng.randrange(n) for _ in range(k)]
+        t0 = time.perf_counter()
+        _ = [metas[i]["review"] for i in rows]
+        lat.append(time.perf_counter() - t0)
+    print(json.dumps({"open_s": open_s, "p50_us": statistics.median(lat) * 1e6, "rss_mb": _rss_mb() - base}))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000])
+    ap.add_argument("--abstract-chars", type=int, default=1200)
+    ap.add_argument("--review-chars", type=int, default=3000)
+    ap.add_argument("--lookups", type=int, default=2000)
+    ap.add_argument("-k", type=int, default=2)
+    ap.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        mode, index_dir, n = args.worker
+        return _worker(mode, index_dir, int(n), args.lookups, args.k)
+
+    print(f"{'rows':>9} {'approach':>10} {'open s':>8} {'lookup p50 us':>14} {'RSS MiB':>9}")
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as index_dir:
+            _write_corpus(os.path.join(index_dir, "meta.jsonl"), n, args.abstract_chars, args.review_chars)
+            for mode in ("load_meta", "meta_store"):
+                out = subprocess.run([sys.executable, __file__, "--worker", mode, index_dir, str(n),
+                                      "--lookups", str(args.lookups), "-k", str(args.k)],
+                                     capture_output=True, text=True, check=True).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                print(f"{n:>9} {mode:>10} {r['open_s']:>8.2f} {r['p50_us']:>14.1f} {r['rss_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
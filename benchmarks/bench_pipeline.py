@@ -0,0 +1,149 @@
+# bench_pipeline.py
+# python benchmarks/bench_pipeline.py --pdf-dir eval/pdfs --limit 5 --compare benchmarks/results/baseline.json
+"""
+End-to-end pipeline benchmark against the local stub server (or any --base-url).
+
+Runs the review DAG over each PDF with a fresh document store and the completion
+cache disabled, and reports per-stage wall time and CPU time, peak RSS and API
+payload bytes. Results are saved as JSON; --compare flags stages that regressed.
+"""
+import os, sys, json, glob, time, tempfile, argparse, resource, statistics, platform, subprocess, urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["REVIEW_LLM_CACHE"] = "0"  # measure real work, not cache hits
+
+from stub_server import start_stub_server
+from src.doc_store import DocumentStore, pdf_digest
+from src.image_payload import DEFAULT_IMAGE_OPTIONS
+from src.llm_client import make_client
+from src.rag_retrieve import get_engine
+from src.review_dag import build_review_stages
+from src.stage_scheduler import run_stages
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if platform.system() == "Darwin" else rss / 1024
+
+
+def _stub_stats(base_url, reset=False):
+    root = base_url.rsplit("/v1", 1)[0]
+    req = urllib.request.Request(root + ("/stats/reset" if reset else "/stats"), data=b"" if reset else None)
+    with urllib.request.urlopen(req) as r:
+        return json.loads(r.read())
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def summarize(papers):
+    stages = sorted({s for p in papers for s in p["stages"]})
+    out = {}
+    for s in stages:
+        walls = [p["stages"][s]["wall_s"] for p in papers if s in p["stages"]]
+        cpus = [p["stages"][s].get("cpu_s", 0.0) for p in papers if s in p["stages"]]
+        out[s] = {"wall_mean_s": statistics.mean(walls), "wall_max_s": max(walls), "cpu_mean_s": statistics.mean(cpus)}
+    return out
+
+
+def compare(current, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)["summary"]
+    print(f"\ncompared with {baseline_path} (regression threshold {threshold:.0%})")
+    regressions = 0
+    for stage, cur in current.items():
+        if stage not in base:
+            continue
+        old, new = base[stage]["wall_mean_s"], cur["wall_mean_s"]
+        change = (new - old) / old if old else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"  {stage:<10} {old:8.2f}s -> {new:8.2f}s  ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf-dir", default="eval/pdfs")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--base-url", default=None, help="use an external endpoint instead of the in-process stub")
+    ap.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", "stub-key"))
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--token-latency", type=float, default=0.005)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--serial", action="store_true", help="run stages one at a time (pre-DAG behaviour)")
+    ap.add_argument("--legacy-image", action="store_true")
+    ap.add_argument("--out", default=None, help=f"default: {RESULTS_DIR}/pipeline-<timestamp>.json")
+    ap.add_argument("--compare", default=None, help="baseline results JSON")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args()
+
+    stub = args.base_url is None
+    base_url = args.base_url
+    if stub:
+        _, _, base_url = start_stub_server(first_token_latency=args.first_token_latency,
+                                           token_latency=args.token_latency, error_rate=args.error_rate)
+    client = make_client(args.api_key, base_url)
+    image_options = None if args.legacy_image else DEFAULT_IMAGE_OPTIONS
+
+    t0 = time.perf_counter()
+    get_engine().warm()
+    warmup_s = time.perf_counter() - t0
+
+    pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))[: args.limit]
+    papers = []
+    with tempfile.TemporaryDirectory(prefix="bench_store_") as store_dir:
+        store = DocumentStore(store_dir)
+        for pdf in pdfs:
+            if stub:
+                _stub_stats(base_url, reset=True)
+            with open(pdf, "rb") as f:
+                digest = pdf_digest(f.read())
+            stages = build_review_stages(client, pdf, digest, store=store, image_options=image_options)
+            cpu0 = time.process_time()
+            _, timings = run_stages(stages, max_workers=1 if args.serial else 4)
+            paper = {
+                "pdf": os.path.basename(pdf),
+                "stages": timings,
+                "cpu_s": time.process_time() - cpu0,
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+            if stub:
+                paper["api"] = _stub_stats(base_url)
+            papers.append(paper)
+            api = paper.get("api", {})
+            print(f"{paper['pdf'][:40]:<40} total {timings['total']['wall_s']:7.2f}s  cpu {paper['cpu_s']:6.2f}s  "
+                  f"rss {paper['peak_rss_mb']:7.0f} MB  sent {api.get('request_bytes', 0) / 1024:8.0f} KB")
+
+    summary = summarize(papers)
+    print(f"\n{'stage':<10} {'wall mean':>10} {'wall max':>10} {'cpu mean':>10}")
+    for stage, s in summary.items():
+        print(f"{stage:<10} {s['wall_mean_s']:>9.2f}s {s['wall_max_s']:>9.2f}s {s['cpu_mean_s']:>9.2f}s")
+
+    report = {
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k != "api_key"},
+        "engine_warmup_s": warmup_s,
+        "peak_rss_mb": _peak_rss_mb(),
+        "summary": summary,
+        "papers": papers,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+
+    if args.compare and compare(summary, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# bench_retrieval.py
+# python benchmarks/bench_retrieval.py --queries 20
+"""Per-query retrieval latency: cold (reload everything per query, the old behaviour) vs. warm engine."""
+import os, sys, time, argparse, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.rag_retrieve import INDEX_DIR, RetrievalEngine, clear_shared_encoders, load_meta
+
+
+def _report(name, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:>6}: n={len(latencies):3d}  mean={statistics.mean(latencies)*1000:9.1f} ms  "
+          f"p50={p50*1000:9.1f} ms  p95={p95*1000:9.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--index-dir", default=INDEX_DIR)
+    ap.add_argument("--queries", type=int, default=20)
+    ap.add_argument("--cold-queries", type=int, default=3, help="cold runs are slow; keep this small")
+    ap.add_argument("-k", type=int, default=2)
+    args = ap.parse_args()
+
+    metas = load_meta(args.index_dir)
+    queries = [(m["title"], m["abstract"]) for m in metas[: args.queries]]
+
+    cold = []
+    for title, abstract in queries[: args.cold_queries]:
+        clear_shared_encoders()  # otherwise every new engine reuses the process-wide encoder
+        t0 = time.perf_counter()
+        RetrievalEngine(args.index_dir).search(title, abstract, args.k)
+        cold.append(time.perf_counter() - t0)
+
+    clear_shared_encoders()
+    engine = RetrievalEngine(args.index_dir)
+    t0 = time.perf_counter()
+    engine.warm()
+    warmup = time.perf_counter() - t0
+
+    warm = []
+    for title, abstract in queries:
+        t0 = time.perf_counter()
+        engine.search(title, abstract, args.k)
+        warm.append(time.perf_counter() - t0)
+
+    print(f"index: {args.index_dir}  k={args.k}")
+    print(f"one-off warm-up: {warmup*1000:.1f} ms")
+    _report("cold", cold)
+    _report("warm", warm)
+    print(f"speed-up (median): {statistics.median(cold) / statistics.median(warm):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
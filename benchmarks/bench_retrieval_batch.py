@@ -0,0 +1,52 @@
+# bench_retrieval_batch.py
+# python benchmarks/bench_retrieval_batch.py --batch-sizes 1 32 256
+"""Retrieval throughput (queries/sec): one-by-one get_topk_reviews vs. get_topk_reviews_batch."""
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.rag_retrieve import INDEX_DIR, get_engine, get_topk_reviews, get_topk_reviews_batch, load_meta
+
+
+def _qps(fn, n, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return n / best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256])
+    ap.add_argument("-k", type=int, default=2)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    metas = load_meta(INDEX_DIR)
+    get_engine(INDEX_DIR).warm()  # measure steady state, not model loading
+
+    print(f"{'batch':>6} {'serial q/s':>12} {'batched q/s':>12} {'speed-up':>9}")
+    for bs in args.batch_sizes:
+        papers = [(m["title"], m["abstract"]) for m in (metas * (bs // len(metas) + 1))[:bs]]
+
+        def serial():
+            for t, a in papers:
+                get_topk_reviews(t, a, k=args.k)
+
+        def batched():
+            get_topk_reviews_batch(papers, k=args.k)
+
+        # serial path prints every hit; keep the table readable
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                serial_qps = _qps(serial, bs, args.repeat)
+            finally:
+                sys.stdout = stdout
+        batched_qps = _qps(batched, bs, args.repeat)
+        print(f"{bs:>6} {serial_qps:>12.1f} {batched_qps:>12.1f} {batched_qps / serial_qps:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# bench_shards.py
+# python benchmarks/bench_shards.py --corpus 200000 --shards 4
+"""Per-query search latency: one monolithic corpus vs. routing to a single venue shard (synthetic embeddings)."""
+import os, sys, time, argparse, statistics
+
+import numpy as np
+import faiss
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _vectors(n, dim, rng):
+    x = rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(x)
+    return x
+
+
+def _latencies(index, queries, k):
+    out = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q[None, :], k)
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:>12}: p50={statistics.median(latencies)*1000:8.2f} ms  p95={p95*1000:8.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", type=int, default=200_000, help="total reviews across all venues")
+    ap.add_argument("--shards", type=int, default=4, help="venues / years the corpus is split into")
+    ap.add_argument("--dim", type=int, default=384, help="all-MiniLM-L6-v2 embedding size")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=2)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    corpus = _vectors(args.corpus, args.dim, rng)
+    queries = _vectors(args.queries, args.dim, rng)
+
+    mono = faiss.IndexFlatIP(args.dim)
+    mono.add(corpus)
+    shard = faiss.IndexFlatIP(args.dim)
+    shard.add(corpus[: args.corpus // args.shards])
+
+    print(f"corpus={args.corpus}  shards={args.shards}  dim={args.dim}  k={args.k}  threads={faiss.omp_get_max_threads()}")
+    mono_lat = _latencies(mono, queries, args.k)
+    shard_lat = _latencies(shard, queries, args.k)
+    _report("monolithic", mono_lat)
+    _report("one shard", shard_lat)
+    print(f"speed-up (median): {statistics.median(mono_lat) / statistics.median(shard_lat):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
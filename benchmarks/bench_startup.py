@@ -0,0 +1,149 @@
+# bench_startup.py
+# python benchmarks/bench_startup.py --compare benchmarks/results/startup-baseline.json
+"""
+App startup cost, each measurement in a fresh interpreter so nothing is pre-imported.
+
+- imports: ``python -X importtime`` over the modules app.py imports; reports the
+  total, the slowest top-level packages and whether any heavy dependency
+  (fitz, PIL, numpy, faiss, sentence_transformers, torch, openai) was pulled in.
+  --eager additionally imports the heavy modules, i.e. the cost before lazy imports.
+- first render: process start -> first complete script run of app.py under
+  streamlit.testing's AppTest (skipped when streamlit is not installed).
+
+Results are saved as JSON; --compare flags metrics that regressed.
+"""
+import os, sys, json, time, argparse, subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.lazy_imports import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# what app.py imports from the package
+APP_MODULES = ("src.image_payload", "src.jobs", "src.lazy_imports", "src.llm_client", "src.tracing",
+               "src.rag_retrieve", "src.rag_router")
+WATCHED = ("fitz", "PIL", "numpy", "faiss", "sentence_transformers", "torch", "openai", "httpx")
+
+FIRST_RENDER = """
+import time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout={timeout})
+at.run()
+print(time.perf_counter() - t0, len(at.exception))
+"""
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, cwd=ROOT).strip()
+    except Exception:
+        return "unknown"
+
+
+def import_profile(modules, top: int = 10) -> dict:
+    """Run ``python -X importtime -c 'import ...'`` and parse its stderr report."""
+    code = "import sys; " + "; ".join(f"import {m}" for m in modules) + \
+           f"; print(','.join(m for m in {WATCHED!r} if m in sys.modules))"
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # nesting = leading spaces in the name column
+        entries.append({"name": name.strip(), "depth": depth, "self_s": int(self_us) / 1e6,
+                        "cumulative_s": int(cumulative_us) / 1e6})
+    top_level = [e for e in entries if e["depth"] == 0]
+    return {
+        "modules": list(modules),
+        "wall_s": wall,
+        "import_s": sum(e["cumulative_s"] for e in top_level),
+        "heavy_loaded": [m for m in proc.stdout.strip().split(",") if m],
+        "slowest": sorted(top_level, key=lambda e: -e["cumulative_s"])[:top],
+    }
+
+
+def first_render(timeout: float) -> dict:
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", FIRST_RENDER.format(timeout=timeout)], cwd=ROOT,
+                          capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if proc.returncode:
+        return {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+    script_s, exceptions = proc.stdout.strip().splitlines()[-1].split()
+    return {"process_s": wall, "script_s": float(script_s), "exceptions": int(exceptions)}
+
+
+def _print_profile(label, prof):
+    print(f"\n{label}: {prof['import_s']:.2f}s imports, {prof['wall_s']:.2f}s process "
+          f"(heavy loaded: {', '.join(prof['heavy_loaded']) or 'none'})")
+    for e in prof["slowest"]:
+        print(f"  {e['name']:<36} {e['cumulative_s']:7.3f}s")
+
+
+def compare(report, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\ncompared with {baseline_path} (regression threshold {threshold:.0%})")
+    metrics = [("app imports", ("imports", "import_s")),
+               ("first render", ("first_render", "process_s"))]
+    regressions = 0
+    for label, (section, key) in metrics:
+        old, new = base.get(section, {}).get(key), report.get(section, {}).get(key)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        regressions += bool(flag)
+        print(f"  {label:<14} {old:8.2f}s -> {new:8.2f}s  ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--eager", action="store_true", help="also profile importing the heavy modules up front")
+    ap.add_argument("--no-render", action="store_true", help="skip the first-render measurement")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--out", default=None, help=f"default: {RESULTS_DIR}/startup-<timestamp>.json")
+    ap.add_argument("--compare", default=None, help="baseline results JSON")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args()
+
+    report = {"git_rev": _git_rev(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": vars(args)}
+    report["imports"] = import_profile(APP_MODULES, args.top)
+    _print_profile("app imports", report["imports"])
+    if args.eager:
+        available = [m for m in HEAVY_MODULES
+                     if subprocess.run([sys.executable, "-c", f"import {m}"], capture_output=True).returncode == 0]
+        report["eager_imports"] = import_profile(APP_MODULES + tuple(available), args.top)
+        _print_profile("app + heavy imports (eager)", report["eager_imports"])
+
+    if not args.no_render:
+        report["first_render"] = first_render(args.timeout)
+        fr = report["first_render"]
+        if "error" in fr:
+            print(f"\nfirst render: skipped ({fr['error']})")
+        else:
+            print(f"\nfirst render: {fr['process_s']:.2f}s from process start "
+                  f"({fr['script_s']:.2f}s in AppTest, {fr['exceptions']} exception(s))")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nsaved {out}")
+
+    if args.compare and compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
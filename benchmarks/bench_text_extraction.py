@@ -0,0 +1,37 @@
+# bench_text_extraction.py
+# python benchmarks/bench_text_extraction.py --pdf-dir eval/pdfs --processes 1 4
+"""Text extraction per backend over a PDF directory: total time and pages/sec."""
+import os, sys, glob, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.pdf_text import BACKENDS, extract_pages
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf-dir", default="eval/pdfs")
+    ap.add_argument("--backends", nargs="+", default=sorted(BACKENDS))
+    ap.add_argument("--processes", type=int, nargs="+", default=[1])
+    args = ap.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    print(f"{len(pdfs)} PDFs from {args.pdf_dir}\n")
+    print(f"{'backend':<12} {'procs':>5} {'pages':>6} {'chars':>10} {'total s':>8} {'pages/s':>8}")
+    for backend in args.backends:
+        for procs in args.processes:
+            pages = chars = 0
+            t0 = time.perf_counter()
+            try:
+                for pdf in pdfs:
+                    texts = extract_pages(pdf, backend=backend, processes=procs)
+                    pages += len(texts)
+                    chars += sum(len(t) for t in texts)
+            except ImportError as e:
+                print(f"{backend:<12} {procs:>5}  skipped ({e})")
+                continue
+            total = time.perf_counter() - t0
+            print(f"{backend:<12} {procs:>5} {pages:>6} {chars:>10} {total:>8.2f} {pages / total:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
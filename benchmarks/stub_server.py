@@ -0,0 +1,176 @@
+# stub_server.py
+# python benchmarks/stub_server.py --port 8001 --token-latency 0.005 --error-rate 0.05
+"""
+Local OpenAI-compatible chat-completions stub for offline latency benchmarks.
+
+POST /v1/chat/completions   canned response chosen from the system prompt, streaming supported
+GET  /stats                 request / byte counters (POST /stats/reset to zero them)
+
+Point the app or CLI at it through the base URL setting, e.g. http://127.0.0.1:8001/v1
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED = {
+    "reference": json.dumps({
+        "weaknesses": ["Insufficient ablation studies.", "Unclear presentation of the method."],
+        "improvements": ["Add experiments on more datasets.", "Clarify notation in Section 3."],
+    }),
+    "review": "**1. Summary**  \nThe paper proposes a method. " + "It is evaluated on standard benchmarks. " * 120
+              + "\n\n**3. Weaknesses**  \n- Section 3.1 lacks an ablation study.\n- Figure 2 caption is ambiguous.\n",
+    "todo": "\n".join(f"- Revise section {i}: Clarify the argument [Section {i}]" for i in range(1, 11)),
+    "summary": "### Overview\n" + "The passage describes the model, datasets and results in detail. " * 80,
+}
+# structured-output reply for the combined review + to-do call (response_format json_schema)
+CANNED["combined"] = json.dumps({
+    "summary": "The paper proposes a method. " + "It is evaluated on standard benchmarks. " * 100,
+    "strengths": "- Clear motivation.\n- Strong results on standard benchmarks.",
+    "weaknesses": "- Section 3.1 lacks an ablation study.\n- Figure 2 caption is ambiguous.",
+    "clarity_reproducibility": "Hyperparameters are listed; code availability is not mentioned.",
+    "novelty_significance": "Incremental but useful.",
+    "todo": [f"Revise section {i}: Clarify the argument [Section {i}]" for i in range(1, 11)],
+})
+
+
+def pick_response(messages, response_format=None) -> str:
+    if (response_format or {}).get("type") == "json_schema":
+        return CANNED["combined"]
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    if isinstance(system, list):
+        system = " ".join(p.get("text", "") for p in system if isinstance(p, dict))
+    if "valid JSON" in system:
+        return CANNED["reference"]
+    if "To-Do" in system:
+        return CANNED["todo"]
+    if "esteemed academic reviewer" in system:
+        return CANNED["review"]
+    return CANNED["summary"]
+
+
+class StubConfig:
+    def __init__(self, first_token_latency=0.3, token_latency=0.01, error_rate=0.0, error_status=429):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stats = {"requests": 0, "errors": 0, "stream_requests": 0,
+                      "request_bytes": 0, "response_bytes": 0, "completion_tokens": 0}
+
+    def count(self, **deltas):
+        with self.lock:
+            for k, v in deltas.items():
+                self.stats[k] += v
+
+
+def _make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            cfg.count(response_bytes=len(body))
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with cfg.lock:
+                    self._send_json(200, dict(cfg.stats))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.rstrip("/") == "/stats/reset":
+                with cfg.lock:
+                    cfg.reset()
+                return self._send_json(200, {"ok": True})
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "not found"}})
+
+            req = json.loads(raw or b"{}")
+            cfg.count(requests=1, request_bytes=len(raw), stream_requests=int(bool(req.get("stream"))))
+            if cfg.error_rate and random.random() < cfg.error_rate:
+                cfg.count(errors=1)
+                return self._send_json(cfg.error_status, {"error": {"message": "injected error", "type": "stub"}})
+
+            words = pick_response(req.get("messages", []), req.get("response_format")).split(" ")
+            words = words[: req.get("max_tokens") or len(words)]
+            prompt_tokens = len(raw) // 4
+            cfg.count(completion_tokens=len(words))
+            time.sleep(cfg.first_token_latency)
+
+            if req.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for i, w in enumerate(words):
+                    time.sleep(cfg.token_latency)
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": req.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": w + (" " if i < len(words) - 1 else "")},
+                                          "finish_reason": None}]}
+                    data = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                    self.wfile.write(data)
+                    cfg.count(response_bytes=len(data))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+
+            time.sleep(cfg.token_latency * len(words))
+            self._send_json(200, {
+                "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": req.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            })
+
+    return Handler
+
+
+def start_stub_server(host="127.0.0.1", port=0, **config):
+    """Start in a daemon thread; returns (server, config, base_url)."""
+    cfg = StubConfig(**config)
+    server = ThreadingHTTPServer((host, port), _make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, cfg, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--first-token-latency", type=float, default=0.3)
+    ap.add_argument("--token-latency", type=float, default=0.01, help="seconds per generated token")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=429)
+    args = ap.parse_args()
+    server, _, base_url = start_stub_server(args.host, args.port, first_token_latency=args.first_token_latency,
+                                            token_latency=args.token_latency, error_rate=args.error_rate,
+                                            error_status=args.error_status)
+    print(f"stub chat-completions server on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
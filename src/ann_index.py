@@ -0,0 +1,116 @@
+# ann_index.py
+"""
+FAISS index types for the review corpus, selected by a small config dict:
+
+    {"type": "flat"}                                    exact inner product (default)
+    {"type": "hnsw", "M": 32, "efConstruction": 200, "efSearch": 64}
+    {"type": "ivf_flat", "nlist": 1024, "nprobe": 16}
+    {"type": "ivf_pq", "nlist": 1024, "m": 48, "nbits": 8, "nprobe": 16}
+    {"type": "ivf_sq8", "nlist": 1024, "nprobe": 16}
+
+Missing keys take the defaults below ("nlist": "auto" scales with the corpus).
+The config is persisted as index.json next to encoder.json; search-time
+parameters (efSearch / nprobe) are re-applied when the index is loaded.
+"""
+import os
+import json
+import math
+
+from .lazy_imports import lazy_import
+
+faiss = lazy_import("faiss")
+
+INDEX_CONFIG_FILE = "index.json"
+INDEX_DEFAULTS = {
+    "flat": {},
+    "hnsw": {"M": 32, "efConstruction": 200, "efSearch": 64},
+    "ivf_flat": {"nlist": "auto", "nprobe": 16},
+    "ivf_pq": {"nlist": "auto", "nprobe": 16, "m": "auto", "nbits": 8},
+    "ivf_sq8": {"nlist": "auto", "nprobe": 16},
+}
+SEARCH_PARAMS = ("efSearch", "nprobe")
+# faiss wants ~39 training points per IVF list
+MIN_POINTS_PER_LIST = 39
+
+
+def resolve_config(config: dict = None, n: int = None, dim: int = None) -> dict:
+    """Fill defaults and resolve 'auto' values for a corpus of n vectors of size dim."""
+    config = dict(config or {"type": "flat"})
+    kind = config.setdefault("type", "flat")
+    if kind not in INDEX_DEFAULTS:
+        raise ValueError(f"unknown index type {kind!r}; choose from {sorted(INDEX_DEFAULTS)}")
+    config = {**INDEX_DEFAULTS[kind], **config}
+    if config.get("nlist") == "auto" and n is not None:
+        config["nlist"] = max(1, min(int(4 * math.sqrt(n)), n // MIN_POINTS_PER_LIST))
+    if config.get("m") == "auto" and dim is not None:
+        # PQ sub-quantizers must divide dim; aim for 8-dim sub-vectors
+        config["m"] = max(m for m in range(1, dim // 8 + 1) if dim % m == 0)
+    if "nprobe" in config and isinstance(config.get("nlist"), int):
+        config["nprobe"] = min(config["nprobe"], config["nlist"])
+    return config
+
+
+def build_index(vectors, ids=None, config: dict = None):
+    """
+    Build (and train) the configured index over normalized vectors.
+    With ids, the index is wrapped in IndexIDMap2 so rows can be addressed by stable id.
+    Returns (index, resolved_config).
+    """
+    n, dim = vectors.shape
+    config = resolve_config(config, n, dim)
+    kind = config["type"]
+    if kind.startswith("ivf") and n < MIN_POINTS_PER_LIST:
+        print(f"[ann_index] {n} vectors are too few to train {kind}; using flat")
+        config = resolve_config({"type": "flat"})
+        kind = "flat"
+
+    metric = faiss.METRIC_INNER_PRODUCT
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "hnsw":
+        base = faiss.IndexHNSWFlat(dim, config["M"], metric)
+        base.hnsw.efConstruction = config["efConstruction"]
+    else:
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            base = faiss.IndexIVFFlat(quantizer, dim, config["nlist"], metric)
+        elif kind == "ivf_pq":
+            base = faiss.IndexIVFPQ(quantizer, dim, config["nlist"], config["m"], config["nbits"], metric)
+        else:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, config["nlist"], faiss.ScalarQuantizer.QT_8bit, metric)
+        base.train(vectors)
+
+    index = faiss.IndexIDMap2(base) if ids is not None else base
+    if n:
+        if ids is not None:
+            index.add_with_ids(vectors, ids)
+        else:
+            index.add(vectors)
+    apply_search_params(index, config)
+    return index, config
+
+
+def apply_search_params(index, config: dict):
+    """Set efSearch / nprobe on the (possibly IDMap-wrapped) index."""
+    params = faiss.ParameterSpace()
+    for name in SEARCH_PARAMS:
+        if name in config:
+            params.set_index_parameter(index, name, config[name])
+
+
+def index_bytes(index) -> int:
+    """Serialized size, a close proxy for the index's resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def read_index_config(index_dir: str) -> dict:
+    path = os.path.join(index_dir, INDEX_CONFIG_FILE)
+    if not os.path.exists(path):
+        return {"type": "flat"}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_index_config(index_dir: str, config: dict):
+    with open(os.path.join(index_dir, INDEX_CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
@@ -0,0 +1,199 @@
+# async_client.py
+"""
+Process-wide async API layer shared by every session, job and batch worker.
+
+- one background event loop thread and one pooled ``httpx.AsyncClient``
+  (keep-alive, HTTP/2 when the ``h2`` package is installed and the endpoint supports it)
+- ``AsyncOpenAI`` clients per (api_key, base_url), all on that connection pool
+- a token-bucket ``RateLimiter`` for requests/min and tokens/min across the process
+- ``SyncClient``: a blocking ``.chat.completions.create(**kwargs)`` facade, so the
+  existing thread-based call sites (chat_completion / stream_chat_completion) keep working
+
+Limits come from REVIEW_RPM / REVIEW_TPM (0 disables a bucket).
+"""
+import os
+import time
+import asyncio
+import threading
+import importlib.util
+
+from .chunking import count_tokens
+from .tracing import METRICS
+
+DEFAULT_RPM = int(os.environ.get("REVIEW_RPM", "500"))
+DEFAULT_TPM = int(os.environ.get("REVIEW_TPM", "200000"))
+MAX_CONNECTIONS = int(os.environ.get("REVIEW_MAX_CONNECTIONS", "64"))
+REQUEST_TIMEOUT = 600.0
+# rough prompt-token charge per image part before the real usage is known
+IMAGE_TOKENS_ESTIMATE = 800
+DEFAULT_COMPLETION_RESERVE = 1024
+
+
+class RateLimiter:
+    """
+    Two token buckets (requests/min, tokens/min) refilled continuously.
+    acquire() reserves an estimate up front; settle() corrects it with the real usage,
+    which may leave the tokens bucket in debt until it refills.
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        self.rpm, self.tpm = rpm, tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._stamp = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._stamp = now - self._stamp, now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait until one request and ``tokens`` tokens are available; returns the seconds waited."""
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        waited = 0.0
+        async with self._lock:  # FIFO: later callers queue behind the one waiting
+            while True:
+                self._refill()
+                need_r = 1 - self._requests if self.rpm else 0
+                need_t = tokens - self._tokens if self.tpm else 0
+                if need_r <= 0 and need_t <= 0:
+                    break
+                delay = max(need_r * 60 / self.rpm if need_r > 0 else 0,
+                            need_t * 60 / self.tpm if need_t > 0 else 0)
+                await asyncio.sleep(delay)
+                waited += delay
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+        if waited:
+            METRICS.observe("review_llm_ratelimit_wait_seconds", waited)
+        return waited
+
+    def settle(self, estimated: int, actual: int):
+        if self.tpm and actual is not None:
+            self._tokens -= actual - min(estimated, self.tpm)
+
+
+def estimate_tokens(kwargs) -> int:
+    """Prompt text + image parts + completion reserve for a chat-completion request."""
+    total = 0
+    for m in kwargs.get("messages") or []:
+        content = m.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content or ""}]
+        for part in parts:
+            if part.get("type") == "image_url":
+                total += IMAGE_TOKENS_ESTIMATE
+            else:
+                total += count_tokens(part.get("text") or "")
+    return total + int(kwargs.get("max_tokens") or DEFAULT_COMPLETION_RESERVE)
+
+
+class AsyncLLM:
+    """Background event loop + pooled HTTP client + rate limiter (one per process, see get_llm)."""
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM, max_connections: int = MAX_CONNECTIONS):
+        import httpx
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="llm-event-loop", daemon=True)
+        self._thread.start()
+        self.http2 = importlib.util.find_spec("h2") is not None
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections // 2)
+
+        async def setup():
+            # loop-bound objects are created on the loop itself
+            return (httpx.AsyncClient(http2=self.http2, limits=limits, follow_redirects=True,
+                                      timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0)),
+                    RateLimiter(rpm, tpm))
+
+        self.http, self.limiter = self.run(setup())
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        print(f"[llm] shared async client: http2={self.http2}, max_connections={max_connections}, "
+              f"rpm={rpm or 'off'}, tpm={tpm or 'off'}")
+
+    def run(self, coro):
+        """Run a coroutine on the background loop and block for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def client(self, api_key: str, base_url: str = ""):
+        from openai import AsyncOpenAI
+
+        key = (api_key, base_url or None)
+        with self._clients_lock:
+            if key not in self._clients:
+                self._clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url or None,
+                                                 http_client=self.http, max_retries=0)
+            return self._clients[key]
+
+    async def create(self, client, **kwargs):
+        """Rate-limited client.chat.completions.create; streams are returned as AsyncStream."""
+        estimate = estimate_tokens(kwargs)
+        await self.limiter.acquire(estimate)
+        response = await client.chat.completions.create(**kwargs)
+        if not kwargs.get("stream"):
+            usage = getattr(response, "usage", None)
+            self.limiter.settle(estimate, getattr(usage, "total_tokens", None))
+        return response
+
+
+_llm = None
+_llm_lock = threading.Lock()
+
+
+def get_llm() -> AsyncLLM:
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            _llm = AsyncLLM()
+        return _llm
+
+
+class _SyncStream:
+    """Iterate an AsyncStream from a worker thread."""
+
+    def __init__(self, llm: AsyncLLM, stream):
+        self._llm, self._stream = llm, stream
+
+    def __iter__(self):
+        iterator = self._stream.__aiter__()
+        try:
+            while True:
+                try:
+                    yield self._llm.run(iterator.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self._llm.run(self._stream.close())
+
+
+class _Completions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        llm, client = self._owner.llm, self._owner.async_client
+        response = llm.run(llm.create(client, **kwargs))
+        return _SyncStream(llm, response) if kwargs.get("stream") else response
+
+
+class _Chat:
+    def __init__(self, owner):
+        self.completions = _Completions(owner)
+
+
+class SyncClient:
+    """
+    Blocking OpenAI-style facade over the shared AsyncLLM: client.chat.completions.create(**kwargs).
+    Many of these (one per API key / session) share one connection pool and rate limiter.
+    """
+
+    def __init__(self, api_key: str, base_url: str = "", llm: AsyncLLM = None):
+        self.llm = llm or get_llm()
+        self.async_client = self.llm.client(api_key, base_url)
+        self.chat = _Chat(self)
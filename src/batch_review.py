@@ -0,0 +1,213 @@
+# batch_review.py
+# python -m src.batch_review eval/pdfs --out-dir eval/multimodal_logs --workers 4
+"""
+Headless, resumable batch review over a directory of PDFs (no Streamlit import).
+
+Each paper runs the same extraction -> summary -> retrieval -> reference -> review -> to-do
+DAG as the app. Stage results are checkpointed under <checkpoint-dir>/<pdf stem>/state.json
+as they finish (text, page images and the summary are additionally cached by the document
+store), so re-running the same command after a crash skips finished papers and finished stages.
+Outputs follow the eval/multimodal_logs metadata schema.
+"""
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .doc_store import get_store, pdf_digest
+from .image_payload import DEFAULT_IMAGE_OPTIONS
+from .llm_client import make_client
+from .rag_pipeline_run import GENERATION_MODES, log_completion
+from .rag_router import describe_route, parse_weights
+from .review_dag import build_review_stages
+from .stage_scheduler import Stage, run_stages
+from .tracing import Trace, export_otlp, start_metrics_server
+
+# stages whose results are small and worth checkpointing (text / images live in the document store)
+CHECKPOINT_STAGES = ("summary", "retrieval", "reference", "review_todo", "review", "todo")
+GENERATION_STAGES = ("review_todo", "review", "todo")
+# run settings recorded in the checkpoint -> stage results a change invalidates (plus the output)
+INVALIDATES = {
+    "digest": CHECKPOINT_STAGES,
+    "model": CHECKPOINT_STAGES,
+    "k": ("retrieval", "reference") + GENERATION_STAGES,
+    "shards": ("retrieval", "reference") + GENERATION_STAGES,
+    "image_options": GENERATION_STAGES,
+    "generation_mode": GENERATION_STAGES,
+}
+
+
+class Checkpoint:
+    """Per-paper stage results persisted atomically to state.json."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.path = os.path.join(directory, "state.json")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.state = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self, key, value):
+        with self._lock:
+            self.state[key] = value
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def wrap(self, stage: Stage) -> Stage:
+        if stage.name not in CHECKPOINT_STAGES:
+            return stage
+
+        def run(**kwargs):
+            if stage.name in self.state:
+                print(f"  [checkpoint] reuse {stage.name}")
+                return self.state[stage.name]
+            result = stage.fn(**kwargs)
+            self.save(stage.name, result)
+            return result
+
+        return Stage(stage.name, run, stage.deps, stage.label)
+
+
+def _safe_name(text: str, limit: int = 100) -> str:
+    return re.sub(r'[\\/:*?"<>|\r\n]+', " ", text).strip()[:limit] or "Untitled"
+
+
+def write_metadata(out_dir: str, result: dict, manuscript_file: str, image_file=None, extra: dict = None) -> str:
+    """Write one run in the eval/multimodal_logs metadata schema (+ extra keys such as "trace"); returns the path."""
+    now = datetime.now()
+    record = {
+        "title": result["title"],
+        "abstract": result["abstract"],
+        "summary": result["summary"],
+        "ref": result["ref"],
+        "rev": result["rev"],
+        "todo": result["todo"],
+        "timestamp": now.isoformat(),
+        "manuscript_file": manuscript_file,
+        "image_file": image_file,
+        **(extra or {}),
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"metadata_{_safe_name(result['title'])}_{now.strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def review_pdf(client, pdf_path, out_dir, checkpoint_dir, k=2, model="gpt-4o", image_options=None,
+               stage_workers=3, venue=None, shard_weights=None, retrieval_mode="reviews",
+               reference_mode="llm", generation_mode="separate"):
+    """Review one PDF with checkpointing; returns the metadata path."""
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    ckpt = Checkpoint(os.path.join(checkpoint_dir, stem))
+
+    with open(pdf_path, "rb") as f:
+        digest = pdf_digest(f.read())
+    shards = describe_route(venue, shard_weights) + f" ({retrieval_mode}, {reference_mode} reference)"
+    settings = {"digest": digest, "model": model, "k": k, "shards": shards,
+                # None = --legacy-image; serialized so it compares equal after the JSON round-trip
+                "image_options": json.dumps(image_options, sort_keys=True), "generation_mode": generation_mode}
+    for key, value in settings.items():
+        if ckpt.state.get(key) not in (None, value):
+            print(f"[reset] {stem}: {key} changed since last checkpoint, redoing {', '.join(INVALIDATES[key])}")
+            ckpt.state = {k: v for k, v in ckpt.state.items() if k not in INVALIDATES[key] and k != "output"}
+        ckpt.save(key, value)
+    # only after the invalidation above: a changed PDF or setting must not be skipped
+    if ckpt.state.get("output") and os.path.exists(ckpt.state["output"]):
+        print(f"[skip] {stem}: already reviewed -> {ckpt.state['output']}")
+        return ckpt.state["output"]
+
+    store = get_store()
+    stages = [ckpt.wrap(s) for s in build_review_stages(client, pdf_path, digest, k, model, store, image_options,
+                                                        venue=venue, shard_weights=shard_weights,
+                                                        retrieval_mode=retrieval_mode, reference_mode=reference_mode,
+                                                        generation_mode=generation_mode)]
+    with Trace("review", manuscript=os.path.basename(pdf_path), digest=digest, shards=shards) as trace:
+        results, timings = run_stages(stages, max_workers=stage_workers)
+    export_otlp(trace)
+
+    result = {
+        "title": results["text"]["title"],
+        "abstract": results["text"]["abstract"],
+        "summary": results["summary"],
+        "ref": results["reference"],
+        "rev": results["review"],
+        "todo": results["todo"],
+    }
+    payload = results["images"]
+    image_file = store.get(digest, "pages", "png", dpi=150) if image_options is None else None
+    extra = {"venue": venue, "shards": shards, "generation_mode": generation_mode, "image_parts": payload.get("parts"), "timings": timings,
+             "trace": trace.to_dict()}
+    output = write_metadata(out_dir, result, os.path.basename(pdf_path), image_file, extra)
+    ckpt.save("output", output)
+    print(f"[done] {stem} -> {output}")
+    return output
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Batch multimodal peer review over a directory of PDFs.")
+    ap.add_argument("pdf_dir")
+    ap.add_argument("--out-dir", default="eval/multimodal_logs")
+    ap.add_argument("--checkpoint-dir", default=None, help="default: <out-dir>/.checkpoints")
+    ap.add_argument("--workers", type=int, default=2,
+                    help="papers in flight; each runs up to ~4 concurrent API calls, size for your rate limit")
+    ap.add_argument("-k", type=int, default=2)
+    ap.add_argument("--model", default="gpt-4o")
+    ap.add_argument("--venue", default=None, help="retrieve from this venue's shard(s), e.g. ICLR (see data/shards.json)")
+    ap.add_argument("--shards", default=None, help="weighted fan-out instead of --venue, e.g. iclr2020=1,neurips2021=0.5")
+    ap.add_argument("--retrieval-mode", choices=("reviews", "passages"), default="reviews",
+                    help="passages: budgeted review passages for the reference summary (needs a passage index)")
+    ap.add_argument("--reference-mode", choices=("llm", "precomputed"), default="llm",
+                    help="precomputed: merge offline guidance (src.reference_guidance) instead of an LLM call")
+    ap.add_argument("--generation-mode", choices=GENERATION_MODES, default="separate",
+                    help="combined: review + to-do in one JSON call; text_todo: to-do call without page images")
+    ap.add_argument("--legacy-image", action="store_true", help="send one lossless PNG grid instead of JPEG parts")
+    ap.add_argument("--metrics-port", type=int, default=None, help="serve Prometheus metrics on this port")
+    ap.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    ap.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL", ""))
+    args = ap.parse_args(argv)
+
+    if not args.api_key:
+        ap.error("an API key is required (--api-key or OPENAI_API_KEY)")
+    pdfs = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not pdfs:
+        ap.error(f"no PDFs found in {args.pdf_dir}")
+
+    client = make_client(args.api_key, args.base_url)
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.out_dir, ".checkpoints")
+    image_options = None if args.legacy_image else DEFAULT_IMAGE_OPTIONS
+    print(f"[batch] {len(pdfs)} PDFs, {args.workers} worker(s), checkpoints in {checkpoint_dir}")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="paper") as pool:
+        futures = {pool.submit(review_pdf, client, p, args.out_dir, checkpoint_dir, args.k, args.model,
+                               image_options, venue=args.venue, shard_weights=parse_weights(args.shards),
+                               retrieval_mode=args.retrieval_mode, reference_mode=args.reference_mode,
+                               generation_mode=args.generation_mode): p
+                   for p in pdfs}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except Exception as e:
+                failed.append(futures[fut])
+                print(f"[error] {os.path.basename(futures[fut])}: {type(e).__name__}: {e}")
+
+    log_completion()
+    print(f"[batch] {len(pdfs) - len(failed)}/{len(pdfs)} reviewed" + (f", {len(failed)} failed (re-run to resume)" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
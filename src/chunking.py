@@ -0,0 +1,170 @@
+# chunking.py
+import re
+from functools import lru_cache
+
+DEFAULT_CHUNK_TOKENS = 3000
+DEFAULT_MIN_TOKENS = 400
+
+# "3 Method", "2.1 Related Work", "4. EXPERIMENTS"
+NUMBERED_HEADING = re.compile(r"^\d{1,2}(?:\.\d{1,2}){0,2}\.?\s+[A-Z][^\n]{1,80}$")
+# "A Proof of Theorem 1", "B.2 Hyperparameters" -- only trusted after the references
+LETTER_HEADING = re.compile(r"^[A-H](?:\.\d{1,2}){0,2}\.?\s+[A-Z][^\n]{1,80}$")
+NAMED_HEADING = re.compile(
+    r"^(?:\d{1,2}\.?\s+)?(abstract|introduction|related work|background|conclusions?|discussion|"
+    r"references|bibliography|acknowledge?ments?|appendix(?:\s+[A-Z])?|appendices|supplementary material)\s*:?$",
+    re.I,
+)
+REFERENCE_NAMES = ("references", "bibliography")
+APPENDIX_NAMES = ("appendix", "appendices", "supplementary material")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z(\[])")
+
+
+@lru_cache(maxsize=8)
+def _tiktoken_encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """Exact with tiktoken when installed, otherwise ~4 characters per token."""
+    enc = _tiktoken_encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _is_heading(line: str, kind: str) -> bool:
+    if not line or len(line) > 90:
+        return False
+    if NAMED_HEADING.match(line):
+        return True
+    if line.endswith((".", ",", ";", ":")) or len(line.split()) > 12:
+        return False
+    if kind != "body" and LETTER_HEADING.match(line):
+        return True
+    return bool(NUMBERED_HEADING.match(line))
+
+
+def _kind(heading: str, current: str) -> str:
+    name = NAMED_HEADING.match(heading)
+    name = name.group(1).lower() if name else ""
+    if name.startswith(REFERENCE_NAMES):
+        return "references"
+    if name.startswith(APPENDIX_NAMES) or (current != "body" and LETTER_HEADING.match(heading)):
+        return "appendix"
+    return current
+
+
+def split_sections(text: str) -> list[dict]:
+    """Split on detected headings -> [{"title", "text", "kind"}], kind in body/references/appendix."""
+    sections = [{"title": "", "lines": [], "kind": "body"}]
+    for line in text.splitlines():
+        stripped = line.strip()
+        if _is_heading(stripped, sections[-1]["kind"]):
+            kind = _kind(stripped, sections[-1]["kind"])
+            sections.append({"title": stripped, "lines": [line], "kind": kind})
+        else:
+            sections[-1]["lines"].append(line)
+    out = []
+    for s in sections:
+        body = "\n".join(s["lines"]).strip()
+        if body:
+            out.append({"title": s["title"], "text": body, "kind": s["kind"]})
+    return out
+
+
+def _hard_split(text: str, max_tokens: int, model: str) -> list[str]:
+    """Cut text into the longest prefixes that count at most ``max_tokens`` (preferring a space to cut at)."""
+    out = []
+    while text:
+        if count_tokens(text, model) <= max_tokens:
+            out.append(text)
+            break
+        lo, hi = 1, len(text)  # longest prefix length that fits, by bisection on the counted tokens
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if count_tokens(text[:mid], model) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        space = text.rfind(" ", 0, lo)
+        cut = space if space > lo // 2 else lo
+        out.append(text[:cut])
+        text = text[cut:].lstrip()
+    return out
+
+
+def _split_oversized(text: str, max_tokens: int, model: str) -> list[str]:
+    """Break one section on paragraph, then sentence boundaries (hard cut as a last resort)."""
+    pieces = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    if len(pieces) == 1:
+        pieces = [p.strip() for p in SENTENCE_END.split(text) if p.strip()]
+    out = []
+    for piece in pieces:
+        if count_tokens(piece, model) <= max_tokens:
+            out.append(piece)
+        elif len(pieces) > 1:
+            out.extend(_split_oversized(piece, max_tokens, model))
+        else:
+            out.extend(_hard_split(piece, max_tokens, model))
+    return out
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS,
+               drop=("references",), model: str = "gpt-4o") -> list[str]:
+    """
+    Section-aware chunking by token count.
+    - sections are packed greedily into chunks of at most ``max_tokens`` (counted on the
+      joined text, separators included)
+    - sections larger than that are split on paragraph / sentence boundaries
+    - a chunk under ``min_tokens`` is merged into its predecessor instead of costing a call
+      when the two fit in ``max_tokens``; otherwise units are moved over from the predecessor
+    - ``drop``: section kinds to leave out ("references", "appendix")
+    """
+    units = []
+    for section in split_sections(text):
+        if section["kind"] in drop:
+            continue
+        if count_tokens(section["text"], model) <= max_tokens:
+            units.append(section["text"])
+        else:
+            units.extend(_split_oversized(section["text"], max_tokens, model))
+
+    def size(parts):
+        return count_tokens("\n\n".join(parts), model)
+
+    chunks = []  # [[unit, ...], tokens]
+    for unit in units:
+        if chunks and size(chunks[-1][0] + [unit]) <= max_tokens:
+            chunks[-1][0].append(unit)
+            chunks[-1][1] = size(chunks[-1][0])
+        else:
+            chunks.append([[unit], size([unit])])
+
+    i = 1
+    while i < len(chunks):
+        prev, cur = chunks[i - 1], chunks[i]
+        if cur[1] < min_tokens and size(prev[0] + cur[0]) <= max_tokens:
+            prev[0].extend(chunks.pop(i)[0])
+            prev[1] = size(prev[0])
+            continue
+        # too big to merge: move trailing units of the predecessor over while both stay in budget
+        while cur[1] < min_tokens and len(prev[0]) > 1:
+            head, moved = size(prev[0][:-1]), size(prev[0][-1:] + cur[0])
+            if head < min_tokens or moved > max_tokens:
+                break
+            cur[0].insert(0, prev[0].pop())
+            prev[1], cur[1] = head, moved
+        i += 1
+    return ["\n\n".join(parts) for parts, _ in chunks]
+
+
+def char_chunks(text: str, chunk_size: int = 8000) -> list[str]:
+    """The original fixed-width slicing."""
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
@@ -0,0 +1,242 @@
+# doc_store.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from .llm_cache import CACHE_DIR
+from .pdf_text import DEFAULT_BACKEND, extract_pages, join_pages
+from .pdf_utilities import (
+    extract_title_and_abstract,
+    render_grid_png,
+    summarize_text_hierarchical,
+)
+from .image_payload import prepare_image_payload
+from .chunking import DEFAULT_CHUNK_TOKENS
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024   # 2 GB
+# bump when extraction / rendering / summarization code changes output
+ARTIFACT_VERSION = 2
+
+
+def pdf_digest(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def pdf_source(pdf_path: str = None, pdf_bytes: bytes = None):
+    """(pdf, digest): the bytes when given (no disk round trip), else the path."""
+    if pdf_bytes is not None:
+        return pdf_bytes, pdf_digest(pdf_bytes)
+    if pdf_path is None:
+        raise ValueError("pass pdf_path or pdf_bytes")
+    with open(pdf_path, "rb") as f:
+        return pdf_path, pdf_digest(f.read())
+
+
+def params_fingerprint(**params) -> str:
+    payload = json.dumps({"v": ARTIFACT_VERSION, **params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class DocumentStore:
+    """
+    Per-PDF artifact cache keyed by SHA-256 of the PDF bytes.
+
+    Layout: <root>/<digest>/<artifact>-<params fingerprint>.<ext>
+    Each artifact is keyed by the parameters that produce it (e.g. the page
+    image by dpi, the summary by model + chunk_size), so changing one setting
+    only invalidates the artifacts that depend on it. Whole documents are
+    evicted least-recently-used first once the store exceeds ``max_bytes``.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root or os.path.join(CACHE_DIR, "documents")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def doc_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def artifact_path(self, digest: str, artifact: str, ext: str, **params) -> str:
+        return os.path.join(self.doc_dir(digest), f"{artifact}-{params_fingerprint(**params)}.{ext}")
+
+    def _touch(self, digest: str):
+        marker = os.path.join(self.doc_dir(digest), ".last_used")
+        with open(marker, "a"):
+            pass
+        os.utime(marker, None)
+
+    # ---------- raw get / put ----------
+    def get(self, digest, artifact, ext, **params):
+        path = self.artifact_path(digest, artifact, ext, **params)
+        if not os.path.exists(path):
+            return None
+        self._touch(digest)
+        return path
+
+    def put_file(self, digest, artifact, ext, src_path, **params) -> str:
+        """Move ``src_path`` into the store and return its new location."""
+        path = self.artifact_path(digest, artifact, ext, **params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.move(src_path, tmp)
+        os.replace(tmp, path)
+        self._touch(digest)
+        self.evict(keep=digest)
+        return path
+
+    def put_bytes(self, digest, artifact, ext, data: bytes, **params) -> str:
+        path = self.artifact_path(digest, artifact, ext, **params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self._touch(digest)
+        self.evict(keep=digest)
+        return path
+
+    def put_text(self, digest, artifact, ext, text, **params) -> str:
+        return self.put_bytes(digest, artifact, ext, text.encode("utf-8"), **params)
+
+    # ---------- maintenance ----------
+    def _doc_size(self, digest: str) -> int:
+        total = 0
+        for dirpath, _, files in os.walk(self.doc_dir(digest)):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def _last_used(self, digest: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(self.doc_dir(digest), ".last_used"))
+        except OSError:
+            return 0.0
+
+    def total_bytes(self) -> int:
+        return sum(self._doc_size(d) for d in os.listdir(self.root))
+
+    def evict(self, keep: str = None):
+        """Drop least-recently-used documents until the store fits in ``max_bytes``."""
+        with self._lock:
+            docs = [d for d in os.listdir(self.root) if os.path.isdir(self.doc_dir(d))]
+            sizes = {d: self._doc_size(d) for d in docs}
+            total = sum(sizes.values())
+            for d in sorted(docs, key=self._last_used):
+                if total <= self.max_bytes:
+                    break
+                if d == keep:
+                    continue
+                shutil.rmtree(self.doc_dir(d), ignore_errors=True)
+                total -= sizes[d]
+
+    def invalidate(self, digest: str = None, artifact: str = None):
+        """Remove one artifact type, one document, or (no arguments) everything."""
+        with self._lock:
+            digests = [digest] if digest else os.listdir(self.root)
+            for d in digests:
+                if artifact is None:
+                    shutil.rmtree(self.doc_dir(d), ignore_errors=True)
+                    continue
+                for name in os.listdir(self.doc_dir(d)) if os.path.isdir(self.doc_dir(d)) else []:
+                    if name.startswith(f"{artifact}-"):
+                        os.remove(os.path.join(self.doc_dir(d), name))
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_store() -> DocumentStore:
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = DocumentStore()
+        return _default_store
+
+
+def document_text(store, digest, pdf, backend: str = DEFAULT_BACKEND) -> dict:
+    """Page texts, full text, title and abstract."""
+    text_path = store.get(digest, "text", "json", backend=backend)
+    if text_path:
+        with open(text_path, "r", encoding="utf-8") as f:
+            print(f"[DocumentStore] text hit for {digest[:12]}")
+            return json.load(f)
+    pages = extract_pages(pdf, backend=backend)
+    full_text = join_pages(pages)
+    title, abstract = extract_title_and_abstract(full_text)
+    doc = {"pages": pages, "full_text": full_text, "title": title, "abstract": abstract}
+    store.put_text(digest, "text", "json", json.dumps(doc, ensure_ascii=False), backend=backend)
+    return doc
+
+
+def document_image(store, digest, pdf, dpi: int = 150) -> str:
+    """Path of the legacy merged page-grid PNG (rendered in memory, written once into the store)."""
+    image_path = store.get(digest, "pages", "png", dpi=dpi)
+    if image_path:
+        print(f"[DocumentStore] page image hit for {digest[:12]}")
+        return image_path
+    return store.put_bytes(digest, "pages", "png", render_grid_png(pdf, dpi=dpi), dpi=dpi)
+
+
+def document_payload(store, digest, pdf, image_options: dict) -> dict:
+    """Budgeted image payload (see image_payload.prepare_image_payload)."""
+    payload_path = store.get(digest, "payload", "json", **image_options)
+    if payload_path:
+        with open(payload_path, "r", encoding="utf-8") as f:
+            print(f"[DocumentStore] image payload hit for {digest[:12]}")
+            return json.load(f)
+    payload = prepare_image_payload(pdf, **image_options)
+    store.put_text(digest, "payload", "json", json.dumps(payload), **image_options)
+    return payload
+
+
+def document_summary(store, digest, full_text, client=None, model: str = "gpt-4o", chunk_size: int = 8000,
+                     chunking: str = "sections", chunk_tokens: int = DEFAULT_CHUNK_TOKENS, progress=None,
+                     drop=("references",)) -> str:
+    """Hierarchical summary of the full text (drop: section kinds left out, see chunking.chunk_text)."""
+    params = {"model": model, "chunking": chunking,
+              **({"chunk_size": chunk_size} if chunking == "chars"
+                 else {"chunk_tokens": chunk_tokens, "drop": sorted(drop)})}
+    summary_path = store.get(digest, "summary", "md", **params)
+    if summary_path:
+        with open(summary_path, "r", encoding="utf-8") as f:
+            print(f"[DocumentStore] summary hit for {digest[:12]}")
+            return f.read()
+    summary = summarize_text_hierarchical(full_text, client=client, model=model, chunk_size=chunk_size,
+                                          chunking=chunking, chunk_tokens=chunk_tokens, drop=drop, progress=progress)
+    store.put_text(digest, "summary", "md", summary, **params)
+    return summary
+
+
+def prepare_document(pdf_path: str = None, pdf_bytes: bytes = None, client=None, model: str = "gpt-4o",
+                     dpi: int = 150, chunk_size: int = 8000, store: DocumentStore = None,
+                     image_options: dict = None, text_backend: str = DEFAULT_BACKEND,
+                     chunking: str = "sections", chunk_tokens: int = DEFAULT_CHUNK_TOKENS, progress=None,
+                     drop=("references",)):
+    """
+    Extraction -> title/abstract -> page images -> hierarchical summary, reusing
+    cached artifacts for PDFs that were processed before with the same parameters.
+    image_options: keyword arguments for image_payload.prepare_image_payload; when
+    given, the budgeted image payload is built instead of the merged PNG grid.
+    pdf_bytes alone (e.g. an upload) is processed in memory; no temporary PDF is written.
+    Returns dict(digest, pages, full_text, title, abstract, merged_image_path, summary[, image_payload]);
+    pages[i] is the text of page i + 1.
+    """
+    store = store or get_store()
+    pdf, digest = pdf_source(pdf_path, pdf_bytes)
+
+    doc = document_text(store, digest, pdf, text_backend)
+    result = {"digest": digest, **doc, "merged_image_path": None}
+    if image_options is None:
+        result["merged_image_path"] = document_image(store, digest, pdf, dpi)
+    else:
+        result["image_payload"] = document_payload(store, digest, pdf, image_options)
+    result["summary"] = document_summary(store, digest, doc["full_text"], client, model, chunk_size,
+                                         chunking, chunk_tokens, progress, drop)
+    return result
@@ -0,0 +1,130 @@
+# image_payload.py
+import io
+import math
+import base64
+
+from .pdf_text import describe_pdf, open_pdf
+from .pdf_utilities import render_pages_grid
+
+# How the vision models see an image in "high" detail: fit inside max_side x max_side,
+# then shrink so the shortest side is at most short_side; billed per 512px tile.
+MODEL_IMAGE_LIMITS = {
+    "gpt-4o": {"max_side": 2048, "short_side": 768, "tile": 512, "tile_tokens": 170, "base_tokens": 85},
+    "gpt-4o-mini": {"max_side": 2048, "short_side": 768, "tile": 512, "tile_tokens": 5667, "base_tokens": 2833},
+}
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+MIN_DPI, MAX_DPI = 36, 200
+# what the app and the batch CLI send: 2 pages per 80%-quality JPEG part
+DEFAULT_IMAGE_OPTIONS = {"model": "gpt-4o", "pages_per_image": 2, "fmt": "JPEG", "quality": 80}
+
+
+def _limits(model: str) -> dict:
+    return MODEL_IMAGE_LIMITS.get(model, MODEL_IMAGE_LIMITS["gpt-4o"])
+
+
+def effective_size(width: int, height: int, model: str = "gpt-4o"):
+    """Resolution the model actually looks at after its own downscaling."""
+    lim = _limits(model)
+    scale = min(1.0, lim["max_side"] / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, lim["short_side"] / min(width, height))
+    return int(width * scale), int(height * scale)
+
+
+def estimate_image_tokens(width: int, height: int, model: str = "gpt-4o") -> int:
+    lim = _limits(model)
+    w, h = effective_size(width, height, model)
+    tiles = math.ceil(w / lim["tile"]) * math.ceil(h / lim["tile"])
+    return lim["base_tokens"] + tiles * lim["tile_tokens"]
+
+
+def choose_dpi(page_w_pt: float, page_h_pt: float, cols: int, rows: int, model: str = "gpt-4o") -> int:
+    """Smallest DPI at which a cols x rows grid is not downscaled further by the model."""
+    lim = _limits(model)
+    grid_w_in, grid_h_in = cols * page_w_pt / 72, rows * page_h_pt / 72
+    dpi = min(lim["short_side"] / min(grid_w_in, grid_h_in), lim["max_side"] / max(grid_w_in, grid_h_in))
+    return int(max(MIN_DPI, min(MAX_DPI, dpi)))
+
+
+def encode_image(img, fmt: str = "JPEG", quality: int = 80) -> bytes:
+    fmt = fmt.upper()
+    buf = io.BytesIO()
+    if fmt == "PNG":
+        img.save(buf, format="PNG", optimize=True)
+    else:
+        img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+def to_data_url(data: bytes, fmt: str = "PNG") -> str:
+    return f"data:{MIME_TYPES[fmt.upper()]};base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def _plan(page_count: int, pages_per_image, cols: int):
+    per = page_count if not pages_per_image else min(pages_per_image, page_count)
+    groups = [list(range(i, min(i + per, page_count))) for i in range(0, page_count, per)]
+    return groups, min(cols, per)
+
+
+def prepare_image_payload(pdf, model: str = "gpt-4o", pages_per_image: int = 2, cols: int = 2,
+                          fmt: str = "JPEG", quality: int = 80, max_image_tokens: int = None,
+                          processes: int = None) -> dict:
+    """
+    Render the PDF (path or PDF bytes) into one or more image parts sized for the
+    model's input resolution; everything stays in memory.
+
+    - pages_per_image: pages tiled into each part (None = every page in one image, the old layout)
+    - fmt / quality: PNG, JPEG or WEBP encoding
+    - max_image_tokens: if set, pack more pages per part until the estimated vision
+      token cost of all parts fits the budget
+    Returns dict(images=[data URLs], parts=[...], bytes=encoded image bytes, tokens=estimated tokens).
+    """
+    with open_pdf(pdf) as doc:
+        rects = [page.rect for page in doc]
+    if not rects:
+        raise ValueError(f"No pages to render in {describe_pdf(pdf)}")
+
+    candidates = [pages_per_image]
+    if max_image_tokens:
+        candidates += [n for n in (2, 4, 6, 8, 12, 16) if not pages_per_image or n > pages_per_image] + [None]
+
+    for per in candidates:
+        groups, grid_cols = _plan(len(rects), per, cols)
+        layouts = []
+        for pages in groups:
+            rows = (len(pages) + grid_cols - 1) // grid_cols
+            pw, ph = max(rects[p].width for p in pages), max(rects[p].height for p in pages)
+            dpi = choose_dpi(pw, ph, grid_cols, rows, model)
+            size = (int(grid_cols * pw * dpi / 72), int(rows * ph * dpi / 72))
+            layouts.append((pages, grid_cols, dpi, estimate_image_tokens(*size, model)))
+        if not max_image_tokens or sum(l[3] for l in layouts) <= max_image_tokens:
+            break
+
+    lim = _limits(model)
+    parts, images = [], []
+    for pages, grid_cols, dpi, _ in layouts:
+        img = render_pages_grid(pdf, dpi=dpi, cols=grid_cols, pages=pages, processes=processes)
+        img.thumbnail((lim["max_side"], lim["max_side"]))
+        data = encode_image(img, fmt, quality)
+        images.append(to_data_url(data, fmt))
+        parts.append({"pages": [p + 1 for p in pages], "dpi": dpi, "size": list(img.size),
+                      "bytes": len(data), "tokens": estimate_image_tokens(*img.size, model)})
+
+    return {
+        "images": images,
+        "parts": parts,
+        "format": fmt.upper(),
+        "bytes": sum(p["bytes"] for p in parts),
+        "tokens": sum(p["tokens"] for p in parts),
+    }
+
+
+def payload_from_png(image) -> dict:
+    """Legacy single lossless PNG grid (PNG bytes or a path), as produced by render_grid_png."""
+    if isinstance(image, (bytes, bytearray)):
+        data = bytes(image)
+    else:
+        with open(image, "rb") as f:
+            data = f.read()
+    return {"images": [to_data_url(data, "PNG")], "parts": [{"bytes": len(data)}],
+            "format": "PNG", "bytes": len(data), "tokens": None}
@@ -0,0 +1,331 @@
+# jobs.py
+"""
+Background review jobs, so a review survives Streamlit reruns / browser refreshes
+and concurrent users don't tie up the server's script threads.
+
+    queue = JobQueue(run_review_job, max_concurrent=2, max_queue=8)
+    job_id, coalesced = queue.submit(key, params, context={"client": client, "pdf_bytes": pdf_bytes})
+    queue.get(job_id)   # status / progress / partial review + to-do / result
+
+Jobs live in a SQLite table (the broker) and are executed by a bounded pool of
+worker threads in the submitting process. The API client and the uploaded PDF
+bytes are passed as in-memory ``context`` and never persisted, so jobs left queued
+or running by a dead process are marked failed on the next start. Each JobQueue
+has its own owner token; a new queue in the same process (st.cache_resource
+cleared, module reloaded) takes over the queued jobs of earlier ones and fails
+their running ones.
+- admission control: at most ``max_concurrent`` running and ``max_queue`` queued jobs
+- single-flight: submitting a key that is already queued / running returns that job
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+from .llm_cache import CACHE_DIR
+
+ACTIVE = ("queued", "running")
+FINISHED_TTL = 24 * 3600   # finished jobs are purged after a day
+# job id -> in-memory context, shared by every JobQueue in the process so a newer queue can run adopted jobs
+_contexts = {}
+JOB_FIELDS = ("id", "key", "status", "progress", "review", "todo", "result", "error",
+              "created", "started", "finished", "owner")
+
+
+class QueueFull(RuntimeError):
+    """Raised by JobQueue.submit when max_queue jobs are already waiting."""
+
+
+class JobStore:
+    """SQLite-backed job table shared by the worker threads (and other processes on the host)."""
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(CACHE_DIR, "jobs.sqlite")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, key TEXT NOT NULL, status TEXT NOT NULL, params TEXT,"
+            " progress TEXT, review TEXT, todo TEXT, result TEXT, error TEXT,"
+            " created REAL NOT NULL, started REAL, finished REAL, owner TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs(key)")
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(zip(JOB_FIELDS, row))
+        for k in ("todo", "result"):
+            job[k] = json.loads(job[k]) if job[k] else None
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def params(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT params FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def admit(self, job_id: str, key: str, params: dict, owner: str, max_queue: int):
+        """Single-flight + admission in one transaction -> (job_id, coalesced)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE key=? AND status IN ('queued','running') ORDER BY created LIMIT 1",
+                    (key,)).fetchone()
+                if row:
+                    self._db.execute("COMMIT")
+                    return row[0], True
+                queued = self._db.execute("SELECT COUNT(*) FROM jobs WHERE status='queued'").fetchone()[0]
+                if queued >= max_queue:
+                    raise QueueFull(f"{queued} reviews are already waiting; please try again in a few minutes")
+                self._db.execute(
+                    "INSERT INTO jobs(id, key, status, params, progress, created, owner) VALUES (?,?,?,?,?,?,?)",
+                    (job_id, key, "queued", json.dumps(params, ensure_ascii=False), "Queued", time.time(), owner))
+                self._db.execute("COMMIT")
+                return job_id, False
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def claim(self, owner: str):
+        """Atomically move this owner's oldest queued job to running; None if there is none."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT id FROM jobs WHERE status='queued' AND owner=? ORDER BY created LIMIT 1",
+                                       (owner,)).fetchone()
+                if row:
+                    self._db.execute("UPDATE jobs SET status='running', started=?, progress=? WHERE id=?",
+                                     (time.time(), "Starting...", row[0]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def update(self, job_id: str, **fields):
+        for k in ("todo", "result"):
+            if k in fields and fields[k] is not None:
+                fields[k] = json.dumps(fields[k], ensure_ascii=False)
+        cols = ", ".join(f"{k}=?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE id=?", (*fields.values(), job_id))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel the job only if it is still queued (a concurrent claim() wins)."""
+        with self._lock:
+            cur = self._db.execute("UPDATE jobs SET status='cancelled', finished=?, progress='Cancelled' "
+                                   "WHERE id=? AND status='queued'", (time.time(), job_id))
+            return cur.rowcount == 1
+
+    def position(self, job_id: str) -> int:
+        """1-based place in the queue (0 once running / finished)."""
+        with self._lock:
+            row = self._db.execute("SELECT status, created FROM jobs WHERE id=?", (job_id,)).fetchone()
+            if not row or row[0] != "queued":
+                return 0
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status='queued' AND created<=?",
+                                    (row[1],)).fetchone()[0]
+
+    def counts(self) -> dict:
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def recover(self, host: str):
+        """Fail active jobs whose owning process on this host is gone (their client context died with it)."""
+        with self._lock:
+            rows = self._db.execute("SELECT id, owner FROM jobs WHERE status IN ('queued','running')").fetchall()
+        for job_id, owner in rows:
+            owner_host, _, rest = (owner or "").partition(":")
+            pid = rest.partition(":")[0]
+            if owner_host == host and pid.isdigit() and not _alive(int(pid)):
+                self.update(job_id, status="failed", finished=time.time(), error="interrupted by a server restart")
+
+    def adopt(self, owner: str):
+        """
+        Take over the queued jobs of other queues in this process (owner "host:pid:token",
+        same host:pid, other token) and fail their running ones -> (adopted, failed).
+        """
+        prefix = owner.rpartition(":")[0] + ":"
+        same_process = "substr(owner, 1, ?)=? AND owner!=?"
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                adopted = self._db.execute(f"UPDATE jobs SET owner=? WHERE status='queued' AND {same_process}",
+                                           (owner, len(prefix), prefix, owner)).rowcount
+                failed = self._db.execute(
+                    f"UPDATE jobs SET status='failed', finished=?, error=? WHERE status='running' AND {same_process}",
+                    (time.time(), "interrupted by a job queue restart", len(prefix), prefix, owner)).rowcount
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return adopted, failed
+
+    def purge(self, older_than: float = FINISHED_TTL):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE status NOT IN ('queued','running') AND finished < ?",
+                             (time.time() - older_than,))
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Bounded worker pool over a JobStore.
+    runner(params, context, report) does the work; report(**fields) updates
+    progress / review / todo for pollers, and the return value is stored as the result.
+    """
+
+    def __init__(self, runner, store: JobStore = None, max_concurrent: int = 2, max_queue: int = 8):
+        self.runner = runner
+        self.store = store or JobStore()
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.host = socket.gethostname()
+        self.owner = f"{self.host}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Condition()
+        self.store.recover(self.host)
+        adopted, failed = self.store.adopt(self.owner)
+        if adopted or failed:
+            print(f"[jobs] took over {adopted} queued job(s), failed {failed} running job(s) of an earlier queue")
+        self.store.purge()
+        self._workers = [threading.Thread(target=self._work, name=f"review-job-{i}", daemon=True)
+                         for i in range(max_concurrent)]
+        for t in self._workers:
+            t.start()
+
+    def submit(self, key: str, params: dict, context=None):
+        """Queue a job -> (job_id, coalesced). Raises QueueFull past max_queue waiting jobs."""
+        new_id = uuid.uuid4().hex[:16]
+        _contexts[new_id] = context  # before the row exists, so a worker never sees it without one
+        try:
+            job_id, coalesced = self.store.admit(new_id, key, params, self.owner, self.max_queue)
+        finally:
+            if self.store.get(new_id) is None:
+                _contexts.pop(new_id, None)
+        if not coalesced:
+            with self._wake:
+                self._wake.notify()
+        print(f"[jobs] {'joined' if coalesced else 'queued'} {job_id} ({key})")
+        return job_id, coalesced
+
+    def get(self, job_id: str):
+        job = self.store.get(job_id)
+        if job and job["status"] == "queued":
+            job["position"] = self.store.position(job_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that has not started yet."""
+        if not self.store.cancel(job_id):
+            return False
+        _contexts.pop(job_id, None)
+        return True
+
+    def _work(self):
+        while True:
+            job_id = self.store.claim(self.owner)
+            if job_id is None:
+                with self._wake:
+                    self._wake.wait(timeout=1.0)
+                continue
+            context = _contexts.pop(job_id, None)
+            try:
+                result = self.runner(self.store.params(job_id), context,
+                                     lambda **fields: self.store.update(job_id, **fields))
+                self.store.update(job_id, status="done", result=result, finished=time.time(), progress="Done")
+            except Exception as e:
+                print(f"[jobs] {job_id} failed: {type(e).__name__}: {e}")
+                self.store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+
+
+# ====================================================
+# Review jobs
+# ====================================================
+def review_job_key(digest: str, venue: str = None, **options) -> str:
+    """Single-flight key: same PDF + venue (+ pipeline options, image options included) -> same job."""
+    from .rag_router import venue_key
+    opts = ",".join(f"{k}={json.dumps(options[k], sort_keys=True, default=str)}" for k in sorted(options))
+    return f"{digest}|{venue_key(venue) if venue else ''}|{opts}"
+
+
+def submit_review(queue: JobQueue, client, pdf_bytes: bytes, manuscript: str, venue: str = None,
+                  log_dir: str = "logs", **options):
+    """Queue a review of pdf_bytes -> (job_id, coalesced). options: k, model, image_options, retrieval/reference mode."""
+    from .doc_store import pdf_digest
+
+    digest = pdf_digest(pdf_bytes)
+    key = review_job_key(digest, venue, **options)
+    # submitted: wall-clock time of the click, so time-to-first-output includes the queue wait
+    params = {"digest": digest, "submitted": time.time(), "manuscript": manuscript, "venue": venue, "log_dir": log_dir, **options}
+    # the PDF travels with the client in the in-memory context: nothing to spool or clean up
+    return queue.submit(key, params, context={"client": client, "pdf_bytes": pdf_bytes})
+
+
+def run_review_job(params, context, report):
+    """
+    JobQueue runner for one manuscript: DAG stages, then the streamed review / to-do,
+    then the metadata log. params: digest, submitted, manuscript, venue, k, model, image_options,
+    retrieval_mode, reference_mode, generation_mode, log_dir; context: dict(client, pdf_bytes).
+    """
+    from .batch_review import write_metadata
+    from .rag_pipeline_run import stream_review_and_todo
+    from .rag_router import describe_route
+    from .review_dag import run_review_dag
+    from .tracing import Trace, export_otlp
+
+    if context is None:
+        raise RuntimeError("job lost its API client and PDF (server restarted?)")
+    client = context["client"]
+    venue = params.get("venue")
+    # perf_counter() equivalent of the submit time (jobs from older params start from now)
+    t0 = time.perf_counter() - max(0.0, time.time() - params.get("submitted", time.time()))
+    with Trace("review", manuscript=params["manuscript"], venue=venue, job=True) as trace:
+        result = run_review_dag(
+            client, pdf_bytes=context["pdf_bytes"], k=params.get("k", 2), model=params.get("model", "gpt-4o"),
+            image_options=params.get("image_options"), progress=lambda msg: report(progress=msg),
+            generate=False, venue=venue, retrieval_mode=params.get("retrieval_mode", "reviews"),
+            reference_mode=params.get("reference_mode", "llm"),
+        )
+        report(progress="Writing review...")
+        rev, todo, metrics = stream_review_and_todo(
+            client, result["summary"], result["ref"], result["image_payload"],
+            on_review=lambda text: report(review=text),
+            on_todo=lambda items: report(todo=items, progress="Writing to-do list..."),
+            t0=t0, min_interval=0.5, mode=params.get("generation_mode", "separate"),
+        )
+        report(review=rev, todo=todo)
+    path = write_metadata(
+        params.get("log_dir", "logs"),
+        {**result, "rev": rev, "todo": todo},
+        params["manuscript"],
+        extra={"venue": venue, "shards": describe_route(venue),
+               "generation_mode": params.get("generation_mode", "separate"), "review_metrics": metrics,
+               "trace": trace.to_dict()},
+    )
+    export_otlp(trace)
+    return {"title": result["title"], "ref": result["ref"], "rev": rev, "todo": todo,
+            "review_metrics": metrics, "metadata": path}
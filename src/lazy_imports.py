@@ -0,0 +1,61 @@
+# lazy_imports.py
+"""
+Deferred imports for the heavy dependencies, so importing ``src.*`` (and
+starting the Streamlit app) does not pay for fitz / PIL / numpy / faiss /
+sentence_transformers (+ torch) before the page renders.
+
+    np = lazy_import("numpy")          # module proxy, imported on first attribute access
+    preload(*HEAVY_MODULES, background=True)
+
+A missing optional dependency therefore surfaces at first use, not at import.
+"""
+import time
+import importlib
+import threading
+
+HEAVY_MODULES = ("fitz", "PIL.Image", "numpy", "faiss", "sentence_transformers")
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is needed."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)  # import lock makes this thread-safe
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def preload(*names, background: bool = False):
+    """Import ``names`` now, or in a daemon thread with background=True (returns the thread)."""
+    names = names or HEAVY_MODULES
+
+    def _run():
+        for name in names:
+            t0 = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                print(f"[lazy_imports] {name} unavailable: {e}")
+                continue
+            print(f"[lazy_imports] {name} loaded in {time.perf_counter() - t0:.2f}s")
+
+    if background:
+        t = threading.Thread(target=_run, name="import-preload", daemon=True)
+        t.start()
+        return t
+    _run()
@@ -0,0 +1,158 @@
+# llm_cache.py
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from types import SimpleNamespace
+
+CACHE_DIR = os.environ.get("REVIEW_CACHE_DIR", ".cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024      # 256 MB
+DEFAULT_TTL = 7 * 24 * 3600                # one week
+
+
+def _digest(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _canonical_content(content):
+    """Replace inline image payloads by their digest so keys stay small."""
+    if not isinstance(content, list):
+        return content
+    parts = []
+    for part in content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            url = part.get("image_url")
+            url = url.get("url") if isinstance(url, dict) else url
+            parts.append({"type": "image_url", "sha256": _digest(url or "")})
+        else:
+            parts.append(part)
+    return parts
+
+
+def request_key(**kwargs) -> str:
+    """Content address of a chat-completion request (model, messages, temperature, max_tokens, ...)."""
+    payload = dict(kwargs)
+    payload["messages"] = [
+        {**m, "content": _canonical_content(m.get("content"))} for m in payload.get("messages", [])
+    ]
+    return _digest(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str))
+
+
+def as_response(record: dict):
+    """Rebuild the parts of a ChatCompletion the call sites read."""
+    usage = record.get("usage")
+    return SimpleNamespace(
+        model=record.get("model"),
+        cached=True,
+        usage=SimpleNamespace(**usage) if usage else None,
+        choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=record["content"]),
+                                 finish_reason=record.get("finish_reason"))],
+    )
+
+
+def as_record(response) -> dict:
+    choice = response.choices[0]
+    usage = getattr(response, "usage", None)
+    if usage is not None and not isinstance(usage, dict):
+        usage = {f: getattr(usage, f, None) for f in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    return {
+        "model": getattr(response, "model", None),
+        "content": choice.message.content,
+        "finish_reason": getattr(choice, "finish_reason", None),
+        "usage": usage,
+    }
+
+
+class CompletionCache:
+    """
+    SQLite-backed chat-completion cache.
+    - size-bounded: least-recently-used rows are evicted past ``max_bytes``
+    - rows older than ``ttl`` seconds are treated as misses and dropped
+    - ``hits`` / ``misses`` counters for reporting
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_TTL):
+        self.path = path or os.path.join(CACHE_DIR, "llm_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions(accessed)")
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, created FROM completions WHERE key=?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self._db.execute("UPDATE completions SET accessed=? WHERE key=?", (now, key))
+                self.hits += 1
+                return json.loads(row[0])
+            if row:
+                self._db.execute("DELETE FROM completions WHERE key=?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, key: str, record: dict):
+        value = json.dumps(record, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions(key, value, size, created, accessed) VALUES (?,?,?,?,?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM completions WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        doomed, freed = [], 0
+        for key, size in self._db.execute("SELECT key, size FROM completions ORDER BY accessed ASC"):
+            doomed.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._db.executemany("DELETE FROM completions WHERE key=?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM completions")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries, "bytes": size}
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> CompletionCache:
+    """Process-wide default cache under ``REVIEW_CACHE_DIR``."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = CompletionCache()
+        return _default_cache
+
+
+def cache_enabled() -> bool:
+    """Global kill switch: REVIEW_LLM_CACHE=0 disables caching at every call site."""
+    return os.environ.get("REVIEW_LLM_CACHE", "1").lower() not in ("0", "false", "no", "off")
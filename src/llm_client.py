@@ -0,0 +1,141 @@
+# llm_client.py
+import os
+import random
+import time
+from .llm_cache import CompletionCache, as_record, as_response, cache_enabled, get_cache, request_key
+from .tracing import METRICS, add_span, annotate, span
+
+# 429 / 5xx / timeouts are worth retrying, 4xx client errors are not
+RETRY_STATUS = {408, 409, 429}
+RETRY_ERRORS = ("APIConnectionError", "APITimeoutError")
+
+
+def make_client(api_key: str, base_url: str = "", shared: bool = None):
+    """
+    Client for chat_completion / stream_chat_completion (an empty base_url means the default endpoint).
+    shared (default, unless REVIEW_SHARED_CLIENT=0): a blocking facade over the process-wide async
+    connection pool and rate limiter, see async_client; otherwise a dedicated synchronous OpenAI client.
+    """
+    if shared is None:
+        shared = os.environ.get("REVIEW_SHARED_CLIENT", "1") != "0"
+    if shared:
+        from .async_client import SyncClient
+        return SyncClient(api_key, base_url)
+    import httpx
+    from openai import OpenAI
+    return OpenAI(base_url=base_url or None, api_key=api_key, http_client=httpx.Client(follow_redirects=True))
+
+
+def is_retryable(exc) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRY_STATUS or status >= 500
+    return type(exc).__name__ in RETRY_ERRORS
+
+
+def _retry_after(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 30.0) -> float:
+    """Full-jitter exponential backoff: uniform(0, min(max_delay, base * 2^attempt))."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def image_bytes(messages) -> int:
+    """Size of the inline (base64 data URL) images in a message list."""
+    total = 0
+    for m in messages or []:
+        for part in m.get("content") if isinstance(m.get("content"), list) else []:
+            if isinstance(part, dict) and part.get("type") == "image_url":
+                url = part.get("image_url")
+                total += len(url.get("url", "") if isinstance(url, dict) else url or "")
+    return total
+
+
+def _usage(response) -> dict:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    return {"prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None)}
+
+
+def _create_with_retries(client, max_retries, base_delay, max_delay, **kwargs):
+    for attempt in range(max_retries + 1):
+        try:
+            response = client.chat.completions.create(**kwargs)
+            if attempt:
+                annotate(retries=attempt)
+                METRICS.inc("review_llm_retries_total", attempt)
+            return response
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                annotate(retries=attempt)
+                raise
+            delay = _retry_after(e) or backoff_delay(attempt, base_delay, max_delay)
+            print(f"  ! {type(e).__name__} ({getattr(e, 'status_code', '-')}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _resolve_cache(cache):
+    if not cache or not cache_enabled():
+        return None
+    return cache if isinstance(cache, CompletionCache) else get_cache()
+
+
+def chat_completion(client, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0,
+                    cache=False, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) with jittered exponential backoff on 429/5xx.
+    cache: False (default) / True (process-wide cache) / a CompletionCache instance.
+    Caching is opt-in per call site, e.g. for deterministic temperature=0 calls.
+    """
+    store = _resolve_cache(cache)
+    with span("llm", model=kwargs.get("model"), image_bytes=image_bytes(kwargs.get("messages"))) as rec:
+        if store is not None:
+            key = request_key(**kwargs)
+            record = store.get(key)
+            if record is not None:
+                rec["attrs"].update(cache="hit")
+                METRICS.inc("review_llm_requests_total", cache="hit")
+                return as_response(record)
+        rec["attrs"]["cache"] = "miss" if store is not None else "off"
+        METRICS.inc("review_llm_requests_total", cache=rec["attrs"]["cache"])
+
+        response = _create_with_retries(client, max_retries, base_delay, max_delay, **kwargs)
+        rec["attrs"].update(_usage(response))
+
+    if store is not None:
+        store.put(key, as_record(response))
+    return response
+
+
+def stream_chat_completion(client, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0, **kwargs):
+    """
+    Yield content deltas of a streamed chat completion (stream=True).
+    Retries only cover opening the stream; streamed calls are never cached.
+    """
+    t0 = time.perf_counter()
+    attrs = {"model": kwargs.get("model"), "image_bytes": image_bytes(kwargs.get("messages")), "cache": "off"}
+    METRICS.inc("review_llm_requests_total", cache="off")
+    stream = _create_with_retries(client, max_retries, base_delay, max_delay, stream=True, **kwargs)
+    chunks = 0
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not chunks:
+                    attrs["ttft_s"] = time.perf_counter() - t0
+                chunks += 1
+                yield delta
+    finally:
+        # streamed responses carry no usage by default; count content chunks instead
+        add_span("llm.stream", time.perf_counter() - t0, chunks=chunks, **attrs)
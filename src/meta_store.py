@@ -0,0 +1,114 @@
+# meta_store.py
+"""
+按需读取的 meta 存储：不再把整个 meta.jsonl（完整摘要 + review）解析进内存
+
+meta.offsets.npy 保存每一行在 meta.jsonl 中的起始字节（n+1 个 int64，最后一个是文件大小），
+查询时只 pread + json.loads 命中的 top-k 行。
+
+    python -m src.meta_store data/rag_iclr2020_index      # 为已有索引生成 offsets
+"""
+import os
+import sys
+import json
+import threading
+from functools import lru_cache
+
+from .lazy_imports import lazy_import
+
+np = lazy_import("numpy")
+
+META_FILE = "meta.jsonl"
+OFFSETS_FILE = "meta.offsets.npy"
+ROW_CACHE_SIZE = 4096
+
+
+def build_offsets(jsonl_path: str, out_path: str = None) -> "np.ndarray":
+    """Byte offset of every line (plus the file size); written atomically to out_path if given."""
+    offsets = [0]
+    with open(jsonl_path, "rb") as f:
+        for line in f:
+            offsets.append(offsets[-1] + len(line))
+    arr = np.array(offsets, dtype="int64")
+    if out_path:
+        tmp = out_path + f".tmp-{os.getpid()}.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, out_path)
+    return arr
+
+
+class MetaStore:
+    """
+    Read-only, list-like view over meta.jsonl: len(store), store[i], store.get_many(rows).
+    Thread-safe; recently used rows are kept in a small LRU cache, so treat them as read-only.
+    """
+
+    def __init__(self, jsonl_path: str, offsets=None):
+        self.path = jsonl_path
+        self._f = open(jsonl_path, "rb")
+        self._offsets = offsets
+        self._seek_lock = threading.Lock()
+        self._row = lru_cache(maxsize=ROW_CACHE_SIZE)(self._read_row)
+
+    @classmethod
+    def open(cls, index_dir: str):
+        """
+        Open index_dir's meta.jsonl, (re)building the offsets if missing or stale.
+        Rebuilt offsets are only persisted in snapshot directories (written by rag_index_update);
+        legacy index directories, e.g. the one tracked in the repo, keep them in memory
+        (run ``python -m src.meta_store <dir>`` to write them explicitly).
+        """
+        path = os.path.join(index_dir, META_FILE)
+        offsets_path = os.path.join(index_dir, OFFSETS_FILE)
+        offsets = None
+        if os.path.exists(offsets_path):
+            offsets = np.load(offsets_path, mmap_mode="r")
+            if int(offsets[-1]) != os.path.getsize(path):
+                offsets = None
+        if offsets is None:
+            snapshot = os.path.exists(os.path.join(index_dir, "version.json"))
+            try:
+                offsets = build_offsets(path, offsets_path if snapshot else None)
+            except OSError:  # read-only index directory: keep them in memory
+                offsets = build_offsets(path)
+        return cls(path, offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i)
+        if not 0 <= i < len(self):
+            raise IndexError(f"meta row {i} out of range ({len(self)} rows)")
+        return self._row(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def get_many(self, rows):
+        return [self[i] for i in rows]
+
+    def _read_row(self, i: int) -> dict:
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        if hasattr(os, "pread"):
+            raw = os.pread(self._f.fileno(), end - start, start)
+        else:
+            with self._seek_lock:
+                self._f.seek(start)
+                raw = self._f.read(end - start)
+        return json.loads(raw)
+
+    def close(self):
+        self._f.close()
+
+
+def open_meta(index_dir: str) -> MetaStore:
+    return MetaStore.open(index_dir)
+
+
+if __name__ == "__main__":
+    from .rag_index_update import resolve_index_dir
+    for d in sys.argv[1:] or ["data/rag_iclr2020_index"]:
+        live = resolve_index_dir(d)
+        n = len(build_offsets(os.path.join(live, META_FILE), os.path.join(live, OFFSETS_FILE))) - 1
+        print(f"{live}: {n} rows -> {OFFSETS_FILE}")
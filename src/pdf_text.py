@@ -0,0 +1,103 @@
+# pdf_text.py
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .lazy_imports import lazy_import
+
+fitz = lazy_import("fitz")  # PyMuPDF
+
+
+# ====================================================
+# PDF sources: a file path or the PDF bytes themselves (e.g. an upload)
+# ====================================================
+def is_pdf_bytes(pdf) -> bool:
+    return isinstance(pdf, (bytes, bytearray, memoryview))
+
+
+def open_pdf(pdf):
+    """fitz document for a path or in-memory PDF bytes (nothing is written to disk)."""
+    if is_pdf_bytes(pdf):
+        return fitz.open(stream=bytes(pdf), filetype="pdf")
+    return fitz.open(pdf)
+
+
+def _file_like(pdf):
+    """What pdfplumber / PyPDF2 accept: the path, or a BytesIO over the bytes."""
+    return io.BytesIO(pdf) if is_pdf_bytes(pdf) else pdf
+
+
+def describe_pdf(pdf) -> str:
+    return f"<{len(pdf)} byte PDF>" if is_pdf_bytes(pdf) else str(pdf)
+
+
+# ====================================================
+# Backends: (pdf, page_nos) -> list[str], one entry per requested page
+# ====================================================
+def _pages_pymupdf(pdf, page_nos):
+    with open_pdf(pdf) as doc:
+        return [doc[i].get_text() for i in page_nos]
+
+def _pages_pdfplumber(pdf, page_nos):
+    import pdfplumber
+    with pdfplumber.open(_file_like(pdf)) as doc:
+        return [doc.pages[i].extract_text() or "" for i in page_nos]
+
+def _pages_pypdf2(pdf, page_nos):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(_file_like(pdf))
+    return [reader.pages[i].extract_text() or "" for i in page_nos]
+
+
+BACKENDS = {
+    "pymupdf": _pages_pymupdf,
+    "pdfplumber": _pages_pdfplumber,
+    "pypdf2": _pages_pypdf2,
+}
+DEFAULT_BACKEND = "pymupdf"
+# below this many pages a process pool costs more than it saves
+MIN_PAGES_PER_WORKER = 8
+
+
+def register_backend(name: str, fn):
+    """Add an extractor: fn(pdf, page_nos) -> list[str], pdf being a path or PDF bytes."""
+    BACKENDS[name] = fn
+
+
+def page_count(pdf) -> int:
+    with open_pdf(pdf) as doc:
+        return doc.page_count
+
+
+def _extract_range(args):
+    backend, pdf, page_nos = args
+    return BACKENDS[backend](pdf, page_nos)
+
+
+def extract_pages(pdf, backend: str = DEFAULT_BACKEND, processes: int = None) -> list[str]:
+    """
+    Page-indexed text: result[i] is the text of page i + 1.
+    pdf: file path or PDF bytes.
+    processes: fan contiguous page ranges out over a process pool
+    (only used when every worker gets at least MIN_PAGES_PER_WORKER pages).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown text backend {backend!r}; choose from {sorted(BACKENDS)}")
+    n = page_count(pdf)
+    workers = min(processes or 1, n // MIN_PAGES_PER_WORKER)
+    if workers <= 1:
+        return BACKENDS[backend](pdf, list(range(n)))
+
+    step = (n + workers - 1) // workers
+    ranges = [list(range(i, min(i + step, n))) for i in range(0, n, step)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_extract_range, [(backend, pdf, r) for r in ranges])
+        return [text for part in parts for text in part]
+
+
+def join_pages(pages: list[str]) -> str:
+    return "\n".join(p.strip("\n") for p in pages).strip()
+
+
+def default_processes() -> int:
+    return max(1, (os.cpu_count() or 2) // 2)
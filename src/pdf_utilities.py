@@ -1,25 +1,23 @@
 # pdf_utilities.py
-import fitz  # PyMuPDF
-import tempfile
-import os
+import io
 import re
-import shutil
-from PyPDF2 import PdfReader
-from PIL import Image
-from openai import OpenAI
-import httpx, json
-import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from .lazy_imports import lazy_import
+from .llm_client import chat_completion
+from .pdf_text import DEFAULT_BACKEND, describe_pdf, extract_pages, join_pages, open_pdf
+from .chunking import DEFAULT_CHUNK_TOKENS, char_chunks, chunk_text
+from .scratch import get_scratch
+from .tracing import span, submit
+
+fitz = lazy_import("fitz")  # PyMuPDF
+Image = lazy_import("PIL.Image")
 
 # ====================================================
 # PDF Extraction Utilities
 # ====================================================
-def extract_full_text(pdf_path: str) -> str:
-    """Extract all text from a PDF file."""
-    reader = PdfReader(pdf_path)
-    text = ""
-    for page in reader.pages:
-        text += page.extract_text() or ""
-    return text.strip()
+def extract_full_text(pdf, backend: str = DEFAULT_BACKEND, processes: int = None) -> str:
+    """Extract all text from a PDF path or PDF bytes (pages joined by newlines)."""
+    return join_pages(extract_pages(pdf, backend=backend, processes=processes))
 
 def extract_title_and_abstract(text: str):
     """Heuristically extract a likely title and the abstract from scientific text."""
@@ -58,9 +56,17 @@ def extract_title_and_abstract(text: str):
 
 
 
-def merge_images_grid(image_paths, cols: int = 2, bg_color=(255, 255, 255)) -> str:
-    """Merge individual page images into a single grid preview PNG."""
-    images = [Image.open(p) for p in image_paths]
+def _as_image(image) -> "Image.Image":
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+
+def merge_images_grid(images, cols: int = 2, bg_color=(255, 255, 255)) -> "Image.Image":
+    """Merge page images (PIL images, encoded bytes or paths) into one in-memory grid image."""
+    images = [_as_image(im) for im in images]
     w, h = max(im.width for im in images), max(im.height for im in images)
     rows = (len(images) + cols - 1) // cols
 
@@ -68,95 +74,190 @@ def merge_images_grid(image_paths, cols: int = 2, bg_color=(255, 255, 255)) -> s
     for idx, im in enumerate(images):
         r, c = divmod(idx, cols)
         grid.paste(im, (c * w, r * h))
+    return grid
+
+
+def image_to_png(img: "Image.Image") -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _pixmap_to_image(pix) -> "Image.Image":
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+_worker_pdf = None
+
+def _init_render_worker(pdf):
+    # the PDF (path or bytes) is shipped once per worker, not once per page
+    global _worker_pdf
+    _worker_pdf = pdf
+
+
+def _render_page(page_no: int, dpi: int):
+    """Process-pool worker: render one page, return raw RGB samples."""
+    with open_pdf(_worker_pdf) as doc:
+        pix = doc[page_no].get_pixmap(dpi=dpi)
+        return pix.width, pix.height, pix.samples
+
+
+def iter_page_images(pdf, dpi: int = 150, pages=None):
+    """Yield (page_no, PIL image) one page at a time, without touching disk."""
+    with open_pdf(pdf) as doc:
+        for i in (range(doc.page_count) if pages is None else pages):
+            yield i, _pixmap_to_image(doc[i].get_pixmap(dpi=dpi))
+
+
+def render_pages_grid(pdf, dpi: int = 150, cols: int = 2, bg_color=(255, 255, 255),
+                      pages=None, processes: int = None) -> "Image.Image":
+    """
+    Render PDF pages (path or PDF bytes) straight into a pre-sized grid canvas.
+    Page sizes are computed from the page geometry up front, so each pixmap is
+    pasted and dropped immediately: peak memory is ~one page plus the canvas
+    (or one page per worker when ``processes`` > 1).
+    """
+    zoom = fitz.Matrix(dpi / 72, dpi / 72)
+    with open_pdf(pdf) as doc:
+        page_nos = list(range(doc.page_count)) if pages is None else list(pages)
+        sizes = [(doc[i].rect * zoom).irect for i in page_nos]
+    if not page_nos:
+        raise ValueError(f"No pages to render in {describe_pdf(pdf)}")
+
+    w, h = max(r.width for r in sizes), max(r.height for r in sizes)
+    rows = (len(page_nos) + cols - 1) // cols
+    grid = Image.new("RGB", (cols * w, rows * h), color=bg_color)
+
+    def _paste(slot, im):
+        r, c = divmod(slot, cols)
+        grid.paste(im, (c * w, r * h))
 
-    temp_fd, temp_img_path = tempfile.mkstemp(suffix=".png")
-    grid.save(temp_img_path)
-    os.close(temp_fd)
-    return temp_img_path
+    if processes and processes > 1 and len(page_nos) > 1:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_render_worker, initargs=(pdf,)) as pool:
+            futures = {pool.submit(_render_page, p, dpi): slot for slot, p in enumerate(page_nos)}
+            for fut in as_completed(futures):
+                pw, ph, samples = fut.result()
+                _paste(futures[fut], Image.frombytes("RGB", (pw, ph), samples))
+                del samples
+    else:
+        with open_pdf(pdf) as doc:
+            for slot, p in enumerate(page_nos):
+                _paste(slot, _pixmap_to_image(doc[p].get_pixmap(dpi=dpi)))
+    return grid
 
 
-def extract_and_merge_images(pdf_path: str, dpi: int = 150) -> str:
-    """Render all PDF pages to images and merge into one temporary PNG preview."""
-    temp_dir = tempfile.mkdtemp(prefix="pdf_pages_")
-    doc = fitz.open(pdf_path)
-    image_paths = []
+def render_grid_png(pdf, dpi: int = 150, processes: int = None) -> bytes:
+    """All pages as one lossless PNG grid, encoded in memory."""
+    return image_to_png(render_pages_grid(pdf, dpi=dpi, processes=processes))
 
-    for i, page in enumerate(doc):
-        pix = page.get_pixmap(dpi=dpi)
-        img_path = os.path.join(temp_dir, f"page_{i+1}.png")
-        pix.save(img_path)
-        image_paths.append(img_path)
 
-    merged_path = merge_images_grid(image_paths)
-    shutil.rmtree(temp_dir, ignore_errors=True)
-    return merged_path
+def extract_and_merge_images(pdf, dpi: int = 150, processes: int = None) -> str:
+    """
+    Path-returning variant of render_grid_png for callers that need a file.
+    The PNG lives in the scratch area (see scratch.ScratchArea) and is swept
+    automatically; prefer render_grid_png.
+    """
+    return get_scratch().write(render_grid_png(pdf, dpi=dpi, processes=processes), suffix=".png")
 
 
 # ====================================================
 # Hierarchical Summarization
 # ====================================================
-def summarize_text_hierarchical(long_text, client=None, model="gpt-4o", chunk_size=8000):
-    """Summarize long academic text hierarchically via chunked GPT summarization."""
+CHUNK_SYSTEM_PROMPT = (
+    "You are an expert research summarizer trained to preserve full technical accuracy. "
+    "Retain all essential details — model names, datasets, quantitative results, and ablation findings."
+)
 
-    status_placeholder = st.empty()
+
+def summarize_chunk(chunk, client, model="gpt-4o", max_retries=5, cache=True):
+    """Summarize one text chunk (map step), retrying on 429/5xx."""
+    response = chat_completion(
+        client,
+        max_retries=max_retries,
+        cache=cache,
+        model=model,
+        messages=[
+            {
+                "role": "system",
+                "content": CHUNK_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": (
+                    f"Summarize this passage:\n\n{chunk}\n\n"
+                    "Focus on key details, simplify language but keep all results and comparisons."
+                )
+            }
+        ],
+        temperature=0,
+        max_tokens=1800
+    )
+    return response.choices[0].message.content.strip()
+
+
+def summarize_text_hierarchical(long_text, client=None, model="gpt-4o", chunk_size=8000,
+                                max_in_flight=4, max_retries=5, cache=True,
+                                chunking="sections", chunk_tokens=DEFAULT_CHUNK_TOKENS, drop=("references",),
+                                progress=None):
+    """Summarize long academic text hierarchically via chunked GPT summarization.
+
+    chunking="sections" packs detected sections into chunks of ``chunk_tokens``
+    tokens and skips the ``drop`` section kinds; chunking="chars" is the original
+    ``chunk_size``-character slicing.
+    Chunks are summarized concurrently with at most ``max_in_flight`` requests
+    outstanding; summaries are merged in original chunk order.
+    All calls run at temperature=0, so they are cached by default (``cache=False`` to opt out).
+    progress: optional callable receiving status messages (e.g. a Streamlit placeholder's write).
+    """
 
     print(f"[Step 1] Data preprocessing...")
     # Step 1
-    status_placeholder.write("[Step 1] Data preprocessing...")
+    if progress:
+        progress("[Step 1] Data preprocessing...")
 
-    chunks = [long_text[i:i + chunk_size] for i in range(0, len(long_text), chunk_size)]
-    summaries = []
+    if chunking == "chars":
+        chunks = char_chunks(long_text, chunk_size)
+    else:
+        chunks = chunk_text(long_text, max_tokens=chunk_tokens, drop=drop, model=model)
 
-    for i, chunk in enumerate(chunks):
+    def _summarize(item):
+        i, chunk = item
         print(f"Summarizing chunk {i + 1}/{len(chunks)}...")
+        with span("summary.chunk", chunk=i, chars=len(chunk)):
+            return summarize_chunk(chunk, client, model, max_retries, cache)
+
+    workers = max(1, min(max_in_flight, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarize") as pool:
+        # collected in submission order, so the merge prompt is unchanged
+        futures = [submit(pool, _summarize, item) for item in enumerate(chunks)]
+        summaries = [f.result() for f in futures]
 
-        response = client.chat.completions.create(
+    merged = "\n\n".join(summaries)
+    print("Creating final hierarchical summary...")
+
+    with span("summary.merge", chunks=len(chunks)):
+        final_response = chat_completion(
+            client,
+            max_retries=max_retries,
+            cache=cache,
             model=model,
             messages=[
                 {
                     "role": "system",
                     "content": (
-                        "You are an expert research summarizer trained to preserve full technical accuracy. "
-                        "Retain all essential details — model names, datasets, quantitative results, and ablation findings."
+                        "You are an expert academic summarizer. "
+                        "Merge detailed summaries into a cohesive, structured overview of the paper."
                     )
                 },
                 {
                     "role": "user",
                     "content": (
-                        f"Summarize this passage:\n\n{chunk}\n\n"
-                        "Focus on key details, simplify language but keep all results and comparisons."
+                        f"Combine and refine the following summaries into a structured overview:\n\n{merged}"
                     )
                 }
             ],
             temperature=0,
-            max_tokens=1800
+            max_tokens=3000
         )
-        summaries.append(response.choices[0].message.content.strip())
-
-    merged = "\n\n".join(summaries)
-    print("Creating final hierarchical summary...")
-
-    final_response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an expert academic summarizer. "
-                    "Merge detailed summaries into a cohesive, structured overview of the paper."
-                )
-            },
-            {
-                "role": "user",
-                "content": (
-                    f"Combine and refine the following summaries into a structured overview:\n\n{merged}"
-                )
-            }
-        ],
-        temperature=0,
-        max_tokens=3000
-    )
-
-    status_placeholder.empty()
 
     return final_response.choices[0].message.content.strip()
@@ -1,12 +1,17 @@
 # rag_build_index.py
+# python -m src.rag_generate
 import os, json
 import pandas as pd
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import faiss
 
+from .ann_index import build_index, write_index_config
+
 EXCEL_PATH = "tp_2020conference.xlsx"  # 你的Excel路径
 OUT_DIR = "rag_iclr2020_index"
+# 索引类型：flat（精确）/ hnsw / ivf_flat / ivf_pq / ivf_sq8，参数见 ann_index.py
+INDEX_CONFIG = {"type": "flat"}
 os.makedirs(OUT_DIR, exist_ok=True)
 
 # 1) 读取数据
@@ -32,12 +37,11 @@ encoder = SentenceTransformer(model_name)
 emb = encoder.encode(corpus, show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=True)
 
 # 4) 建 FAISS 索引（余弦相似采用内积，因已normalize）
-d = emb.shape[1]
-index = faiss.IndexFlatIP(d)
-index.add(emb)
+index, index_config = build_index(np.ascontiguousarray(emb, dtype="float32"), config=INDEX_CONFIG)
 
 # 5) 保存索引和元数据
 faiss.write_index(index, os.path.join(OUT_DIR, "faiss.index"))
+write_index_config(OUT_DIR, {**index_config, "requested": INDEX_CONFIG})
 
 meta = df[["id","title","abstract","review"]].to_dict(orient="records")
 with open(os.path.join(OUT_DIR, "meta.jsonl"), "w", encoding="utf-8") as f:
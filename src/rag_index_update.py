@@ -0,0 +1,282 @@
+# rag_index_update.py
+"""
+增量维护检索索引（替代 rag_generate.py 的全量重建）
+
+    python -m src.rag_index_update upsert --index-dir data/rag_iclr2020_index --input new_reviews.jsonl
+    python -m src.rag_index_update delete --index-dir data/rag_iclr2020_index --ids iclr2020_3 iclr2020_9
+    python -m src.rag_index_update info   --index-dir data/rag_iclr2020_index
+    python -m src.rag_index_update reindex --index-dir data/rag_iclr2020_index --index-config '{"type": "hnsw"}'
+
+- 每条记录以稳定的字符串 id 标识，FAISS 使用 IndexIDMap2（faiss_id = hash(id)）
+- 索引类型（flat / hnsw / ivf_*，见 ann_index.py）记录在 index.json，reindex 只重建索引不重新 encode
+- upsert 只对新增 / title+abstract 变化的记录做 encode（分批）
+- 每次提交写一个新的快照目录 vNNNNNN/，最后原子替换 CURRENT 指针；
+  检索端 (RetrievalEngine) 读取 CURRENT，看到版本变化即可热加载
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+
+from .lazy_imports import lazy_import
+
+from .ann_index import build_index, read_index_config, write_index_config
+from .meta_store import META_FILE, OFFSETS_FILE, build_offsets
+
+np = lazy_import("numpy")
+faiss = lazy_import("faiss")
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 2
+REQUIRED_COLUMNS = ("id", "title", "abstract", "review")
+
+
+def stable_id(paper_id: str) -> int:
+    """63-bit FAISS id derived from the record's string id."""
+    return int.from_bytes(hashlib.sha1(str(paper_id).encode("utf-8")).digest()[:8], "big") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def norm_text(x) -> str:
+    if x is None or (isinstance(x, float) and np.isnan(x)):
+        return ""
+    return str(x).strip()
+
+
+def embed_text(record: dict) -> str:
+    # 与 rag_generate.py 保持一致
+    return (norm_text(record.get("title")) + " \n\n" + norm_text(record.get("abstract"))).strip()
+
+
+def embed_hash(record: dict) -> str:
+    return hashlib.sha1(embed_text(record).encode("utf-8")).hexdigest()
+
+
+# ====================================================
+# Snapshot layout
+# ====================================================
+def resolve_index_dir(index_dir: str) -> str:
+    """Directory holding the live files: the CURRENT snapshot, or index_dir itself (legacy layout)."""
+    pointer = os.path.join(index_dir, CURRENT_FILE)
+    if os.path.exists(pointer):
+        with open(pointer, "r", encoding="utf-8") as f:
+            return os.path.join(index_dir, f.read().strip())
+    return index_dir
+
+
+def read_version(index_dir: str) -> dict:
+    path = os.path.join(resolve_index_dir(index_dir), "version.json")
+    if not os.path.exists(path):
+        return {"version": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_snapshot(index_dir: str) -> dict:
+    """Vectors, faiss ids and meta rows (aligned) of the live snapshot."""
+    live = resolve_index_dir(index_dir)
+    with open(os.path.join(live, "encoder.json"), "r") as f:
+        encoder_cfg = json.load(f)
+    metas = []
+    with open(os.path.join(live, "meta.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            metas.append(json.loads(line))
+
+    if os.path.exists(os.path.join(live, "vectors.npy")):
+        vectors = np.load(os.path.join(live, "vectors.npy"))
+        ids = np.load(os.path.join(live, "ids.npy"))
+    else:
+        # legacy flat index written by rag_generate.py: row i <-> vector i
+        index = faiss.read_index(os.path.join(live, "faiss.index"))
+        vectors = index.reconstruct_n(0, index.ntotal)
+        ids = np.array([stable_id(m.get("id", f"row_{i}")) for i, m in enumerate(metas)], dtype="int64")
+        for m in metas:
+            m.setdefault("embed_hash", embed_hash(m))
+    index_config = read_index_config(live)
+    return {"vectors": np.ascontiguousarray(vectors, dtype="float32"), "ids": ids.astype("int64"),
+            "metas": metas, "encoder": encoder_cfg, "version": read_version(index_dir),
+            "index_config": index_config.get("requested", index_config)}
+
+
+def write_snapshot(index_dir: str, snap: dict, note: str = "") -> str:
+    """Write a complete new snapshot directory, then atomically repoint CURRENT at it."""
+    os.makedirs(index_dir, exist_ok=True)
+    version = int(snap["version"].get("version", 0)) + 1
+    name = f"v{version:06d}"
+    tmp_dir = os.path.join(index_dir, f".{name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    requested = snap.get("index_config") or {"type": "flat"}
+    index, resolved = build_index(snap["vectors"], snap["ids"], requested)
+    faiss.write_index(index, os.path.join(tmp_dir, "faiss.index"))
+    write_index_config(tmp_dir, {**resolved, "requested": requested})
+    np.save(os.path.join(tmp_dir, "vectors.npy"), snap["vectors"])
+    np.save(os.path.join(tmp_dir, "ids.npy"), snap["ids"])
+    with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+        for m in snap["metas"]:
+            f.write(json.dumps(m, ensure_ascii=False) + "\n")
+    build_offsets(os.path.join(tmp_dir, META_FILE), os.path.join(tmp_dir, OFFSETS_FILE))
+    with open(os.path.join(tmp_dir, "encoder.json"), "w") as f:
+        json.dump(snap["encoder"], f)
+    with open(os.path.join(tmp_dir, "version.json"), "w") as f:
+        json.dump({"version": version, "created": datetime.now().isoformat(), "count": len(snap["ids"]),
+                   "parent": snap["version"].get("version"), "note": note}, f)
+
+    final_dir = os.path.join(index_dir, name)
+    os.replace(tmp_dir, final_dir)
+    pointer_tmp = os.path.join(index_dir, f".{CURRENT_FILE}.tmp-{os.getpid()}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(index_dir, CURRENT_FILE))
+    _prune(index_dir, keep=KEEP_SNAPSHOTS)
+    print(f"[index] {index_dir} -> {name} ({len(snap['ids'])} records)")
+    return final_dir
+
+
+def _prune(index_dir: str, keep: int):
+    snaps = sorted(d for d in os.listdir(index_dir) if d.startswith("v") and d[1:].isdigit())
+    for d in snaps[:-keep]:
+        shutil.rmtree(os.path.join(index_dir, d), ignore_errors=True)
+
+
+# ====================================================
+# Operations
+# ====================================================
+def _empty_snapshot(model_name: str) -> dict:
+    return {"vectors": np.zeros((0, 0), dtype="float32"), "ids": np.zeros(0, dtype="int64"), "metas": [],
+            "encoder": {"model_name": model_name}, "version": {"version": 0}, "index_config": {"type": "flat"}}
+
+
+def _has_index(index_dir: str) -> bool:
+    return os.path.exists(os.path.join(resolve_index_dir(index_dir), "meta.jsonl"))
+
+
+def upsert(index_dir: str, records: list[dict], batch_size: int = 64, model_name: str = None, encoder=None,
+           index_config: dict = None) -> dict:
+    """Insert new records / update existing ones by id; only new or changed title+abstract are re-encoded."""
+    snap = load_snapshot(index_dir) if _has_index(index_dir) else _empty_snapshot(model_name or DEFAULT_MODEL)
+    if index_config:
+        snap["index_config"] = index_config
+    row_of = {int(fid): i for i, fid in enumerate(snap["ids"])}
+
+    latest = {}
+    for rec in records:
+        rec = {k: (norm_text(v) if k in REQUIRED_COLUMNS else v) for k, v in rec.items()}
+        fid = stable_id(rec["id"])
+        latest.pop(fid, None)  # the same id twice in one batch: the last record wins
+        latest[fid] = rec
+
+    to_encode, updated_meta = [], 0
+    metas = list(snap["metas"])
+    for fid, rec in latest.items():
+        rec["embed_hash"] = embed_hash(rec)
+        row = row_of.get(fid)
+        if row is not None and metas[row].get("embed_hash") == rec["embed_hash"]:
+            metas[row] = rec  # review text etc. changed, embedding still valid
+            updated_meta += 1
+        else:
+            to_encode.append((fid, rec))
+
+    if to_encode:
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(snap["encoder"]["model_name"])
+        emb = encoder.encode([embed_text(r) for _, r in to_encode], batch_size=batch_size,
+                             show_progress_bar=len(to_encode) > batch_size,
+                             convert_to_numpy=True, normalize_embeddings=True).astype("float32")
+        new_ids = np.array([fid for fid, _ in to_encode], dtype="int64")
+        keep = ~np.isin(snap["ids"], new_ids)
+        vectors = snap["vectors"][keep] if len(snap["ids"]) else np.zeros((0, emb.shape[1]), dtype="float32")
+        snap["vectors"] = np.vstack([vectors, emb])
+        snap["ids"] = np.concatenate([snap["ids"][keep], new_ids])
+        metas = [m for m, k in zip(metas, keep) if k] + [r for _, r in to_encode]
+    snap["metas"] = metas
+
+    stats = {"encoded": len(to_encode), "meta_only": updated_meta, "total": len(snap["ids"])}
+    if to_encode or updated_meta or index_config:
+        write_snapshot(index_dir, snap, note=f"upsert {stats}")
+    return stats
+
+
+def delete(index_dir: str, paper_ids: list[str]) -> dict:
+    snap = load_snapshot(index_dir)
+    doomed = np.array([stable_id(p) for p in paper_ids], dtype="int64")
+    keep = ~np.isin(snap["ids"], doomed)
+    removed = int((~keep).sum())
+    if removed:
+        snap["vectors"], snap["ids"] = snap["vectors"][keep], snap["ids"][keep]
+        snap["metas"] = [m for m, k in zip(snap["metas"], keep) if k]
+        write_snapshot(index_dir, snap, note=f"delete {removed}")
+    return {"deleted": removed, "total": len(snap["ids"])}
+
+
+def reindex(index_dir: str, index_config: dict) -> dict:
+    """Rebuild the FAISS index with another type / parameters from the stored vectors (no re-encoding)."""
+    snap = load_snapshot(index_dir)
+    snap["index_config"] = index_config
+    write_snapshot(index_dir, snap, note=f"reindex {index_config}")
+    return {"total": len(snap["ids"]), "index": read_index_config(resolve_index_dir(index_dir))}
+
+
+def read_records(path: str) -> list[dict]:
+    """Rows with id/title/abstract/review from .jsonl, .json, .csv or .xlsx."""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    elif path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    else:
+        import pandas as pd
+        df = pd.read_csv(path) if path.endswith(".csv") else pd.read_excel(path)
+        df.columns = [c.strip().lower() for c in df.columns]
+        records = df.to_dict(orient="records")
+    records = [{k.strip().lower(): v for k, v in r.items()} for r in records]
+    missing = set(REQUIRED_COLUMNS) - set(records[0]) if records else set()
+    if missing:
+        raise ValueError(f"{path}: missing columns {sorted(missing)} (stable ids are required for upserts)")
+    return records
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Incremental maintenance of the RAG review index.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    up = sub.add_parser("upsert", help="append new / update changed records")
+    up.add_argument("--input", required=True)
+    up.add_argument("--batch-size", type=int, default=64)
+    up.add_argument("--model", default=None, help=f"encoder for a brand-new index (default {DEFAULT_MODEL})")
+    de = sub.add_parser("delete", help="remove records by id")
+    de.add_argument("--ids", nargs="*", default=[])
+    de.add_argument("--ids-file", default=None, help="one id per line")
+    re_ = sub.add_parser("reindex", help="rebuild the index with another type from the stored vectors")
+    re_.add_argument("--index-config", type=json.loads, required=True)
+    up.add_argument("--index-config", type=json.loads, default=None,
+                    help='e.g. \'{"type": "ivf_sq8", "nprobe": 32}\' (default: keep the current one)')
+    sub.add_parser("info", help="print the live version")
+    for p in (up, de, re_, sub.choices["info"]):
+        p.add_argument("--index-dir", default="data/rag_iclr2020_index")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "upsert":
+        print(upsert(args.index_dir, read_records(args.input), args.batch_size, args.model,
+                     index_config=args.index_config))
+    elif args.cmd == "reindex":
+        print(reindex(args.index_dir, args.index_config))
+    elif args.cmd == "delete":
+        ids = list(args.ids)
+        if args.ids_file:
+            with open(args.ids_file, "r", encoding="utf-8") as f:
+                ids += [line.strip() for line in f if line.strip()]
+        print(delete(args.index_dir, ids))
+    else:
+        live = resolve_index_dir(args.index_dir)
+        print(json.dumps({"live_dir": live, **read_version(args.index_dir), "index": read_index_config(live)}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,10 @@
 import json
 import re 
+from .llm_client import chat_completion
 
-def build_summary_prompt(paper_title: str, reviews: list[str]):
-    joined = "\n\n---\n\n".join(reviews[:2])
+def build_summary_prompt(paper_title: str, reviews: list[str], max_reviews: int = 2):
+    """max_reviews=None keeps every entry (e.g. passages already selected under a token budget)."""
+    joined = "\n\n---\n\n".join(reviews[:max_reviews])
     return f"""
 You are an advanced AI persona acting as a seasoned reviewer for academic venues, possessing extensive experience in synthesizing academic feedback and providing constructive criticism. Your are tasked with summarizing existing reviews to guide junior reviewers in crafting high-quality reviews for new submissions.
 
@@ -29,11 +31,14 @@ Return the summary in JSON format with the following structure:
 """
 
 
-def summarise_reference(client, title: str, reviews: list[str]):
-    prompt = build_summary_prompt(title, reviews)
+def summarise_reference(client, title: str, reviews: list[str], cache=False, max_reviews=2):
+    """cache: opt in to the completion cache (the call is sampled at temperature=0.3)."""
+    prompt = build_summary_prompt(title, reviews, max_reviews)
 
     try:
-        resp = client.chat.completions.create(
+        resp = chat_completion(
+            client,
+            cache=cache,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You must return only valid JSON following the specified schema. No explanations, no Markdown fences."},
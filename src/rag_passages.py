@@ -0,0 +1,168 @@
+# rag_passages.py
+"""
+段落级 review 检索：把每条 review 按审稿人 / 方面（weaknesses、clarity、experiments ...）切成段落，
+单独建索引；检索时在 token 预算内挑最相关的段落，替代整篇 review 塞进 reference summary prompt。
+
+    python -m src.rag_passages --index-dir data/rag_iclr2020_index --out-dir data/rag_iclr2020_passages
+
+生成的段落索引与普通索引同构（CURRENT -> vNNNNNN/，meta.jsonl 的 "review" 字段是段落文本），
+生成后用 python -m src.rag_router register <分片> --passage-dir <out-dir> 登记到对应分片。
+"""
+import os
+import re
+import sys
+import json
+import argparse
+
+from .chunking import SENTENCE_END, count_tokens
+from .lazy_imports import lazy_import
+from .rag_index_update import _empty_snapshot, read_version, resolve_index_dir, stable_id, write_snapshot
+from .rag_retrieve import load_meta, shared_encoder
+from .rag_router import search_shards
+
+np = lazy_import("numpy")
+
+DEFAULT_PASSAGE_TOKENS = 150
+MIN_PASSAGE_TOKENS = 40
+REFERENCE_TOKEN_BUDGET = 600
+# 以论文自身内容为主的段落对“审稿规范”帮助不大
+SKIP_ASPECTS = ("summary",)
+
+REVIEW_PREFIX = re.compile(r"^\s*review:\s*#*\s*", re.I)
+REVIEWER_SPLIT = re.compile(r"(?im)^\s*(?:-{3,}|={3,}|(?:official\s+)?review(?:er)?\s*#?\s*\d+\s*:?)\s*$")
+# "Weaknesses:", "Cons -", "Minor comments:" at the start of a sentence / line
+ASPECT_HEADING = re.compile(r"^\W*(strengths?|pros|weakness(?:es)?|cons|clarity|experiments?|questions?|"
+                            r"minor(?: comments| issues)?|summary|novelty)\b\s*[:\-]", re.I)
+ASPECT_KEYWORDS = (
+    ("weaknesses", re.compile(r"\b(weakness|cons\b|limitation|concern|drawback|shortcoming|unconvinc|lack)", re.I)),
+    ("experiments", re.compile(r"\b(experiment|baseline|ablation|dataset|benchmark|empirical|evaluat)", re.I)),
+    ("clarity", re.compile(r"\b(clarity|unclear|clear|writing|written|presentation|typo|notation|readab|explain)", re.I)),
+    ("theory", re.compile(r"\b(theor|proof|bound|lemma|assumption|convergence)", re.I)),
+    ("novelty", re.compile(r"\b(novel|contribution|originality|related work|prior work|incremental)", re.I)),
+    ("strengths", re.compile(r"\b(strength|pros\b|well[- ]motivated|interesting|impressive)", re.I)),
+    ("questions", re.compile(r"\?\s*$")),
+)
+# reviews usually open by restating the paper
+SUMMARY_OPENING = re.compile(r"\b(this (?:paper|work|submission)|the (?:paper|authors?) (?:proposes?|presents?|studies|introduces?))", re.I)
+HEADING_ASPECTS = {"strength": "strengths", "pros": "strengths", "weakness": "weaknesses", "cons": "weaknesses",
+                   "clarity": "clarity", "experiment": "experiments", "question": "questions", "minor": "clarity",
+                   "summary": "summary", "novelty": "novelty"}
+
+
+def _aspect(sentence: str):
+    """(aspect, is_heading) for a sentence; aspect is None when nothing matches."""
+    m = ASPECT_HEADING.match(sentence)
+    if m:
+        word = m.group(1).lower()
+        return next(v for k, v in HEADING_ASPECTS.items() if word.startswith(k)), True
+    for aspect, pattern in ASPECT_KEYWORDS:
+        if pattern.search(sentence):
+            return aspect, False
+    return None, False
+
+
+def split_review(review: str, max_tokens: int = DEFAULT_PASSAGE_TOKENS) -> list[dict]:
+    """Review text -> passages [{reviewer, aspect, text, tokens}] of at most ~max_tokens each."""
+    passages = []
+    text = REVIEW_PREFIX.sub("", review or "")
+    for reviewer, part in enumerate(p for p in REVIEWER_SPLIT.split(text) if p.strip()):
+        cur = None
+        for i, sentence in enumerate(SENTENCE_END.split(re.sub(r"\s*\n\s*", " ", part.strip()))):
+            aspect, heading = _aspect(sentence)
+            if i == 0 and not heading and SUMMARY_OPENING.search(sentence):
+                aspect = "summary"
+            tokens = count_tokens(sentence)
+            new = (cur is None or cur["tokens"] + tokens > max_tokens or heading
+                   or (aspect and aspect != cur["aspect"] and cur["tokens"] >= MIN_PASSAGE_TOKENS))
+            if new:
+                prev = (cur or {}).get("aspect")
+                cur = {"reviewer": reviewer, "aspect": aspect or (prev if prev != "summary" else None) or "general",
+                       "text": sentence, "tokens": tokens}
+                passages.append(cur)
+            else:
+                cur["text"] += " " + sentence
+                cur["tokens"] += tokens
+                if cur["aspect"] == "general" and aspect:
+                    cur["aspect"] = aspect
+    return passages
+
+
+def passage_records(metas, max_tokens: int = DEFAULT_PASSAGE_TOKENS) -> list[dict]:
+    records = []
+    for m in metas:
+        for j, p in enumerate(split_review(m.get("review"), max_tokens)):
+            records.append({"id": f"{m['id']}#p{j}", "paper_id": m["id"], "title": m.get("title"),
+                            "reviewer": p["reviewer"], "aspect": p["aspect"], "tokens": p["tokens"],
+                            "review": p["text"]})
+    return records
+
+
+def build_passage_index(index_dir: str, out_dir: str, max_tokens: int = DEFAULT_PASSAGE_TOKENS,
+                        batch_size: int = 64, index_config: dict = None, encoder=None) -> dict:
+    """(Re)build the passage index for index_dir's reviews as a new snapshot of out_dir."""
+    metas = load_meta(index_dir)
+    records = passage_records(metas, max_tokens)
+    with open(os.path.join(resolve_index_dir(index_dir), "encoder.json"), "r") as f:
+        model_name = json.load(f)["model_name"]  # 与论文索引同一 encoder，查询只需 encode 一次
+    encoder = encoder or shared_encoder(model_name)
+    vectors = encoder.encode([r["review"] for r in records], batch_size=batch_size, show_progress_bar=True,
+                             convert_to_numpy=True, normalize_embeddings=True)
+    snap = _empty_snapshot(model_name)
+    snap.update(vectors=np.ascontiguousarray(vectors, dtype="float32"),
+                ids=np.array([stable_id(r["id"]) for r in records], dtype="int64"),
+                metas=records, version=read_version(out_dir))
+    if index_config:
+        snap["index_config"] = index_config
+    write_snapshot(out_dir, snap, note=f"passages of {index_dir}")
+    return {"reviews": len(metas), "passages": len(records),
+            "avg_tokens": round(sum(r["tokens"] for r in records) / max(1, len(records)), 1)}
+
+
+def select_passages(hits, token_budget: int = REFERENCE_TOKEN_BUDGET, per_paper: int = 3,
+                    skip_aspects=SKIP_ASPECTS) -> list[dict]:
+    """Greedy pick by score under the token budget, at most per_paper passages from one reviewed paper."""
+    picked, used, per = [], 0, {}
+    seen = set()
+    for h in hits:
+        key = " ".join(h["review"].lower().split())
+        if h.get("aspect") in skip_aspects or key in seen or per.get(h["paper_id"], 0) >= per_paper:
+            continue
+        if used + h["tokens"] > token_budget:
+            continue
+        picked.append(h)
+        seen.add(key)
+        used += h["tokens"]
+        per[h["paper_id"]] = per.get(h["paper_id"], 0) + 1
+        if token_budget - used < MIN_PASSAGE_TOKENS:
+            break
+    return picked
+
+
+def get_topk_passages(title: str, abstract: str, token_budget: int = REFERENCE_TOKEN_BUDGET, venue: str = None,
+                      weights: dict = None, fetch: int = 50):
+    """
+    Top review passages for a paper under token_budget, formatted "(aspect) text".
+    Returns None if none of the routed shards has a passage index.
+    """
+    hits = search_shards([(title, abstract)], fetch, venue, weights, index_key="passage_dir")
+    if hits is None:
+        return None
+    picked = select_passages(hits[0], token_budget)
+    for h in picked:
+        print(f"  - Passage ({h['aspect']}, {h['tokens']} tok) from: {h['title']} (score: {h['score']:.4f})")
+    return [f"({h['aspect']}) {h['review']}" for h in picked]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Build the passage-level review index for an index directory.")
+    ap.add_argument("--index-dir", default="data/rag_iclr2020_index")
+    ap.add_argument("--out-dir", default="data/rag_iclr2020_passages")
+    ap.add_argument("--max-tokens", type=int, default=DEFAULT_PASSAGE_TOKENS)
+    ap.add_argument("--batch-size", type=int, default=64)
+    args = ap.parse_args(argv)
+    print(build_passage_index(args.index_dir, args.out_dir, args.max_tokens, args.batch_size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,41 +1,110 @@
-import os, json, base64
-import streamlit as st
-from .rag_retrieve import get_topk_reviews
+import os, json, time
+from .rag_router import get_topk_hits, get_topk_reviews
+from .rag_passages import REFERENCE_TOKEN_BUDGET, get_topk_passages
+from .reference_guidance import guidance_for_hits, merge_guidance
 from .rag_llm_summarise import summarise_reference
-from .review_prompts import REVIEWER_PROMPT, ACTION_PROMPT
+from .review_prompts import REVIEWER_PROMPT, ACTION_PROMPT, COMBINED_PROMPT
+from .llm_client import chat_completion, stream_chat_completion
+from .llm_cache import cache_enabled, get_cache
+from .image_payload import payload_from_png
+from .tracing import annotate, span
 
 
-def run_pipeline(client, target_title, target_abstract, text_summary, merged_image_path, k):
-    
-    status_placeholder = st.empty()
+# how the review and the to-do list are generated:
+# - "separate": review call, then a to-do call; both send the page images (the original flow)
+# - "combined": one call returning both as JSON (review_todo_schema), images sent once
+# - "text_todo": review call with images, then a text-only to-do call (review + summary)
+GENERATION_MODES = ("separate", "combined", "text_todo")
+REVIEW_SECTIONS = (
+    ("summary", "1. Summary"),
+    ("strengths", "2. Strengths"),
+    ("weaknesses", "3. Weaknesses"),
+    ("clarity_reproducibility", "4. Clarity & Reproducibility"),
+    ("novelty_significance", "5. Novelty & Significance"),
+)
 
-    # Step 2
-    status_placeholder.write("[Step 2] Retrieving similar manuscripts...")
-    print(f"[Step 2] Retrieving similar manuscripts (k={k})...")
 
-    reviews = get_topk_reviews(target_title, target_abstract, k=k)
+def check_generation_mode(mode):
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Unknown generation mode {mode!r}; choose from {sorted(GENERATION_MODES)}")
+
+
+def image_content(payload):
+    """Chat message parts for every image in an image payload."""
+    return [{"type": "image_url", "image_url": url} for url in payload["images"]]
+
+
+def _log_payload(step, payload):
+    if payload is None:
+        print(f"  {step}: text only, no image payload")
+        return
+    upload = sum(len(url) for url in payload["images"])
+    tokens = f", ~{payload['tokens']} image tokens" if payload.get("tokens") else ""
+    print(f"  {step} image payload: {len(payload['images'])} part(s), {payload['format']}, "
+          f"{payload['bytes']} bytes ({upload} base64){tokens}")
+
+
+def retrieve_reviews(target_title, target_abstract, k, venue=None, shard_weights=None, mode="reviews",
+                     token_budget=REFERENCE_TOKEN_BUDGET):
+    """
+    mode="reviews": the k most similar papers' whole reviews.
+    mode="passages": the best review passages under token_budget (falls back to
+    whole reviews when the routed shard(s) have no passage index).
+    """
+    if mode == "passages":
+        print(f"[Step 2] Retrieving review passages (budget {token_budget} tokens)...")
+        passages = get_topk_passages(target_title, target_abstract, token_budget, venue, shard_weights)
+        if passages is not None:
+            print(f" found {len(passages)} passages")
+            return passages
+        print(" no passage index for this venue, using whole reviews")
+    print(f"[Step 2] Retrieving similar manuscripts (k={k})...")
+    reviews = get_topk_reviews(target_title, target_abstract, k=k, venue=venue, weights=shard_weights)
     print(f" found {len(reviews)} similar review")
+    return reviews
 
-    # Clear Step 1 message
-    status_placeholder.empty() 
 
-    # Step 3
-    status_placeholder.write("[Step 3] Generating reference summary...")
+def generate_reference_summary(client, target_title, reviews, cache=False, max_reviews=2):
     print(f"[Step 3] Generating reference summary...")
+    summary_json = summarise_reference(client, target_title, reviews, cache=cache, max_reviews=max_reviews)
+    return json.loads(summary_json)
+
 
-    summary_json = summarise_reference(client, target_title, reviews)
-    reference_summary = json.loads(summary_json)
+def retrieve_hits(target_title, target_abstract, k, venue=None, shard_weights=None):
+    """Top-k hit records (with shard / title) for the precomputed reference mode."""
+    print(f"[Step 2] Retrieving similar manuscripts (k={k})...")
+    return get_topk_hits(target_title, target_abstract, k=k, venue=venue, weights=shard_weights)
 
-    # Clear Step 2 message
-    status_placeholder.empty()
 
-    # Step 4
-    status_placeholder.write("[Step 4] Generating RAG-based multimodal review...")
-    print(f"[Step 4] Generating RAG-based multimodal review...")
+def precomputed_reference(client, target_title, hits, cache=False, retrieval_mode="reviews", target_abstract=None,
+                          venue=None, shard_weights=None):
+    """
+    Merge the hits' precomputed guidance locally; LLM summary only if none of them has any.
+    The fallback summarises budgeted passages when retrieval_mode="passages" (and the shard
+    has a passage index), otherwise the hits' whole reviews.
+    """
+    records = guidance_for_hits(hits)
+    if records:
+        print(f"[Step 3] Merging precomputed guidance of {len(records)} paper(s)...")
+        annotate(reference="precomputed", guidance_records=len(records))
+        return merge_guidance(records)
+    print(f"[Step 3] No precomputed guidance for the retrieved papers, falling back to the LLM")
+    annotate(reference="llm_fallback")
+    if retrieval_mode == "passages":
+        passages = get_topk_passages(target_title, target_abstract, REFERENCE_TOKEN_BUDGET, venue, shard_weights)
+        if passages is not None:
+            print(f" using {len(passages)} review passages")
+            return generate_reference_summary(client, target_title, passages, cache, reference_limit(retrieval_mode))
+        print(" no passage index for this venue, using whole reviews")
+    return generate_reference_summary(client, target_title, [h["review"] for h in hits], cache)
+
+
+def reference_limit(retrieval_mode):
+    """Passages are already budgeted; whole reviews keep the original first-two cut."""
+    return None if retrieval_mode == "passages" else 2
 
-    with open(merged_image_path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
 
+def review_messages(text_summary, reference_summary, image_payload):
     rag_prompt = f"""
     Below is the target paper to be reviewed, including both a text summary and screenshots of each page.
     Use the reference review only as guidance and do not copy or paraphrase it directly.
@@ -47,32 +116,20 @@ def run_pipeline(client, target_title, target_abstract, text_summary, merged_ima
     {reference_summary}
     """
 
-    review_messages = [
+    return [
         {"role": "system", "content": REVIEWER_PROMPT},
         {"role": "user", "content": [
             {"type": "text", "text": rag_prompt},
-            {"type": "image_url", "image_url": f"data:image/png;base64,{b64}"}
+            *image_content(image_payload)
         ]}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=review_messages,
-        temperature=0.3,
-        max_tokens=4000
-    )
-
-    rag_review = response.choices[0].message.content.strip()
-
-    # Clear Step 3 message
-    status_placeholder.empty()
-
-    # Step 4
-    status_placeholder.write("[Step 5] Generating actionable to-do list...")
-    print(f"[Step 5] Generating actionable to-do list...")
 
+def todo_messages(text_summary, rag_review, image_payload):
+    """image_payload=None sends the summary and review only (text_todo mode)."""
+    paper = "both a text summary and screenshots of each page" if image_payload else "a text summary"
     todo_prompt = f"""
-    Below is the target paper to be reviewed, including both a text summary and screenshots of each page, and a concrete peer review of the paper.
+    Below is the target paper to be reviewed, including {paper}, and a concrete peer review of the paper.
     Your tasks is to convert the review feedback into a clear, actionable to-do list for the authors to address in their revision. Present each action in the Action:Objective[#location] format, and output as a BULLET POINT list.
 
     Paper summary:
@@ -82,26 +139,299 @@ def run_pipeline(client, target_title, target_abstract, text_summary, merged_ima
     {rag_review}
     """
 
-    todo_messages = [
+    return [
         {"role": "system", "content": ACTION_PROMPT},
         {"role": "user", "content": [
             {"type": "text", "text": todo_prompt},
-            {"type": "image_url", "image_url": f"data:image/png;base64,{b64}"}
+            *(image_content(image_payload) if image_payload else [])
         ]}
     ]
 
-    response = client.chat.completions.create(
+
+def review_todo_schema():
+    """Structured-output schema for the combined review + to-do call."""
+    properties = {key: {"type": "string"} for key, _ in REVIEW_SECTIONS}
+    properties["todo"] = {"type": "array", "items": {"type": "string"}}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "review_and_todo",
+            "strict": True,
+            "schema": {"type": "object", "properties": properties, "required": list(properties),
+                       "additionalProperties": False},
+        },
+    }
+
+
+def combined_messages(text_summary, reference_summary, image_payload):
+    messages = review_messages(text_summary, reference_summary, image_payload)
+    messages[0] = {"role": "system", "content": COMBINED_PROMPT}
+    return messages
+
+
+def format_review(sections: dict) -> str:
+    """Markdown review in the same layout as the separate review call."""
+    return "\n\n".join(f"**{title}**  \n{(sections.get(key) or '').strip()}" for key, title in REVIEW_SECTIONS)
+
+
+def parse_review_and_todo(content: str):
+    """(review markdown, to-do items) from the combined JSON response; ValueError if malformed."""
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"combined response is not JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("todo"), list):
+        raise ValueError("combined response lacks a to-do list")
+    todo = [str(item).strip(" -*") for item in data["todo"] if str(item).strip(" -*")]
+    return format_review(data), todo
+
+
+def parse_todo_lines(lines):
+    return [l.strip(" -*") for l in lines if l.strip().startswith(('-', '*'))]
+
+
+def generate_review(client, text_summary, reference_summary, image_payload, cache=False):
+    print(f"[Step 4] Generating RAG-based multimodal review...")
+    _log_payload("review", image_payload)
+
+    response = chat_completion(
+        client,
+        cache=cache,
         model="gpt-4o",
-        messages=todo_messages,
+        messages=review_messages(text_summary, reference_summary, image_payload),
         temperature=0.3,
         max_tokens=4000
     )
 
-    todo_list = [l.strip(" -*") for l in response.choices[0].message.content.splitlines() if l.strip().startswith(('-', '*'))]
+    return response.choices[0].message.content.strip()
+
+
+def generate_todo(client, text_summary, rag_review, image_payload, cache=False):
+    """image_payload=None generates the to-do list from the summary and review text only."""
+    print(f"[Step 5] Generating actionable to-do list...")
+    _log_payload("to-do", image_payload)
+
+    response = chat_completion(
+        client,
+        cache=cache,
+        model="gpt-4o",
+        messages=todo_messages(text_summary, rag_review, image_payload),
+        temperature=0.3,
+        max_tokens=4000
+    )
 
+    todo_list = parse_todo_lines(response.choices[0].message.content.splitlines())
     print(todo_list)
-    status_placeholder.empty()
+    return todo_list
+
+
+def generate_review_and_todo(client, text_summary, reference_summary, image_payload, cache=False):
+    """
+    Review and to-do list from one structured-output call, so the page images are
+    uploaded (and billed) once. If the response is not the expected JSON, it is
+    kept as the review and the to-do list falls back to a text-only call.
+    Returns (review, todo_list).
+    """
+    print(f"[Step 4+5] Generating review and to-do list in one call...")
+    _log_payload("review + to-do", image_payload)
+
+    response = chat_completion(
+        client,
+        cache=cache,
+        model="gpt-4o",
+        messages=combined_messages(text_summary, reference_summary, image_payload),
+        response_format=review_todo_schema(),
+        temperature=0.3,
+        max_tokens=6000
+    )
+    content = response.choices[0].message.content or ""
+    try:
+        review, todo_list = parse_review_and_todo(content)
+        print(todo_list)
+    except ValueError as e:
+        print(f"  ! {e}; generating the to-do list text-only")
+        review = content.strip()
+        todo_list = generate_todo(client, text_summary, review, None, cache)
+    return review, todo_list
+
+
+# ====================================================
+# Streaming
+# ====================================================
+class TodoStreamParser:
+    """Turn streamed to-do text into bullet items as soon as each line is complete."""
+
+    def __init__(self):
+        self._buf = ""
+        self.items = []
+
+    def feed(self, delta: str) -> list[str]:
+        self._buf += delta
+        *lines, self._buf = self._buf.split("\n")
+        return self._take(lines)
+
+    def close(self) -> list[str]:
+        lines, self._buf = [self._buf], ""
+        return self._take(lines)
+
+    def _take(self, lines):
+        new = parse_todo_lines(lines)
+        self.items.extend(new)
+        return new
+
+
+def stream_review(client, text_summary, reference_summary, image_payload):
+    """Yield review text deltas as they arrive."""
+    print(f"[Step 4] Streaming RAG-based multimodal review...")
+    _log_payload("review", image_payload)
+    yield from stream_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=review_messages(text_summary, reference_summary, image_payload),
+        temperature=0.3,
+        max_tokens=4000
+    )
 
+
+def stream_todo(client, text_summary, rag_review, image_payload):
+    """Yield to-do items one by one as their lines complete (image_payload=None: text only)."""
+    print(f"[Step 5] Streaming actionable to-do list...")
+    _log_payload("to-do", image_payload)
+    parser = TodoStreamParser()
+    for delta in stream_chat_completion(
+        client,
+        model="gpt-4o",
+        messages=todo_messages(text_summary, rag_review, image_payload),
+        temperature=0.3,
+        max_tokens=4000
+    ):
+        yield from parser.feed(delta)
+    yield from parser.close()
+
+
+def stream_review_and_todo(client, text_summary, reference_summary, image_payload,
+                           on_review=None, on_todo=None, t0=None, min_interval=0.1, mode="separate"):
+    """
+    Stream the review, then start the to-do call as soon as it completes.
+    on_review(text so far) / on_todo(items so far) are throttled to one call per
+    ``min_interval`` seconds (plus a final call). t0 is the perf_counter() time the
+    user's request started, for the time-to-first-output metric.
+    mode: see GENERATION_MODES; "combined" is a single non-streamed call, so the
+    review and the to-do list arrive together.
+    Returns (review, todo_list, metrics).
+    """
+    check_generation_mode(mode)
+    start = time.perf_counter()
+    t0 = t0 or start
+    metrics = {}
+    if mode == "combined":
+        with span("review_todo"):
+            review, todo = generate_review_and_todo(client, text_summary, reference_summary, image_payload)
+            annotate(items=len(todo))
+        metrics["review_s"] = metrics["review_ttft_s"] = time.perf_counter() - start
+        metrics["time_to_first_output_s"] = time.perf_counter() - t0
+        if on_review:
+            on_review(review)
+        if on_todo:
+            on_todo(list(todo))
+        print(f"[Metric] " + ", ".join(f"{k}={v:.2f}" for k, v in metrics.items()))
+        return review, todo, metrics
+
+    review, last = "", 0.0
+    with span("review", stream=True):
+        for delta in stream_review(client, text_summary, reference_summary, image_payload):
+            now = time.perf_counter()
+            if not review:
+                metrics["review_ttft_s"] = now - start
+                metrics["time_to_first_output_s"] = now - t0
+            review += delta
+            if on_review and now - last >= min_interval:
+                on_review(review)
+                last = now
+        review = review.strip()
+        if on_review:
+            on_review(review)
+        annotate(**{k: v for k, v in metrics.items()})
+    metrics["review_s"] = time.perf_counter() - start
+
+    todo_start = time.perf_counter()
+    todo = []
+    with span("todo", stream=True):
+        for item in stream_todo(client, text_summary, review, None if mode == "text_todo" else image_payload):
+            if not todo:
+                metrics["todo_first_item_s"] = time.perf_counter() - todo_start
+            todo.append(item)
+            if on_todo:
+                on_todo(list(todo))
+        annotate(items=len(todo), first_item_s=metrics.get("todo_first_item_s"))
+    metrics["todo_s"] = time.perf_counter() - todo_start
+    print(todo)
+    print(f"[Metric] " + ", ".join(f"{k}={v:.2f}" for k, v in metrics.items()))
+    return review, todo, metrics
+
+
+def log_completion():
     print(f"[Status] Completed RAG review generation.")
+    if cache_enabled():
+        print(f"[Cache] {get_cache().stats()}")
+
+
+def run_pipeline(client, target_title, target_abstract, text_summary, merged_image_path, k, cache=False,
+                 image_payload=None, progress=None, venue=None, shard_weights=None, retrieval_mode="reviews",
+                 reference_mode="llm", generation_mode="separate"):
+    """
+    Serial retrieval -> reference summary -> review -> to-do list.
+    cache: opt in to the completion cache for the reference summary, review and
+    to-do calls. Off by default since these are sampled (temperature=0.3).
+    image_payload: output of image_payload.prepare_image_payload; when omitted the
+    merged PNG at merged_image_path is sent as a single lossless image.
+    progress: optional callable receiving status messages.
+    venue / shard_weights: retrieval routing, see rag_router.route (default shard when omitted).
+    retrieval_mode: "reviews" (whole reviews) or "passages" (see retrieve_reviews).
+    reference_mode: "llm" (summarise the retrieved reviews) or "precomputed" (merge the
+    offline guidance of the top-k papers, see reference_guidance; retrieval_mode then only
+    applies to the LLM fallback for papers without guidance).
+    generation_mode: "separate", "combined" or "text_todo", see GENERATION_MODES.
+    """
+    check_generation_mode(generation_mode)
+    progress = progress or (lambda msg: None)
+
+    progress("[Step 2] Retrieving similar manuscripts...")
+    if reference_mode == "precomputed":
+        with span("retrieval", venue=venue, mode="hits"):
+            hits = retrieve_hits(target_title, target_abstract, k, venue, shard_weights)
+
+        progress("[Step 3] Merging precomputed reference guidance...")
+        with span("reference"):
+            reference_summary = precomputed_reference(client, target_title, hits, cache, retrieval_mode,
+                                                      target_abstract, venue, shard_weights)
+    else:
+        with span("retrieval", venue=venue, mode=retrieval_mode):
+            reviews = retrieve_reviews(target_title, target_abstract, k, venue, shard_weights, retrieval_mode)
+
+        progress("[Step 3] Generating reference summary...")
+        with span("reference"):
+            reference_summary = generate_reference_summary(client, target_title, reviews, cache,
+                                                           reference_limit(retrieval_mode))
+
+    if image_payload is None:
+        image_payload = payload_from_png(merged_image_path)
+    if generation_mode == "combined":
+        progress("[Step 4] Generating review and to-do list...")
+        with span("review_todo"):
+            rag_review, todo_list = generate_review_and_todo(client, text_summary, reference_summary,
+                                                             image_payload, cache)
+        log_completion()
+        return reference_summary, rag_review, todo_list
+
+    progress("[Step 4] Generating RAG-based multimodal review...")
+    with span("review"):
+        rag_review = generate_review(client, text_summary, reference_summary, image_payload, cache)
+
+    progress("[Step 5] Generating actionable to-do list...")
+    with span("todo"):
+        todo_list = generate_todo(client, text_summary, rag_review,
+                                  None if generation_mode == "text_todo" else image_payload, cache)
 
+    log_completion()
     return reference_summary, rag_review, todo_list
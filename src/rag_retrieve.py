@@ -1,35 +1,258 @@
 # rag_retrieve.py
-import os, json
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+import os, json, time, threading
+from .ann_index import apply_search_params, read_index_config
+from .lazy_imports import lazy_import
+from .meta_store import open_meta
+from .rag_index_update import read_version, resolve_index_dir
+
+# imported on first use, so the app renders before torch / faiss load (see warm_engine)
+np = lazy_import("numpy")
+faiss = lazy_import("faiss")
+sentence_transformers = lazy_import("sentence_transformers")
 
 INDEX_DIR = "data/rag_iclr2020_index"
+INDEX_FILES = ("encoder.json", "faiss.index", "meta.jsonl")
+RELOAD_CHECK_S = float(os.environ.get("REVIEW_INDEX_RELOAD_S", "30"))
 
-def load_meta():
+def load_meta(index_dir: str = INDEX_DIR):
     metas = []
-    with open(os.path.join(INDEX_DIR, "meta.jsonl"), "r", encoding="utf-8") as f:
+    with open(os.path.join(resolve_index_dir(index_dir), "meta.jsonl"), "r", encoding="utf-8") as f:
         for line in f:
             metas.append(json.loads(line))
     return metas
 
-def load_encoder():
-    with open(os.path.join(INDEX_DIR, "encoder.json"), "r") as f:
+def load_encoder(index_dir: str = INDEX_DIR):
+    with open(os.path.join(resolve_index_dir(index_dir), "encoder.json"), "r") as f:
         m = json.load(f)
-    return SentenceTransformer(m["model_name"])
+    return sentence_transformers.SentenceTransformer(m["model_name"])
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+def shared_encoder(model_name: str):
+    """One SentenceTransformer per model name, shared by all engines / shards."""
+    with _encoders_lock:
+        if model_name not in _encoders:
+            _encoders[model_name] = sentence_transformers.SentenceTransformer(model_name)
+        return _encoders[model_name]
+
+def clear_shared_encoders():
+    """Forget the shared encoders (engines already loaded keep theirs), e.g. to measure cold loads."""
+    with _encoders_lock:
+        _encoders.clear()
+
+
+class RetrievalEngine:
+    """
+    常驻进程的检索引擎：encoder / FAISS 索引 / meta 只加载一次
+    - 线程安全：多个 Streamlit 会话可并发查询
+    - warm(): 应用启动时预热
+    - reload() / reload_if_changed(): 索引目录在磁盘上更新后重新加载
+    - 支持 rag_index_update 写出的快照目录 (CURRENT -> vNNNNNN/)，
+      查询时每 reload_interval 秒检查一次版本，变化则热加载
+    """
+
+    def __init__(self, index_dir: str = INDEX_DIR, reload_interval: float = RELOAD_CHECK_S):
+        self.index_dir = index_dir
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._encoder = None
+        self._encoder_name = None
+        self._index = None
+        self._metas = None
+        self._retired_metas = None
+        self._rows = None
+        self._stamp = None
+        self._checked = 0.0
+        self.version = None
+
+    # ---------- loading ----------
+    def _disk_stamp(self):
+        live = resolve_index_dir(self.index_dir)
+        stamp = [live]
+        for name in INDEX_FILES:
+            st = os.stat(os.path.join(live, name))
+            stamp.append((name, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _load(self):
+        stamp = self._disk_stamp()
+        live = stamp[0]
+        with open(os.path.join(live, "encoder.json"), "r") as f:
+            model_name = json.load(f)["model_name"]
+        # encoder 最贵，模型没变就复用（多个分片共享同一个实例）
+        if self._encoder is None or model_name != self._encoder_name:
+            self._encoder = shared_encoder(model_name)
+            self._encoder_name = model_name
+        self._index = faiss.read_index(os.path.join(live, "faiss.index"))
+        apply_search_params(self._index, read_index_config(live))  # efSearch / nprobe 不随索引文件保存
+        old_metas, self._metas = self._metas, open_meta(live)  # 只建 offset 索引，命中的行按需读取
+        # 旧 meta 的文件句柄在下一次 reload 时关闭：正在进行的查询可能还拿着它
+        if self._retired_metas is not None:
+            self._retired_metas.close()
+        self._retired_metas = old_metas
+        self._rows = _RowMap.load(live)
+        self._stamp = stamp
+        self._checked = time.monotonic()
+        self.version = read_version(self.index_dir).get("version", 0)
+        print(f"[RetrievalEngine] loaded {self._index.ntotal} vectors / {len(self._metas)} meta rows "
+              f"from {live} (version {self.version})")
+
+    def _snapshot(self):
+        """Return (encoder, index, metas, rows), loading them on first use."""
+        with self._lock:
+            if self._index is None:
+                self._load()
+            elif self.reload_interval and time.monotonic() - self._checked > self.reload_interval:
+                self._checked = time.monotonic()
+                try:
+                    if self._disk_stamp() != self._stamp:
+                        self._load()
+                except OSError as e:
+                    print(f"[RetrievalEngine] reload check failed, keeping version {self.version}: {e}")
+            return self._encoder, self._index, self._metas, self._rows
+
+    @property
+    def model_name(self) -> str:
+        self._snapshot()
+        return self._encoder_name
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._index is not None
+
+    def warm(self):
+        """Load everything now so the first query does not pay the cold start."""
+        self._snapshot()
+        return self
+
+    def reload(self):
+        """Unconditionally reload the index and metadata from disk."""
+        with self._lock:
+            self._load()
+        return self
+
+    def reload_if_changed(self) -> bool:
+        """Reload if any index file changed on disk since the last load."""
+        with self._lock:
+            if self._index is not None and self._disk_stamp() == self._stamp:
+                return False
+            self._load()
+            return True
+
+    # ---------- querying ----------
+    def encode(self, papers, batch_size: int = 64):
+        """Encode (title, abstract) pairs in one batched call."""
+        encoder, _, _, _ = self._snapshot()
+        return _encode(encoder, papers, batch_size)
+
+    def search_matrix(self, papers, k: int = 2, batch_size: int = 64):
+        """One FAISS search over the stacked query matrix -> (D, I, metas)."""
+        encoder, index, metas, rows = self._snapshot()
+        D, I = index.search(_encode(encoder, papers, batch_size), k)  # 内积分数
+        return D, rows(I), metas
+
+    def search_vectors(self, q, k: int = 2):
+        """Search pre-encoded queries (e.g. shared across shards with the same encoder)."""
+        _, index, metas, rows = self._snapshot()
+        D, I = index.search(q, k)
+        return D, rows(I), metas
+
+    def search_batch(self, papers, k: int = 2, batch_size: int = 64):
+        D, I, metas = self.search_matrix(papers, k, batch_size)
+        return [
+            [{"score": float(score), **metas[idx]} for score, idx in zip(drow, irow) if idx >= 0]
+            for drow, irow in zip(D, I)
+        ]
+
+    def search(self, title: str, abstract: str, k: int = 2):
+        return self.search_batch([(title, abstract)], k)[0]
+
+
+class _RowMap:
+    """Maps FAISS ids to meta.jsonl rows (identity for indexes without ids.npy)."""
+
+    def __init__(self, ids=None):
+        self._order = None if ids is None else np.argsort(ids, kind="stable")
+        self._sorted = None if ids is None else ids[self._order]
+
+    @classmethod
+    def load(cls, index_dir: str):
+        path = os.path.join(index_dir, "ids.npy")
+        return cls(np.load(path)) if os.path.exists(path) else cls()
+
+    def __call__(self, I):
+        if self._order is None or not len(self._sorted):
+            return I
+        pos = np.clip(np.searchsorted(self._sorted, I), 0, len(self._sorted) - 1)
+        found = (I >= 0) & (self._sorted[pos] == I)
+        return np.where(found, self._order[pos], -1)
+
+
+def _encode(encoder, papers, batch_size):
+    texts = [_query_text(p) for p in papers]
+    q = encoder.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
+    return np.ascontiguousarray(q, dtype="float32")
+
+def _query_text(paper) -> str:
+    if isinstance(paper, dict):
+        title, abstract = paper.get("title"), paper.get("abstract")
+    else:
+        title, abstract = paper
+    return (title or "").strip() + "\n\n" + (abstract or "").strip()
+
+def dedup_mask(I, metas, dedup: bool = True):
+    """
+    Boolean keep-mask over the (n_queries, k) result matrix.
+    An entry is dropped if it is padding (-1), has no review, or (dedup) repeats
+    the normalized title of an earlier hit in the same row.
+    Only the hit rows are touched, never the whole corpus.
+    """
+    I = np.asarray(I)
+    valid = I >= 0
+    uniq, inv = np.unique(np.where(valid, I, -1), return_inverse=True)
+    inv = inv.reshape(I.shape)
+    hits = [metas[i] if i >= 0 else {} for i in uniq]
+    has_review = np.array([bool(m.get("review")) for m in hits], dtype=bool)
+    keep = valid & has_review[inv]
+    if dedup and I.shape[1] > 1:
+        _, title_codes = np.unique([(m.get("title") or "").strip().lower() for m in hits], return_inverse=True)
+        codes = np.where(valid, title_codes.reshape(-1)[inv], -1)
+        same = codes[:, :, None] == codes[:, None, :]
+        earlier = np.tril(np.ones((I.shape[1], I.shape[1]), dtype=bool), -1)
+        keep &= ~(same & earlier).any(axis=2)
+    return keep
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(index_dir: str = INDEX_DIR) -> RetrievalEngine:
+    """Process-wide engine per index directory."""
+    with _engines_lock:
+        engine = _engines.get(index_dir)
+        if engine is None:
+            engine = _engines[index_dir] = RetrievalEngine(index_dir)
+        return engine
+
+def warm_engine(index_dir: str = INDEX_DIR, background: bool = False):
+    """Pre-load the engine, optionally in a daemon thread (for app startup)."""
+    engine = get_engine(index_dir)
+    if background:
+        t = threading.Thread(target=engine.warm, name="retrieval-warmup", daemon=True)
+        t.start()
+        return t
+    return engine.warm()
 
 def retrieve_topk(title:str, abstract:str, k:int=2):
-    text = (title or "").strip() + "\n\n" + (abstract or "").strip()
-    enc = load_encoder()
-    q = enc.encode([text], convert_to_numpy=True, normalize_embeddings=True)
-    index = faiss.read_index(os.path.join(INDEX_DIR, "faiss.index"))
-    D, I = index.search(q, k)  # 内积分数
-    metas = load_meta()
-    results = []
-    for score, idx in zip(D[0], I[0]):
-        m = metas[idx]
-        results.append({"score": float(score), **m})
-    return results
+    return get_engine().search(title, abstract, k)
+
+def retrieve_topk_batch(papers, k: int = 2, batch_size: int = 64):
+    """
+    批量检索：papers 为 (title, abstract) 元组或含 title/abstract 的 dict
+    返回: list[list[dict]]，与逐条调用 retrieve_topk 的结果一致
+    """
+    return get_engine().search_batch(papers, k, batch_size)
 
 def get_topk_reviews(title: str, abstract: str, k: int = 2, dedup: bool = True):
     """
@@ -53,6 +276,15 @@ def get_topk_reviews(title: str, abstract: str, k: int = 2, dedup: bool = True):
             print(f"  - Retrieved review from: {item['title']} (score: {item['score']:.4f})")
     return reviews
 
+def get_topk_reviews_batch(papers, k: int = 2, dedup: bool = True, batch_size: int = 64):
+    """
+    get_topk_reviews 的批量版本：一次 encode + 一次 index.search
+    返回: list[list[str]]，第 i 个元素对应 papers[i]
+    """
+    _, I, metas = get_engine().search_matrix(papers, k, batch_size)
+    keep = dedup_mask(I, metas, dedup)
+    return [[metas[idx]["review"] for idx in row[mask]] for row, mask in zip(I, keep)]
+
 if __name__ == "__main__":
     # 示例测试
     query_title = "Convolutional Conditional Neural Processes | OpenReview"
@@ -61,4 +293,4 @@ if __name__ == "__main__":
     )
 
     top_reviews = get_topk_reviews(query_title, query_abstract, k=2)
-    print(json.dumps(top_reviews, ensure_ascii=False, indent=2))
\ No newline at end of file
+    print(json.dumps(top_reviews, ensure_ascii=False, indent=2))
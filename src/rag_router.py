@@ -0,0 +1,258 @@
+# rag_router.py
+"""
+按会议 / 年份分片的检索路由
+
+data/shards.json 描述可用的分片（每个分片是一个 rag_index_update / rag_generate 写出的索引目录）：
+
+    {"default": "iclr2020",
+     "shards": {"iclr2020": {"venue": "ICLR", "year": 2020, "index_dir": "data/rag_iclr2020_index"}}}
+
+- 只选一个会议时，只查询该会议的分片（更小的索引，更低的单次查询延迟）
+- 传入 weights 时，对多个分片并发检索，分数乘以权重后合并成一个 top-k
+- 选中的会议没有分片时回退到 default 分片
+
+    python -m src.rag_router                                   # 列出已登记的分片
+    python -m src.rag_router build --input corpus.jsonl        # 按 venue / year 列拆分语料，每组建一个分片并登记
+    python -m src.rag_router register iclr2020 --passage-dir data/rag_iclr2020_passages
+
+passage_dir / guidance_file 只在对应产物已经生成后才登记（register 会检查路径存在）。
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .rag_retrieve import dedup_mask, get_engine
+
+SHARDS_FILE = os.environ.get("REVIEW_SHARDS_FILE", "data/shards.json")
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def load_registry(path: str = SHARDS_FILE, refresh: bool = False) -> dict:
+    """Shard registry; only shards whose index directory exists are kept."""
+    global _registry
+    with _registry_lock:
+        if _registry is None or refresh or _registry["path"] != path:
+            with open(path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            shards = {name: dict(spec, name=name) for name, spec in raw.get("shards", {}).items()
+                      if os.path.isdir(spec["index_dir"])}
+            default = raw.get("default") if raw.get("default") in shards else next(iter(shards), None)
+            if default is None:
+                raise FileNotFoundError(f"{path}: no shard has an index directory on disk")
+            _registry = {"path": path, "default": default, "shards": shards}
+        return _registry
+
+
+def register_shard(name: str, path: str = SHARDS_FILE, default: bool = False, **spec) -> dict:
+    """
+    Add / update a shard in the registry file. spec: venue, year, index_dir, passage_dir,
+    guidance_file, weight, description; paths must already exist on disk.
+    """
+    for key in ("index_dir", "passage_dir", "guidance_file"):
+        if spec.get(key) and not os.path.exists(spec[key]):
+            raise FileNotFoundError(f"{key} {spec[key]!r} does not exist; build it before registering")
+    raw = {"shards": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+    shard = {**raw.setdefault("shards", {}).get(name, {}), **{k: v for k, v in spec.items() if v is not None}}
+    if "index_dir" not in shard:
+        raise ValueError(f"new shard {name!r} needs an index_dir")
+    raw["shards"][name] = shard
+    if default or not raw.get("default"):
+        raw["default"] = name
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(raw, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(tmp, path)
+    load_registry(path, refresh=True)
+    return shard
+
+
+def build_shards(records, out_dir: str = "data", path: str = SHARDS_FILE, batch_size: int = 64,
+                 model_name: str = None) -> dict:
+    """
+    Split a review corpus by its venue / year columns and upsert each group into its own
+    shard index (<out_dir>/rag_<venue><year>_index), registering every shard -> name: stats.
+    """
+    from .rag_index_update import upsert
+
+    groups = {}
+    for rec in records:
+        venue, year = str(rec.get("venue") or "").strip(), str(rec.get("year") or "").strip()
+        if not venue or not year:
+            raise ValueError(f"record {rec.get('id')!r} has no venue / year; both are needed to pick its shard")
+        groups.setdefault((venue_key(venue), int(float(year))), []).append(rec)
+
+    stats = {}
+    for (venue, year), group in sorted(groups.items()):
+        name = f"{re.sub(r'[^a-z0-9]+', '', venue.lower())}{year}"
+        index_dir = os.path.join(out_dir, f"rag_{name}_index")
+        stats[name] = upsert(index_dir, group, batch_size, model_name)
+        register_shard(name, path, venue=venue, year=year, index_dir=index_dir,
+                       description=f"{venue} {year} reviews ({stats[name]['total']} records)")
+        print(f"[router] {name}: {stats[name]}")
+    return stats
+
+
+def venue_key(venue: str) -> str:
+    """'International Conference on Learning Representations (ICLR)' -> 'ICLR'."""
+    m = re.search(r"\(([^)]+)\)\s*$", venue or "")
+    return (m.group(1) if m else venue or "").strip().upper()
+
+
+def route(venue: str = None, weights: dict = None, registry: dict = None) -> dict:
+    """
+    Shard name -> weight for a query.
+    weights: explicit {shard: weight} fan-out, overrides venue.
+    venue: every shard of that venue (all years, registry weights); unknown -> default shard.
+    """
+    registry = registry or load_registry()
+    shards = registry["shards"]
+    if weights:
+        unknown = set(weights) - set(shards)
+        if unknown:
+            raise KeyError(f"unknown shard(s) {sorted(unknown)}; available: {sorted(shards)}")
+        return {name: float(w) for name, w in weights.items() if w > 0}
+    if venue:
+        key = venue_key(venue)
+        picked = {name: float(spec.get("weight", 1.0)) for name, spec in shards.items()
+                  if spec.get("venue", "").upper() == key}
+        if picked:
+            return picked
+        print(f"[router] no shard for venue {key!r}, falling back to {registry['default']}")
+    return {registry["default"]: 1.0}
+
+
+def parse_weights(spec: str) -> dict:
+    """'iclr2020=1,neurips2021=0.5' -> {'iclr2020': 1.0, 'neurips2021': 0.5}."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, w = part.partition("=")
+        weights[name.strip()] = float(w) if w else 1.0
+    return weights
+
+
+def search_shards(papers, k: int = 2, venue: str = None, weights: dict = None, batch_size: int = 64,
+                  index_key: str = "index_dir"):
+    """
+    Weighted search over the routed shards -> per paper, hits sorted by weighted score
+    (up to k per shard, not yet deduplicated). Each hit carries score, shard and its meta.
+    index_key: registry field naming the index to search ("passage_dir" for review passages);
+    routed shards without it are skipped, and None is returned if none has it.
+    """
+    registry = load_registry()
+    routed = route(venue, weights, registry)
+    engines = {name: get_engine(registry["shards"][name][index_key]) for name in routed
+               if os.path.isdir(registry["shards"][name].get(index_key) or "")}
+    if not engines:
+        return None
+
+    # 同一 encoder 的分片只 encode 一次
+    by_model = {}
+    for name, engine in engines.items():
+        by_model.setdefault(engine.model_name, []).append(name)
+    queries = {model: engines[names[0]].encode(papers, batch_size) for model, names in by_model.items()}
+
+    def one(name):
+        engine = engines[name]
+        D, I, metas = engine.search_vectors(queries[engine.model_name], k)
+        keep = dedup_mask(I, metas, dedup=False)
+        return [[{"score": float(d) * routed[name], "shard": name, **metas[i]}
+                 for d, i in zip(drow[mask], irow[mask])] for drow, irow, mask in zip(D, I, keep)]
+
+    if len(engines) == 1:
+        per_shard = [one(name) for name in engines]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(engines), 8), thread_name_prefix="shard") as pool:
+            per_shard = list(pool.map(one, engines))
+
+    merged = [sum((hits[q] for hits in per_shard), []) for q in range(len(papers))]
+    return [sorted(hits, key=lambda h: -h["score"]) for hits in merged]
+
+
+def _top_reviews(hits, k: int, dedup: bool):
+    reviews, seen_titles = [], set()
+    for item in hits:
+        t = (item.get("title") or "").strip().lower()
+        if dedup and t in seen_titles:
+            continue
+        seen_titles.add(t)
+        reviews.append(item)
+        if len(reviews) == k:
+            break
+    return reviews
+
+
+def get_topk_hits(title: str, abstract: str, k: int = 2, venue: str = None, weights: dict = None,
+                  dedup: bool = True):
+    """Top-k hit records (score, shard, id, title, abstract, review) over the routed shard(s)."""
+    hits = _top_reviews(search_shards([(title, abstract)], k, venue, weights)[0], k, dedup)
+    for item in hits:
+        print(f"  - Retrieved review from: {item['title']} [{item['shard']}] (score: {item['score']:.4f})")
+    return hits
+
+
+def get_topk_reviews(title: str, abstract: str, k: int = 2, venue: str = None, weights: dict = None,
+                     dedup: bool = True):
+    """rag_retrieve.get_topk_reviews over the shard(s) routed for venue / weights."""
+    return [item["review"] for item in get_topk_hits(title, abstract, k, venue, weights, dedup)]
+
+
+def get_topk_reviews_batch(papers, k: int = 2, venue: str = None, weights: dict = None, dedup: bool = True,
+                           batch_size: int = 64):
+    return [[item["review"] for item in _top_reviews(hits, k, dedup)]
+            for hits in search_shards(papers, k, venue, weights, batch_size)]
+
+
+def describe_route(venue: str = None, weights: dict = None) -> str:
+    """Human-readable shard selection, e.g. 'iclr2020' or 'iclr2020×1, neurips2021×0.5'."""
+    routed = route(venue, weights)
+    if len(routed) == 1:
+        return next(iter(routed))
+    return ", ".join(f"{name}×{w:g}" for name, w in routed.items())
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="List, build and register venue / year retrieval shards.")
+    ap.add_argument("--shards-file", default=SHARDS_FILE)
+    sub = ap.add_subparsers(dest="cmd")
+    bu = sub.add_parser("build", help="split a corpus by its venue / year columns into shard indexes")
+    bu.add_argument("--input", required=True, help="jsonl / json / csv / xlsx with id, title, abstract, review, venue, year")
+    bu.add_argument("--out-dir", default="data")
+    bu.add_argument("--batch-size", type=int, default=64)
+    bu.add_argument("--model", default=None)
+    rg = sub.add_parser("register", help="add a shard or attach built artifacts to one")
+    rg.add_argument("name")
+    for opt in ("--venue", "--index-dir", "--passage-dir", "--guidance-file", "--description"):
+        rg.add_argument(opt, default=None)
+    rg.add_argument("--year", type=int, default=None)
+    rg.add_argument("--weight", type=float, default=None)
+    rg.add_argument("--default", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "build":
+        from .rag_index_update import read_records
+        build_shards(read_records(args.input), args.out_dir, args.shards_file, args.batch_size, args.model)
+    elif args.cmd == "register":
+        print(register_shard(args.name, args.shards_file, args.default, venue=args.venue, year=args.year,
+                             index_dir=args.index_dir, passage_dir=args.passage_dir,
+                             guidance_file=args.guidance_file, weight=args.weight, description=args.description))
+    reg = load_registry(args.shards_file, refresh=True)
+    for name, spec in reg["shards"].items():
+        mark = "*" if name == reg["default"] else " "
+        extras = ", ".join(k for k in ("passage_dir", "guidance_file") if spec.get(k))
+        print(f"{mark} {name:<16} {spec.get('venue', ''):<8} {spec.get('year', '')}  {spec['index_dir']}"
+              + (f"  (+ {extras})" if extras else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
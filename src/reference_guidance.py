@@ -0,0 +1,227 @@
+# reference_guidance.py
+"""
+预先计算的 reference guidance：把 summarise_reference 从交互式流程中移走
+
+离线任务为索引中的每篇论文（按标题聚合其全部 review）生成一条 weaknesses / improvements 记录，
+可选地再按 embedding 聚类为每个簇生成一条；运行时对 top-k 命中在本地合并，不再调用 LLM。
+
+    python -m src.reference_guidance --index-dir data/rag_iclr2020_index \\
+        --out data/rag_iclr2020_guidance.jsonl --clusters 32 --workers 4
+
+输出为 jsonl（可断点续跑：已有的 key 会跳过），生成后用 python -m src.rag_router register <分片> --guidance-file <out> 登记。
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .rag_llm_summarise import summarise_reference
+from .rag_router import load_registry
+
+MAX_MERGED_ITEMS = 8
+MAX_CLUSTER_REVIEWS = 6
+
+
+def paper_key(title: str) -> str:
+    return "paper:" + " ".join((title or "").lower().split())
+
+
+def _norm_item(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]", "", " ".join(str(text).lower().split()))
+
+
+class GuidanceStore:
+    """Read-only view of a guidance jsonl file: key -> record (papers point at their cluster)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        rec = json.loads(line)
+                        self.records[rec["key"]] = rec
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, title: str):
+        """Guidance for a corpus paper: its own record, else its cluster's, else None."""
+        rec = self.records.get(paper_key(title))
+        if rec is None:
+            return None
+        if rec.get("weaknesses") or rec.get("improvements"):
+            return rec
+        return self.records.get(f"cluster:{rec.get('cluster')}")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_guidance_store(path: str) -> GuidanceStore:
+    """Process-wide store per file, reloaded when the file changes."""
+    mtime = os.path.getmtime(path) if os.path.exists(path) else None
+    with _stores_lock:
+        cached = _stores.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = _stores[path] = (mtime, GuidanceStore(path))
+        return cached[1]
+
+
+def merge_guidance(records, max_items: int = MAX_MERGED_ITEMS) -> dict:
+    """
+    Merge guidance records (best hit first) into one {"weaknesses", "improvements"} reference:
+    round-robin across records so every hit contributes, duplicates dropped.
+    """
+    merged = {}
+    for field in ("weaknesses", "improvements"):
+        lists = [list(r.get(field) or []) for r in records]
+        out, seen = [], set()
+        for i in range(max((len(l) for l in lists), default=0)):
+            for items in lists:
+                if i < len(items) and _norm_item(items[i]) not in seen:
+                    seen.add(_norm_item(items[i]))
+                    out.append(items[i])
+        merged[field] = out[:max_items]
+    return merged
+
+
+def guidance_for_hits(hits) -> list[dict]:
+    """Precomputed guidance records for retrieval hits (from their shard's guidance_file), best hit first."""
+    shards = load_registry()["shards"]
+    records, seen = [], set()
+    for h in hits:
+        path = shards.get(h.get("shard"), {}).get("guidance_file")
+        if not path:
+            continue
+        rec = get_guidance_store(path).lookup(h["title"])
+        if rec is not None and rec["key"] not in seen:
+            seen.add(rec["key"])
+            records.append(rec)
+    return records
+
+
+# ====================================================
+# Offline job
+# ====================================================
+def _paper_groups(metas):
+    """Corpus papers: reviews grouped by normalized title, in index order."""
+    groups = {}
+    for row, m in enumerate(metas):
+        g = groups.setdefault(paper_key(m.get("title")), {"title": m.get("title"), "rows": [], "reviews": []})
+        g["rows"].append(row)
+        if m.get("review"):
+            g["reviews"].append(m["review"])
+    return groups
+
+
+def _cluster(snap, groups, n_clusters: int):
+    """k-means over paper embeddings -> ({paper key: cluster}, {cluster: [paper keys by distance]})."""
+    import numpy as np
+    import faiss
+
+    keys = list(groups)
+    n_clusters = min(n_clusters, len(keys))
+    X = np.ascontiguousarray(np.stack([snap["vectors"][groups[k]["rows"]].mean(axis=0) for k in keys]), dtype="float32")
+    faiss.normalize_L2(X)
+    km = faiss.Kmeans(X.shape[1], n_clusters, niter=20, spherical=True, seed=0)
+    km.train(X)
+    D, I = km.index.search(X, 1)
+    assignment = {k: int(c) for k, c in zip(keys, I[:, 0])}
+    members = {}
+    for k, c, d in sorted(zip(keys, I[:, 0], D[:, 0]), key=lambda t: -t[2]):
+        members.setdefault(int(c), []).append(k)
+    return assignment, members
+
+
+def build_guidance(index_dir: str, out_path: str, client, clusters: int = 0, workers: int = 4,
+                   per_paper: bool = True, limit: int = None) -> dict:
+    """Precompute guidance records for index_dir's papers (and clusters); resumes from out_path."""
+    from .rag_index_update import load_snapshot
+
+    snap = load_snapshot(index_dir)
+    groups = _paper_groups(snap["metas"])
+    store = GuidanceStore(out_path)
+    assignment, members = _cluster(snap, groups, clusters) if clusters else ({}, {})
+
+    jobs = []
+    for c, keys in members.items():
+        if f"cluster:{c}" not in store.records:
+            reviews = [r for k in keys for r in groups[k]["reviews"][:1]][:MAX_CLUSTER_REVIEWS]
+            titles = "; ".join(groups[k]["title"] for k in keys[:3])
+            jobs.append((f"cluster:{c}", f"Papers similar to: {titles}", reviews, {"papers": len(keys)}))
+    for key, g in groups.items():
+        if key in store.records or not g["reviews"]:
+            continue
+        if per_paper:
+            jobs.append((key, g["title"], g["reviews"], {"title": g["title"], "cluster": assignment.get(key)}))
+        elif key in assignment:
+            jobs.append((key, None, None, {"title": g["title"], "cluster": assignment[key]}))
+    if limit is not None:
+        jobs = jobs[:limit]
+    print(f"[guidance] {len(groups)} papers, {len(members)} clusters, {len(store)} done, {len(jobs)} to go")
+
+    lock = threading.Lock()
+    stats = {"written": 0, "failed": 0}
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    def run(job):
+        key, title, reviews, extra = job
+        rec = {"key": key, **extra}
+        if reviews is not None:
+            out = json.loads(summarise_reference(client, title, reviews, cache=True, max_reviews=None))
+            if "weaknesses" not in out and "improvements" not in out:
+                raise ValueError(out.get("error") or "unparseable model output")
+            rec.update(weaknesses=out.get("weaknesses") or [], improvements=out.get("improvements") or [],
+                       reviews=len(reviews), created=datetime.now().isoformat(timespec="seconds"))
+        return rec
+
+    with open(out_path, "a", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, job): job[0] for job in jobs}
+        for fut in as_completed(futures):
+            try:
+                rec = fut.result()
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"[guidance] {futures[fut]} failed: {e}")
+                continue
+            with lock:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                f.flush()
+                stats["written"] += 1
+    return stats
+
+
+def main(argv=None):
+    from .llm_client import make_client
+
+    ap = argparse.ArgumentParser(description="Precompute reference guidance for an index's corpus papers.")
+    ap.add_argument("--index-dir", default="data/rag_iclr2020_index")
+    ap.add_argument("--out", default="data/rag_iclr2020_guidance.jsonl")
+    ap.add_argument("--clusters", type=int, default=0, help="also write guidance per k-means cluster of papers")
+    ap.add_argument("--clusters-only", action="store_true",
+                    help="only cluster records (papers point at their cluster); ~N/clusters times fewer calls")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--limit", type=int, default=None, help="at most this many calls in this run")
+    ap.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY"))
+    ap.add_argument("--base-url", default=os.environ.get("OPENAI_BASE_URL", ""))
+    args = ap.parse_args(argv)
+    if not args.api_key:
+        ap.error("an API key is required (--api-key or OPENAI_API_KEY)")
+    if args.clusters_only and not args.clusters:
+        ap.error("--clusters-only needs --clusters N")
+
+    client = make_client(args.api_key, args.base_url)
+    print(build_guidance(args.index_dir, args.out, client, args.clusters, args.workers,
+                         per_paper=not args.clusters_only, limit=args.limit))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+# review_dag.py
+from .doc_store import (
+    document_image,
+    document_payload,
+    document_summary,
+    document_text,
+    get_store,
+    pdf_source,
+)
+from .image_payload import payload_from_png
+from .rag_pipeline_run import (
+    check_generation_mode,
+    generate_reference_summary,
+    generate_review,
+    generate_review_and_todo,
+    generate_todo,
+    log_completion,
+    precomputed_reference,
+    reference_limit,
+    retrieve_hits,
+    retrieve_reviews,
+)
+from .stage_scheduler import Stage, run_stages
+
+
+def build_review_stages(client, pdf, digest, k=2, model="gpt-4o", store=None, image_options=None,
+                        cache=False, dpi=150, summary_progress=None, venue=None, shard_weights=None,
+                        retrieval_mode="reviews", reference_mode="llm", generation_mode="separate"):
+    """
+    The review pipeline as a DAG:
+
+        text ──┬── summary ─────────────┐
+               └── retrieval ── reference ──┬── review ── todo
+        images ─────────────────────────────┘
+
+    Retrieval / reference summary and page rendering overlap with the
+    hierarchical summary; the critical path is text -> summary -> review -> todo.
+    pdf: file path or PDF bytes (rendered / extracted in memory).
+    venue / shard_weights select the retrieval shard(s), see rag_router.route;
+    retrieval_mode="passages" retrieves budgeted review passages instead of whole reviews;
+    reference_mode="precomputed" merges offline guidance for the hits instead of an LLM call.
+    generation_mode="combined" replaces review + todo with one review_todo call (review and
+    todo become views of it); "text_todo" sends the to-do call without the page images.
+    """
+    store = store or get_store()
+
+    def images():
+        if image_options is None:
+            return payload_from_png(document_image(store, digest, pdf, dpi))
+        return document_payload(store, digest, pdf, image_options)
+
+    return [
+        Stage("text", lambda: document_text(store, digest, pdf), label="Extracting text"),
+        Stage("images", images, label="Rendering pages"),
+        Stage("summary", lambda text: document_summary(store, digest, text["full_text"], client, model,
+                                                       progress=summary_progress),
+              deps=("text",), label="Summarizing manuscript"),
+        *_reference_stages(client, k, cache, venue, shard_weights, retrieval_mode, reference_mode),
+        *_generation_stages(client, cache, generation_mode),
+    ]
+
+
+def _generation_stages(client, cache, generation_mode):
+    check_generation_mode(generation_mode)
+    if generation_mode == "combined":
+        return [
+            Stage("review_todo", lambda summary, reference, images: generate_review_and_todo(client, summary, reference,
+                                                                                             images, cache),
+                  deps=("summary", "reference", "images"), label="Generating review and to-do list"),
+            Stage("review", lambda review_todo: review_todo[0], deps=("review_todo",)),
+            Stage("todo", lambda review_todo: review_todo[1], deps=("review_todo",)),
+        ]
+    text_only = generation_mode == "text_todo"
+    return [
+        Stage("review", lambda summary, reference, images: generate_review(client, summary, reference, images, cache),
+              deps=("summary", "reference", "images"), label="Generating multimodal review"),
+        Stage("todo", lambda summary, review, images: generate_todo(client, summary, review,
+                                                                    None if text_only else images, cache),
+              deps=("summary", "review", "images"), label="Generating to-do list"),
+    ]
+
+
+def _reference_stages(client, k, cache, venue, shard_weights, retrieval_mode, reference_mode):
+    if reference_mode == "precomputed":
+        return [
+            Stage("retrieval", lambda text: retrieve_hits(text["title"], text["abstract"], k, venue, shard_weights),
+                  deps=("text",), label="Retrieving similar manuscripts"),
+            Stage("reference", lambda text, retrieval: precomputed_reference(client, text["title"], retrieval, cache,
+                                                                             retrieval_mode, text["abstract"], venue,
+                                                                             shard_weights),
+                  deps=("text", "retrieval"), label="Merging reference guidance"),
+        ]
+    return [
+        Stage("retrieval", lambda text: retrieve_reviews(text["title"], text["abstract"], k, venue, shard_weights,
+                                                         retrieval_mode),
+              deps=("text",), label="Retrieving similar manuscripts"),
+        Stage("reference", lambda text, retrieval: generate_reference_summary(client, text["title"], retrieval, cache,
+                                                                              reference_limit(retrieval_mode)),
+              deps=("text", "retrieval"), label="Generating reference summary"),
+    ]
+
+
+def run_review_dag(client, pdf_path=None, pdf_bytes=None, k=2, model="gpt-4o", store=None, image_options=None,
+                   cache=False, progress=None, max_workers=4, generate=True, venue=None, shard_weights=None,
+                   retrieval_mode="reviews", reference_mode="llm", generation_mode="separate"):
+    """
+    Concurrent counterpart of prepare_document + run_pipeline.
+    pdf_bytes alone is processed in memory, without a temporary PDF on disk.
+    progress: optional callable receiving a status line whenever the set of running stages changes.
+    generate=False stops before the review / to-do stages (e.g. to stream them afterwards
+    with rag_pipeline_run.stream_review_and_todo); rev and todo are then None.
+    Returns dict(title, abstract, summary, ref, rev, todo, image_payload, digest, timings).
+    """
+    pdf, digest = pdf_source(pdf_path, pdf_bytes)
+
+    def on_progress(event, stage, running):
+        if progress and running:
+            progress("Running: " + ", ".join(running) + "...")
+
+    stages = build_review_stages(client, pdf, digest, k, model, store, image_options, cache,
+                                 venue=venue, shard_weights=shard_weights, retrieval_mode=retrieval_mode,
+                                 reference_mode=reference_mode, generation_mode=generation_mode)
+    if not generate:
+        stages = [s for s in stages if s.name not in ("review_todo", "review", "todo")]
+    results, timings = run_stages(stages, max_workers=max_workers, on_progress=on_progress)
+    if generate:
+        log_completion()
+
+    return {
+        "digest": digest,
+        "title": results["text"]["title"],
+        "abstract": results["text"]["abstract"],
+        "summary": results["summary"],
+        "image_payload": results["images"],
+        "ref": results["reference"],
+        "rev": results.get("review"),
+        "todo": results.get("todo"),
+        "timings": timings,
+    }
@@ -69,4 +69,20 @@ Add citation: Ensure academic rigor for metric selections [Section 2.2]
 
 ### Instructions:
 Analyze the provided review carefully and extract as many actionable items as possible that directly address the specific weaknesses and suggestions mentioned. Your final output should contain only the formatted actionable to-do list as specified above, presented in a BULLET POINT list.
-"""
\ No newline at end of file
+"""
+
+COMBINED_PROMPT = REVIEWER_PROMPT + """
+### Actionable To-Do List for Authors
+
+In the same response, also compile an actionable to-do list that translates your review into concrete revision tasks.
+Each item specifies *what* to revise, *why* it matters, and *where* in the paper, in the Action:Objective[#location] format, for example:
+
+Revise introduction: Describe the research gap [Section 1]
+
+Update Figure 3 caption: Improve interpretability with detailed descriptions [Page 5. Figure 3]
+
+Extract as many actionable items as possible, covering every weakness and suggestion in your review.
+
+### Output format:
+Respond with one JSON object following the provided schema: one field per review section (markdown text, without the section heading) and "todo", the list of to-do items (one string per item, without bullet characters).
+"""
@@ -0,0 +1,105 @@
+# scratch.py
+"""
+Managed scratch directory for the few places that still need a real file.
+
+The review pipeline works on PDF bytes and in-memory images; spool here only
+when a consumer insists on a path (e.g. the legacy ``extract_and_merge_images``):
+
+    with get_scratch().spool(png_bytes, suffix=".png") as path:
+        ...                      # removed on exit, even on error
+
+Files written with ``write`` outlive the call but are swept once older than
+``max_age_s`` or when the area grows past ``max_bytes`` (oldest first), so a
+crashed or forgetful caller cannot fill the disk.
+"""
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+from .llm_cache import CACHE_DIR
+
+DEFAULT_MAX_BYTES = int(os.environ.get("REVIEW_SCRATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+DEFAULT_MAX_AGE_S = float(os.environ.get("REVIEW_SCRATCH_MAX_AGE_S", "3600"))
+
+
+class ScratchFull(RuntimeError):
+    """A single spooled file would not fit in the scratch area."""
+
+
+class ScratchArea:
+    def __init__(self, root: str = None, max_bytes: int = DEFAULT_MAX_BYTES, max_age_s: float = DEFAULT_MAX_AGE_S):
+        self.root = root or os.path.join(CACHE_DIR, "scratch")
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        self.sweep()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def sweep(self, reserve: int = 0) -> int:
+        """Drop expired files, then the oldest ones until ``reserve`` more bytes fit; returns files removed."""
+        removed = 0
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            cutoff = time.time() - self.max_age_s
+            for mtime, size, path in entries:
+                if mtime >= cutoff and total + reserve <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                    total -= size
+                except OSError:
+                    pass
+        return removed
+
+    def write(self, data: bytes, suffix: str = "") -> str:
+        """Write ``data`` to a new scratch file and return its path (swept later, see class doc)."""
+        if len(data) > self.max_bytes:
+            raise ScratchFull(f"{len(data)} bytes exceeds the {self.max_bytes}-byte scratch area")
+        self.sweep(reserve=len(data))
+        path = os.path.join(self.root, f"{uuid.uuid4().hex}{suffix}")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    @contextmanager
+    def spool(self, data: bytes, suffix: str = ""):
+        """Path to a scratch copy of ``data`` for the duration of the block."""
+        path = self.write(data, suffix)
+        try:
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_default_scratch = None
+_default_scratch_lock = threading.Lock()
+
+def get_scratch() -> ScratchArea:
+    global _default_scratch
+    with _default_scratch_lock:
+        if _default_scratch is None:
+            _default_scratch = ScratchArea()
+        return _default_scratch
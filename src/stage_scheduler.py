@@ -0,0 +1,88 @@
+# stage_scheduler.py
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .tracing import span, submit
+
+
+class Stage:
+    """
+    One node of the pipeline DAG.
+    fn is called with the results of ``deps`` as keyword arguments (dep name -> result).
+    """
+
+    def __init__(self, name: str, fn, deps=(), label: str = None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.label = label or name
+
+
+def _run_stage(stage, kwargs):
+    t0, c0 = time.perf_counter(), time.thread_time()
+    with span(stage.name, stage=True) as rec:
+        result = stage.fn(**kwargs)
+        rec["attrs"]["cpu_s"] = time.thread_time() - c0
+    return result, {"start": t0, "wall_s": time.perf_counter() - t0, "cpu_s": time.thread_time() - c0}
+
+
+def _check(stages):
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("Duplicate stage names")
+    for s in stages:
+        missing = set(s.deps) - names
+        if missing:
+            raise ValueError(f"Stage {s.name!r} depends on unknown stage(s) {sorted(missing)}")
+
+
+def run_stages(stages, max_workers: int = 4, on_progress=None):
+    """
+    Execute stages concurrently as soon as their dependencies are done.
+
+    on_progress(event, stage, running) is called on the *calling* thread (so it can
+    update Streamlit elements) with event in {"start", "done"} and the labels of the
+    stages currently running.
+    Each stage is recorded as a tracing span (see src/tracing.py).
+    Returns (results, timings): dicts keyed by stage name. The first failing stage's
+    exception is re-raised right away: stages that have not started are cancelled and
+    stages still running are left to finish in the background.
+    """
+    _check(stages)
+    pending = {s.name: s for s in stages}
+    results, timings, running = {}, {}, {}
+    t_start = time.perf_counter()
+
+    def _notify(event, stage):
+        if on_progress:
+            on_progress(event, stage, [s.label for s in running.values()])
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage")
+    try:
+        while pending or running:
+            for name in [n for n, s in pending.items() if all(d in results for d in s.deps)]:
+                stage = pending.pop(name)
+                fut = submit(pool, _run_stage, stage, {d: results[d] for d in stage.deps})
+                running[fut] = stage
+                _notify("start", stage)
+            if not running:
+                raise ValueError(f"Dependency cycle among stages {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage = running.pop(fut)
+                results[stage.name], timing = fut.result()
+                timing["start"] -= t_start
+                timings[stage.name] = timing
+                print(f"  [stage] {stage.name} done in {timing['wall_s']:.2f}s")
+                _notify("done", stage)
+    except BaseException:
+        # don't wait for stages still running (e.g. long LLM calls): the error goes to the caller now
+        for fut in running:
+            fut.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    timings["total"] = {"start": 0.0, "wall_s": time.perf_counter() - t_start}
+    return results, timings
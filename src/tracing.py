@@ -0,0 +1,271 @@
+# tracing.py
+"""
+Lightweight per-run tracing and process-wide metrics.
+
+    with Trace("review", pdf=name) as trace:
+        with span("summary"):
+            ...
+    metadata["trace"] = trace.to_dict()
+
+Spans nest through contextvars; work submitted to thread pools must run in a
+copied context (see ``submit``) to stay attached to the trace. Without an active
+Trace, spans only feed the process-wide metrics, which cost a few dict updates.
+Metrics export as Prometheus text (``METRICS.to_prometheus()`` /
+``start_metrics_server``) and traces as OTLP/JSON (``Trace.to_otlp`` / ``export_otlp``).
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_current_trace = contextvars.ContextVar("review_trace", default=None)
+_current_span = contextvars.ContextVar("review_span", default=None)
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# span attributes summed into Trace totals and Prometheus counters
+COUNTED_ATTRS = ("prompt_tokens", "completion_tokens", "image_bytes", "retries")
+
+
+# ====================================================
+# Metrics
+# ====================================================
+class Metrics:
+    """Process-wide counters and span-duration histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = {"buckets": [0] * len(DURATION_BUCKETS), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    h["buckets"][i] += 1
+            h["sum"] += value
+            h["count"] += 1
+
+    def to_prometheus(self) -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+        lines = []
+        with self._lock:
+            for name in sorted({n for n, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (n, labels), value in sorted(self.counters.items()):
+                    if n == name:
+                        lines.append(f"{name}{fmt(labels)} {value}")
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), h in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(DURATION_BUCKETS, h["buckets"]):
+                        lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {h['count']}")
+                    lines.append(f"{name}_sum{fmt(labels)} {h['sum']}")
+                    lines.append(f"{name}_count{fmt(labels)} {h['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0"):
+    """Serve METRICS.to_prometheus() on http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = METRICS.to_prometheus().encode("utf-8")
+            self.send_response(200 if self.path.startswith("/metrics") else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[metrics] Prometheus endpoint on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+# ====================================================
+# Traces
+# ====================================================
+class Trace:
+    """Collects the spans of one review run."""
+
+    def __init__(self, name: str = "review", **attrs):
+        self.trace_id = os.urandom(16).hex()
+        self.name = name
+        self.attrs = attrs
+        self.spans = []
+        self.start = time.time()
+        self.duration_s = None
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.duration_s = time.perf_counter() - self._t0
+        _current_trace.reset(self._token)
+        return False
+
+    def add(self, record: dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def totals(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        totals = {k: 0 for k in COUNTED_ATTRS}
+        totals.update(llm_calls=0, cache_hits=0)
+        for s in spans:
+            if s["name"].startswith("llm"):
+                totals["llm_calls"] += 1
+                totals["cache_hits"] += s["attrs"].get("cache") == "hit"
+            for k in COUNTED_ATTRS:
+                totals[k] += s["attrs"].get(k) or 0
+        return totals
+
+    def to_dict(self) -> dict:
+        duration = self.duration_s if self.duration_s is not None else time.perf_counter() - self._t0
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start"])
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attrs": self.attrs,
+            "start": self.start,
+            "duration_s": duration,
+            "totals": self.totals(),
+            "spans": spans,
+        }
+
+    def to_otlp(self, service_name: str = "peer-review-simulation") -> dict:
+        """OTLP/JSON ExportTraceServiceRequest body."""
+        def attr(k, v):
+            if isinstance(v, bool):
+                return {"key": k, "value": {"boolValue": v}}
+            if isinstance(v, int):
+                return {"key": k, "value": {"intValue": str(v)}}
+            if isinstance(v, float):
+                return {"key": k, "value": {"doubleValue": v}}
+            return {"key": k, "value": {"stringValue": str(v)}}
+
+        with self._lock:
+            spans = list(self.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attr("service.name", service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "src.tracing"},
+                "spans": [{
+                    "traceId": self.trace_id,
+                    "spanId": s["span_id"],
+                    **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                    "name": s["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(int(s["start"] * 1e9)),
+                    "endTimeUnixNano": str(int((s["start"] + s["duration_s"]) * 1e9)),
+                    "attributes": [attr(k, v) for k, v in s["attrs"].items() if v is not None],
+                    "status": {"code": 2 if s.get("status") == "error" else 1},
+                } for s in spans],
+            }],
+        }]}
+
+
+def export_otlp(trace: Trace, endpoint: str = None, timeout: float = 5.0) -> bool:
+    """POST the trace to an OTLP/HTTP JSON collector (default: $OTEL_EXPORTER_OTLP_ENDPOINT)."""
+    endpoint = endpoint or os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if not endpoint:
+        return False
+    url = endpoint.rstrip("/") + ("" if endpoint.rstrip("/").endswith("/v1/traces") else "/v1/traces")
+    req = urllib.request.Request(url, data=json.dumps(trace.to_otlp()).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(req, timeout=timeout).close()
+        return True
+    except Exception as e:
+        print(f"[tracing] OTLP export to {url} failed: {e}")
+        return False
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def _finish(record: dict):
+    METRICS.observe("review_span_duration_seconds", record["duration_s"], span=record["name"])
+    for k in COUNTED_ATTRS:
+        if record["attrs"].get(k):
+            METRICS.inc(f"review_{k}_total", record["attrs"][k], span=record["name"])
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(record)
+
+
+def _new_record(name: str, attrs: dict) -> dict:
+    parent = _current_span.get()
+    return {"name": name, "span_id": os.urandom(8).hex(), "parent_id": parent["span_id"] if parent else None,
+            "start": time.time(), "duration_s": 0.0, "attrs": dict(attrs)}
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block as a child of the current span; yields the mutable span record."""
+    record = _new_record(name, attrs)
+    token = _current_span.set(record)
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["attrs"]["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_s"] = time.perf_counter() - t0
+        _current_span.reset(token)
+        _finish(record)
+
+
+def add_span(name: str, duration_s: float, **attrs):
+    """Record an already-measured span (e.g. a streamed call) under the current span."""
+    record = _new_record(name, attrs)
+    record["start"] -= duration_s
+    record["duration_s"] = duration_s
+    _finish(record)
+
+
+def annotate(**attrs):
+    """Set attributes on the current span (no-op outside a span)."""
+    record = _current_span.get()
+    if record is not None:
+        record["attrs"].update(attrs)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit that keeps the caller's trace / span context in the worker thread."""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
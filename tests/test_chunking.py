@@ -0,0 +1,25 @@
+from src.chunking import chunk_text, count_tokens
+
+
+def _paper():
+    body = "\n\n".join(" ".join(f"word{i}_{j}" for j in range(120)) for i in range(30))
+    sentences = " ".join(f"Sentence {i} describes the experimental setup in some detail." for i in range(300))
+    return (f"1 Introduction\n\n{body}\n\n2 Method\n\n{sentences}\n\n3 Results\n\n{'x' * 30000}\n\n"
+            f"4 Conclusion\n\nA short closing paragraph.\n\nReferences\n\n[1] Someone. A paper. 2020.")
+
+
+def test_chunks_fit_max_tokens():
+    text = _paper()
+    for max_tokens in (200, 1000, 3000):
+        for min_tokens in (10, 100, max_tokens // 2):
+            chunks = chunk_text(text, max_tokens=max_tokens, min_tokens=min_tokens)
+            assert chunks
+            assert all(count_tokens(c) <= max_tokens for c in chunks), (max_tokens, min_tokens)
+
+
+def test_chunks_keep_the_text_and_drop_references():
+    chunks = chunk_text(_paper(), max_tokens=1000, min_tokens=100)
+    joined = "\n\n".join(chunks)
+    assert "word29_119" in joined and "Sentence 299" in joined and "closing paragraph" in joined
+    assert joined.count("x") >= 30000
+    assert "[1] Someone" not in joined
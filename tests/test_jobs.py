@@ -0,0 +1,33 @@
+import time
+
+from src.jobs import JobQueue, JobStore
+
+
+def _wait(queue, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    return queue.get(job_id)
+
+
+def test_new_queue_takes_over_jobs_of_an_earlier_queue_in_the_same_process(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    old = JobQueue(lambda params, context, report: None, store=store, max_concurrent=0)
+    queued_id, _ = old.submit("a", {}, context={"pdf_bytes": b"a"})
+    running_id, _ = old.submit("b", {}, context={"pdf_bytes": b"b"})
+    store.update(running_id, status="running")  # as if an old worker had claimed it
+
+    new = JobQueue(lambda params, context, report: context["pdf_bytes"].decode(), store=store, max_concurrent=1)
+    assert new.owner != old.owner
+
+    job = _wait(new, queued_id)
+    assert job["status"] == "done" and job["result"] == "a"
+    assert new.get(running_id)["status"] == "failed"
+
+    # single-flight no longer points at the failed job
+    job_id, coalesced = new.submit("b", {}, context={"pdf_bytes": b"b"})
+    assert not coalesced and job_id != running_id
+    assert _wait(new, job_id)["result"] == "b"